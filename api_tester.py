@@ -3,20 +3,39 @@ import json
 import time
 from typing import Optional, Dict, Any
 
+from capture_policy import CapturePolicy
+from http_session import create_session, get_connection_stats, print_connection_stats
+from latency_histogram import LatencyHistogram, format_latency
+from request_timing import PHASE_LABELS, print_phase_summary, start_timing, stop_timing
+from result_store import ResultStore, format_timestamp
+from stats_accumulator import StatsAccumulator
+
 class ApiTester:
-    def __init__(self, url: str, timeout: int = 10, headers: Optional[Dict[str, str]] = None):
+    def __init__(self, url: str, timeout: int = 10, headers: Optional[Dict[str, str]] = None,
+                 session: Optional[requests.Session] = None, capture: Optional[CapturePolicy] = None):
         self.url = url
         self.timeout = timeout
         self.headers = headers or {}
-        self.results = []
+        self.results = ResultStore()
+        self.stats = StatsAccumulator()
+        # 未指定時建立自己的連線池，讓同一個測試器的請求共用 keep-alive 連線
+        self.session = session or create_session()
+        # 回應本文擷取策略，大量請求時可只保留部分本文以節省解析與記憶體
+        self.capture = capture or CapturePolicy()
+
+    @property
+    def histogram(self) -> LatencyHistogram:
+        return self.stats.histogram
 
     def _make_request(self, method: str, data: Optional[Dict] = None) -> Dict[str, Any]:
         """統一的請求處理方法"""
         start_time = time.time()
+        response_time = None
+        phases = None
         result = {
             'method': method,
             'url': self.url,
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'started': start_time,
             'success': False,
             'status_code': None,
             'response_time': 0,
@@ -26,30 +45,55 @@ class ApiTester:
         
         try:
             print(f"\n🚀 測試 {method} {self.url}")
-            print(f"⏱️  開始時間: {result['timestamp']}")
+            print(f"⏱️  開始時間: {format_timestamp(start_time)}")
             
             if data:
                 print(f"📤 請求資料: {json.dumps(data, indent=2, ensure_ascii=False)}")
             
-            # 發送請求
-            response = requests.request(
+            # 發送請求 (回應時間與各階段以單調時鐘量測)
+            # status 模式不下載本文；head:N 只讀取前 N 個位元組，兩者都以串流模式送出
+            limit = self.capture.max_bytes
+            timing = start_timing()
+            start = time.perf_counter()
+            response = self.session.request(
                 method=method.upper(),
                 url=self.url,
                 json=data if data else None,
                 headers=self.headers,
-                timeout=self.timeout
+                timeout=self.timeout,
+                stream=not self.capture.reads_body or limit is not None
             )
+            raw = None
+            if limit is not None:
+                # 多讀一個位元組以區分截斷與剛好等長的本文 (與 async 引擎相同)
+                raw = response.raw.read(limit + 1, decode_content=True)
+                if len(raw) > limit:
+                    # 剩下的本文不下載，直接關閉連線
+                    response.close()
+                else:
+                    # 本文已讀完，連線可以放回連線池
+                    response.raw.release_conn()
             
-            # 計算回應時間
-            response_time = time.time() - start_time
+            # 計算回應時間，非串流模式下本文已在 request() 中讀取完畢
+            end = time.perf_counter()
+            response_time = end - start
+            phases = timing.finish(end)
             result['response_time'] = round(response_time, 3)
             result['status_code'] = response.status_code
             
             # 處理回應內容
-            try:
-                result['response_data'] = response.json()
-            except json.JSONDecodeError:
-                result['response_data'] = response.text
+            if not self.capture.reads_body:
+                response.close()
+            elif self.capture.should_capture(response.status_code):
+                if self.capture.mode == 'all':
+                    try:
+                        result['response_data'] = response.json()
+                    except json.JSONDecodeError:
+                        result['response_data'] = response.text
+                elif raw is not None:
+                    result['response_data'] = self.capture.decode(raw[:limit], truncated=len(raw) > limit)
+                else:
+                    result['response_data'] = self.capture.decode(response.content)
             
             # 判斷是否成功
             result['success'] = 200 <= response.status_code < 300
@@ -58,11 +102,15 @@ class ApiTester:
             status_emoji = "✅" if result['success'] else "❌"
             print(f"{status_emoji} 狀態碼: {result['status_code']}")
             print(f"⚡ 回應時間: {result['response_time']}秒")
+            if phases:
+                print("🧭 分段時間: " + ", ".join(
+                    f"{PHASE_LABELS[phase]} {format_latency(seconds)}" for phase, seconds in phases.items()
+                ))
             
-            # 格式化回應內容
+            # 格式化回應內容 (未擷取本文時不輸出)
             if isinstance(result['response_data'], dict):
                 print(f"📥 回應內容: {json.dumps(result['response_data'], indent=2, ensure_ascii=False)}")
-            else:
+            elif result['response_data'] is not None:
                 print(f"📥 回應內容: {result['response_data']}")
                 
         except requests.exceptions.Timeout:
@@ -77,30 +125,45 @@ class ApiTester:
         except Exception as e:
             result['error'] = f"未知錯誤: {str(e)}"
             print(f"❌ {result['error']}")
+        finally:
+            stop_timing()
         
         self.results.append(result)
+        self.stats.add(result, response_time, phases)
         return result
 
     def test_get(self):
         """測試 GET 請求"""
         return self._make_request('GET')
 
+    @staticmethod
+    def default_data(method: str) -> Optional[Dict]:
+        """未指定資料時各方法使用的預設測試資料"""
+        method = method.upper()
+        if method == 'POST':
+            return {"test": "value", "timestamp": int(time.time())}
+        if method == 'PUT':
+            return {"test": "updated_value", "timestamp": int(time.time())}
+        if method == 'PATCH':
+            return {"test": "patched_value"}
+        return None
+
     def test_post(self, data: Optional[Dict] = None):
         """測試 POST 請求"""
         if data is None:
-            data = {"test": "value", "timestamp": int(time.time())}
+            data = self.default_data('POST')
         return self._make_request('POST', data)
 
     def test_put(self, data: Optional[Dict] = None):
         """測試 PUT 請求"""
         if data is None:
-            data = {"test": "updated_value", "timestamp": int(time.time())}
+            data = self.default_data('PUT')
         return self._make_request('PUT', data)
 
     def test_patch(self, data: Optional[Dict] = None):
         """測試 PATCH 請求"""
         if data is None:
-            data = {"test": "patched_value"}
+            data = self.default_data('PATCH')
         return self._make_request('PATCH', data)
 
     def test_delete(self):
@@ -146,16 +209,16 @@ class ApiTester:
 
     def print_summary(self):
         """輸出測試摘要"""
-        if not self.results:
+        if not self.stats.total:
             return
             
         print("\n" + "=" * 50)
         print("📊 測試摘要")
         print("=" * 50)
         
-        total_tests = len(self.results)
-        successful_tests = sum(1 for r in self.results if r['success'])
-        failed_tests = total_tests - successful_tests
+        total_tests = self.stats.total
+        successful_tests = self.stats.successes
+        failed_tests = self.stats.failed
         
         print(f"總測試數: {total_tests}")
         print(f"✅ 成功: {successful_tests}")
@@ -163,19 +226,24 @@ class ApiTester:
         print(f"📈 成功率: {(successful_tests/total_tests*100):.1f}%")
         
         # 顯示平均回應時間
-        valid_times = [r['response_time'] for r in self.results if r['response_time'] > 0]
-        if valid_times:
-            avg_time = sum(valid_times) / len(valid_times)
-            print(f"⚡ 平均回應時間: {avg_time:.3f}秒")
+        if self.histogram.count:
+            print(f"⚡ 平均回應時間: {self.histogram.mean:.3f}秒")
+            percentiles = self.histogram.percentiles()
+            print("⏱️  百分位: " + ", ".join(f"{k.upper()} {format_latency(v)}" for k, v in percentiles.items()))
+        print_phase_summary(self.stats.phase_summary())
         
         # 顯示失敗的測試
         if failed_tests > 0:
             print(f"\n❌ 失敗的測試:")
-            for result in self.results:
-                if not result['success']:
-                    error_msg = result['error'] or f"HTTP {result['status_code']}"
-                    print(f"   • {result['method']}: {error_msg}")
+            for failure in self.stats.failures:
+                print(f"   • {failure['method']}: {failure['error']}")
+
+        print_connection_stats(self.get_connection_stats())
+
+    def get_connection_stats(self) -> Dict[str, int]:
+        """取得連線開啟與重複使用統計"""
+        return get_connection_stats(self.session)
 
     def get_results(self) -> list:
         """取得測試結果"""
-        return self.results 
\ No newline at end of file
+        return list(self.results) 
\ No newline at end of file
@@ -2,6 +2,7 @@ import argparse
 import json
 import sys
 from api_tester import ApiTester
+from http_session import add_session_arguments, create_session_from_args
 
 def parse_headers(headers_str):
     """解析 headers 字串"""
@@ -61,6 +62,9 @@ def main():
     parser.add_argument("--auth-basic", type=str, 
                        help="Basic 認證 (格式: username:password)")
     
+    # 連線池選項
+    add_session_arguments(parser)
+    
     # 輸出選項
     parser.add_argument("--verbose", "-v", action="store_true", 
                        help="詳細輸出模式")
@@ -106,15 +110,15 @@ def main():
         print()
     
     # 建立測試器
-    tester = ApiTester(url, timeout=args.timeout, headers=headers)
+    tester = ApiTester(url, timeout=args.timeout, headers=headers,
+                       session=create_session_from_args(args))
     
     try:
         # 執行測試
         tester.run_tests(method=args.method, data=args.data)
         
         # 根據結果決定退出代碼
-        results = tester.get_results()
-        failed_tests = sum(1 for r in results if not r['success'])
+        failed_tests = tester.stats.failed
         
         if failed_tests > 0:
             sys.exit(1)  # 有失敗的測試
@@ -1,37 +1,115 @@
 import json
 import yaml
 import os
+import asyncio
 import concurrent.futures
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+import requests
 from api_tester import ApiTester
+from capture_policy import CapturePolicy
+from data_feeder import DataFeeder, fill_headers, fill_text, fill_value
+from http_session import create_session, get_connection_stats, print_connection_stats
+from latency_histogram import LatencyHistogram, format_latency
+from metrics_server import LoopLagMonitor, MetricsServer, format_metrics
+from request_timing import print_phase_summary
+from result_sink import JsonlResultSink
+from result_store import ResultStore
+from stats_accumulator import StatsAccumulator
+
+def load_config_file(config_file: str) -> Dict[str, Any]:
+    """載入 JSON/YAML 配置檔案"""
+    if not os.path.exists(config_file):
+        raise FileNotFoundError(f"找不到配置檔案: {config_file}")
+    
+    _, ext = os.path.splitext(config_file)
+    
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            if ext.lower() in ['.yaml', '.yml']:
+                return yaml.safe_load(f)
+            elif ext.lower() == '.json':
+                return json.load(f)
+            else:
+                raise ValueError(f"不支援的檔案格式: {ext}")
+    except Exception as e:
+        raise ValueError(f"無法解析配置檔案: {e}")
+
+ENGINES = ('thread', 'async')
 
 class BatchTester:
-    def __init__(self, config_file: str, max_workers: int = 1):
+    def __init__(self, config_file: str, max_workers: int = 1, session: Optional[requests.Session] = None,
+                 engine: str = 'thread', results_file: Optional[str] = None,
+                 capture: Optional[CapturePolicy] = None, metrics_port: Optional[int] = None,
+                 feeder: Optional[DataFeeder] = None):
+        if engine not in ENGINES:
+            raise ValueError(f"不支援的執行引擎: {engine} (可用: {', '.join(ENGINES)})")
         self.config_file = config_file
         self.max_workers = max_workers
+        # thread: 每個測試案例在執行緒中以 ApiTester 執行
+        # async: 所有測試案例共用一個 aiohttp session，以 max_workers 限制並發
+        self.engine = engine
         self.config = self.load_config()
-        self.all_results = []
+        # 指定 results_file 時結果逐筆寫入 JSONL，不保留在 all_results 中
+        self.results_file = results_file
+        self._sink: Optional[JsonlResultSink] = None
+        self.all_results = ResultStore(case_field='test_case_name')
+        # 已完成但尚未依案例順序併入 all_results 的 (索引, 名稱, 結果)
+        self._completed_cases: List[tuple] = []
+        # 每個測試案例完成時併入一次，摘要直接讀取累計值；各案例保留直方圖供回歸比較
+        self.stats = StatsAccumulator('test_case_name', percentile_dimensions=('test_case_name',))
+        # 回應本文擷取策略 (見 capture_policy.CAPTURE_MODES)，所有測試案例共用
+        self.capture = capture or CapturePolicy()
+        # 指定時在此埠提供 Prometheus 指標 (由 stats 即時產生)；async 引擎另外回報 event loop 延遲
+        self.metrics_port = metrics_port
+        self.loop_lag: Optional[LoopLagMonitor] = None
+        # 執行中的測試案例數 (每個案例依序送出請求，即進行中的請求數)
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        # 指定資料檔時每個測試案例執行前讀取一列，填入端點、標頭與本文中的 {{欄位}}
+        self.feeder = feeder
+        self._feed_lock = threading.Lock()
+        # 所有測試案例共用同一個連線池，連線數至少要能容納所有執行緒
+        self.session = session or create_session(pool_maxsize=max(max_workers, 10))
+
+    @property
+    def histogram(self) -> LatencyHistogram:
+        return self.stats.histogram
 
     def load_config(self) -> Dict[str, Any]:
         """載入配置檔案"""
-        if not os.path.exists(self.config_file):
-            raise FileNotFoundError(f"找不到配置檔案: {self.config_file}")
-        
-        _, ext = os.path.splitext(self.config_file)
-        
-        try:
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                if ext.lower() in ['.yaml', '.yml']:
-                    return yaml.safe_load(f)
-                elif ext.lower() == '.json':
-                    return json.load(f)
-                else:
-                    raise ValueError(f"不支援的檔案格式: {ext}")
-        except Exception as e:
-            raise ValueError(f"無法解析配置檔案: {e}")
-
-    def _execute_test_case(self, index: int, total: int, test_case: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return load_config_file(self.config_file)
+
+    def _feed_case(self, test_case: Dict[str, Any]) -> Dict[str, Any]:
+        """以資料檔的下一列填入測試案例的佔位符 (沒有資料檔時原樣回傳)"""
+        if self.feeder is None:
+            return test_case
+        with self._feed_lock:
+            row = self.feeder.next_row()
+        if row is None:
+            print("⚠️ 資料檔已讀完，測試案例不填入資料")
+            return test_case
+        case = dict(test_case)
+        case['endpoint'] = fill_text(test_case.get('endpoint', '/'), row, url=True)
+        case['headers'] = fill_headers(test_case.get('headers', self.config.get('headers', {})), row)
+        if 'data' in test_case:
+            case['data'] = fill_value(test_case['data'], row)
+        return case
+
+    def _execute_test_case(self, index: int, total: int,
+                           test_case: Dict[str, Any]) -> Tuple[ResultStore, StatsAccumulator]:
         """在執行緒中執行單一測試案例"""
+        with self._in_flight_lock:
+            self.in_flight += 1
+        try:
+            return self._run_test_case(index, total, self._feed_case(test_case))
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+
+    def _run_test_case(self, index: int, total: int,
+                       test_case: Dict[str, Any]) -> Tuple[ResultStore, StatsAccumulator]:
         print(f"🧪 執行測試案例 {index}/{total}: {test_case.get('name', f'Test {index}')}")
         print("-" * 40)
 
@@ -43,7 +121,9 @@ class BatchTester:
         tester = ApiTester(
             url=url,
             timeout=test_case.get('timeout', self.config.get('timeout', 10)),
-            headers=test_case.get('headers', self.config.get('headers', {}))
+            headers=test_case.get('headers', self.config.get('headers', {})),
+            session=self.session,
+            capture=self.capture
         )
 
         method = test_case.get('method')
@@ -51,13 +131,95 @@ class BatchTester:
 
         tester.run_tests(method=method, data=json.dumps(data) if data else None)
 
-        test_results = tester.get_results()
-        for result in test_results:
-            result['test_case_name'] = test_case.get('name', f'Test {index}')
-            result['test_case_index'] = index
-
         print()
-        return test_results
+        return tester.results, tester.stats
+
+    def _case_requests(self, test_case: Dict[str, Any]) -> List[tuple]:
+        """取得測試案例要送出的 (方法, 資料)，與 ApiTester.run_tests 的行為一致"""
+        method = test_case.get('method')
+        data = test_case.get('data')
+        if not method:
+            return [('GET', None), ('POST', data or ApiTester.default_data('POST'))]
+
+        method = method.upper()
+        if method not in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
+            print(f"❌ 不支援的 HTTP 方法: {method}")
+            return []
+        if method in ('GET', 'DELETE'):
+            return [(method, None)]
+        return [(method, data or ApiTester.default_data(method))]
+
+    async def _execute_test_case_async(self, session, index: int,
+                                       test_case: Dict[str, Any]) -> Tuple[ResultStore, StatsAccumulator]:
+        """在 event loop 中執行單一測試案例"""
+        from concurrent_api_tester import send_request
+        from request_timing import RequestTiming
+
+        name = test_case.get('name', f'Test {index}')
+        base_url = test_case.get('base_url', self.config.get('base_url', 'http://localhost'))
+        url = f"{base_url.rstrip('/')}{test_case.get('endpoint', '/')}"
+        timeout = test_case.get('timeout', self.config.get('timeout', 10))
+        headers = test_case.get('headers', self.config.get('headers', {}))
+
+        case_results = ResultStore()
+        case_stats = StatsAccumulator()
+        for method, data in self._case_requests(test_case):
+            timing = RequestTiming()
+            result, elapsed = await send_request(
+                session, method, url, data=data, headers=headers, timeout=timeout, capture=self.capture,
+                timing=timing,
+            )
+            case_results.append(result)
+            case_stats.add(result, elapsed, timing.phases)
+
+            status_emoji = "✅" if result['success'] else "❌"
+            outcome = result['status_code'] or result['error']
+            print(f"{status_emoji} {name} - {method}: {outcome} ({result['response_time']}s)")
+        return case_results, case_stats
+
+    async def _run_async(self, test_cases: List[Dict[str, Any]]) -> None:
+        """以固定數量的 worker 在同一個 aiohttp session 上執行所有測試案例"""
+        from concurrent_api_tester import create_client_session
+
+        pending = iter(enumerate(test_cases, 1))
+
+        async def worker(session):
+            for index, test_case in pending:
+                self.in_flight += 1
+                results, stats = await self._execute_test_case_async(session, index, self._feed_case(test_case))
+                self.in_flight -= 1
+                self._record_results(index, test_case, results, stats)
+
+        lag_task = None
+        if self.metrics_port is not None:
+            self.loop_lag = LoopLagMonitor()
+            lag_task = asyncio.ensure_future(self.loop_lag.run())
+        workers = max(1, self.max_workers)
+        try:
+            # 每個 worker 一次只送一個請求，連線池上限與 worker 數相同，不會在池中排隊
+            async with create_client_session(limit=workers) as session:
+                await asyncio.gather(*(worker(session) for _ in range(workers)))
+        finally:
+            if lag_task is not None:
+                lag_task.cancel()
+
+    def render_metrics(self) -> str:
+        """指標端點的 Prometheus 文字"""
+        return format_metrics(self.stats, self.in_flight, self.loop_lag)
+
+    def _record_results(self, index: int, test_case: Dict[str, Any], results: ResultStore,
+                        stats: StatsAccumulator) -> None:
+        """併入測試案例的統計，並保留或寫出結果記錄"""
+        name = test_case.get('name', f'Test {index}')
+        # 沒有送出任何請求的案例 (例如不支援的方法) 不建立分組，避免摘要出現 0/0
+        if stats.total:
+            self.stats.merge(stats, test_case_name=name)
+
+        if self._sink is not None:
+            for record in results.records(test_case_name=name, test_case_index=index):
+                self._sink.write(record)
+        else:
+            self._completed_cases.append((index, name, results))
 
     def run_batch_tests(self):
         """執行批次測試"""
@@ -75,14 +237,34 @@ class BatchTester:
         
         total_cases = len(test_cases)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = [
-                executor.submit(self._execute_test_case, i, total_cases, tc)
-                for i, tc in enumerate(test_cases, 1)
-            ]
+        if self.results_file:
+            self._sink = JsonlResultSink(self.results_file)
+        server = None
+        if self.metrics_port is not None:
+            server = MetricsServer(self.render_metrics, self.metrics_port).start()
+        try:
+            if self.engine == 'async':
+                asyncio.run(self._run_async(test_cases))
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {
+                        executor.submit(self._execute_test_case, i, total_cases, tc): (i, tc)
+                        for i, tc in enumerate(test_cases, 1)
+                    }
+
+                    for future in concurrent.futures.as_completed(futures):
+                        self._record_results(*futures[future], *future.result())
+        finally:
+            if server is not None:
+                server.stop()
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
 
-            for future in concurrent.futures.as_completed(futures):
-                self.all_results.extend(future.result())
+        # 依測試案例順序整理保留在記憶體中的結果，輸出與執行順序無關
+        for index, name, results in sorted(self._completed_cases, key=lambda case: case[0]):
+            self.all_results.extend(results, test_case_name=name, test_case_index=index)
+        self._completed_cases.clear()
 
         print()
         
@@ -91,45 +273,45 @@ class BatchTester:
 
     def print_overall_summary(self):
         """顯示總體測試摘要"""
-        if not self.all_results:
+        if not self.stats.total:
             return
         
         print("=" * 60)
         print("📊 總體測試摘要")
         print("=" * 60)
         
-        total_tests = len(self.all_results)
-        successful_tests = sum(1 for r in self.all_results if r['success'])
-        failed_tests = total_tests - successful_tests
+        total_tests = self.stats.total
+        successful_tests = self.stats.successes
+        failed_tests = self.stats.failed
         
         print(f"總測試數: {total_tests}")
         print(f"✅ 成功: {successful_tests}")
         print(f"❌ 失敗: {failed_tests}")
         print(f"📈 整體成功率: {(successful_tests/total_tests*100):.1f}%")
+        if self.histogram.count:
+            percentiles = self.histogram.percentiles()
+            print("⏱️  百分位: " + ", ".join(f"{k.upper()} {format_latency(v)}" for k, v in percentiles.items()))
+        print_phase_summary(self.stats.phase_summary())
         
         # 按測試案例分組顯示
-        test_cases = {}
-        for result in self.all_results:
-            case_name = result.get('test_case_name', 'Unknown')
-            if case_name not in test_cases:
-                test_cases[case_name] = {'total': 0, 'success': 0}
-            test_cases[case_name]['total'] += 1
-            if result['success']:
-                test_cases[case_name]['success'] += 1
-        
         print("\n📋 各測試案例結果:")
-        for case_name, stats in test_cases.items():
-            success_rate = (stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0
+        for case_name, stats in self.stats.group('test_case_name').items():
+            success_rate = stats.success_rate
             status = "✅" if success_rate == 100 else "⚠️" if success_rate > 0 else "❌"
-            print(f"   {status} {case_name}: {stats['success']}/{stats['total']} ({success_rate:.1f}%)")
+            print(f"   {status} {case_name}: {stats.successes}/{stats.count} ({success_rate:.1f}%)")
         
         # 顯示失敗的測試
         if failed_tests > 0:
             print(f"\n❌ 失敗的測試詳情:")
-            for result in self.all_results:
-                if not result['success']:
-                    error_msg = result['error'] or f"HTTP {result['status_code']}"
-                    print(f"   • {result['test_case_name']} - {result['method']}: {error_msg}")
+            failures = self.stats.failures
+            for failure in failures:
+                print(f"   • {failure['test_case_name']} - {failure['method']}: {failure['error']}")
+            if failed_tests > len(failures):
+                print(f"   … 另有 {failed_tests - len(failures)} 個失敗的測試未列出")
+
+        if self.engine == 'thread':
+            print()
+            print_connection_stats(get_connection_stats(self.session))
 
     def generate_report(self, output_file: str = None):
         """生成測試報告"""
@@ -138,13 +320,24 @@ class BatchTester:
         
         report = {
             'summary': {
-                'total_tests': len(self.all_results),
-                'successful_tests': sum(1 for r in self.all_results if r['success']),
-                'failed_tests': sum(1 for r in self.all_results if not r['success']),
-                'success_rate': (sum(1 for r in self.all_results if r['success']) / len(self.all_results) * 100) if self.all_results else 0
+                'total_tests': self.stats.total,
+                'successful_tests': self.stats.successes,
+                'failed_tests': self.stats.failed,
+                'success_rate': self.stats.success_rate,
+                'percentiles': self.histogram.percentiles(),
+                'phases': self.stats.phase_summary()
             },
-            'results': self.all_results
+            'latency_histogram': self.histogram.to_dict(),
+            'stats': self.stats.to_dict(),
+            'engine': self.engine,
+            'capture': str(self.capture),
+            **({'connections': get_connection_stats(self.session)} if self.engine == 'thread' else {}),
+            **({'feed': {**self.feeder.to_dict(), 'rows_read': self.feeder.rows_read}} if self.feeder else {}),
         }
+        if self.results_file:
+            report['results_file'] = self.results_file
+        else:
+            report['results'] = list(self.all_results)
         
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,179 @@
+"""
+容量搜尋 - 逐步提高並發數或到達速率，找出仍符合延遲 SLO 與錯誤率門檻的最大負載
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from concurrent_api_tester import ConcurrentApiTester
+from latency_histogram import format_latency
+
+SEARCH_MODES = ('concurrency', 'rate')
+
+
+class CapacitySearch:
+    """以多個固定時長的步驟搜尋服務的飽和點 (knee)
+
+    先從 start 開始每步乘上 factor 爬升，直到 P99 超過 SLO 或錯誤率超過門檻；
+    再於最後通過與第一次失敗的負載之間二分搜尋，直到區間小於 precision (相對比例)。
+    每一步都是一次新的 ConcurrentApiTester 執行，統計互不影響；資料檔也每步從頭讀取。
+    """
+
+    def __init__(self, tester_options: Dict[str, Any], mode: str = 'concurrency', start: float = 10,
+                 factor: float = 2.0, max_level: Optional[float] = None, step_duration: float = 10.0,
+                 slo_p99: float = 0.3, max_error_rate: float = 1.0, precision: float = 0.1,
+                 cooldown: float = 1.0):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支援的搜尋模式: {mode} (可用: {', '.join(SEARCH_MODES)})")
+        if start <= 0 or factor <= 1:
+            raise ValueError("起始負載必須大於 0，成長倍數必須大於 1")
+        self.tester_options = tester_options
+        self.mode = mode
+        self.start = start
+        self.factor = factor
+        self.max_level = max_level
+        self.step_duration = step_duration
+        self.slo_p99 = slo_p99
+        self.max_error_rate = max_error_rate
+        self.precision = precision
+        # 步驟之間暫停，讓上一步留下的連線與佇列消化完
+        self.cooldown = cooldown
+        self.steps: List[Dict[str, Any]] = []
+
+    def _normalize(self, level: float) -> float:
+        """並發數取整數；速率保留兩位小數"""
+        return float(max(1, round(level))) if self.mode == 'concurrency' else round(level, 2)
+
+    def _run_step(self, level: float, phase: str) -> Dict[str, Any]:
+        """以固定負載執行一步並判斷是否符合門檻"""
+        options = dict(self.tester_options, num_requests=None, duration=self.step_duration)
+        if self.mode == 'concurrency':
+            options.update(concurrency=int(level), rate=None)
+        else:
+            options.update(rate=level)
+        # 每一步都從資料檔開頭讀取，unique 模式下前幾步不會把資料列用完
+        feeder = options.get('feeder')
+        if feeder is not None:
+            options['feeder'] = feeder.for_shard(feeder.shard)
+        tester = ConcurrentApiTester(**options)
+        tester.run()
+
+        stats = tester.stats
+        duration = tester.finished_at - tester.started_at
+        p99 = stats.histogram.percentile(99)
+        error_rate = stats.failed / stats.total * 100 if stats.total else 100.0
+        reasons = []
+        if p99 > self.slo_p99:
+            reasons.append(f"P99 {format_latency(p99)} > {format_latency(self.slo_p99)}")
+        if error_rate > self.max_error_rate:
+            reasons.append(f"錯誤率 {error_rate:.1f}% > {self.max_error_rate:g}%")
+        if not stats.total:
+            reasons.append("沒有完成任何請求")
+
+        step = {
+            'step': len(self.steps) + 1,
+            'phase': phase,
+            'level': level,
+            'requests': stats.total,
+            'throughput': round(stats.total / duration, 2) if duration > 0 else 0,
+            'error_rate': round(error_rate, 3),
+            'percentiles': stats.histogram.percentiles(),
+            'mean': round(stats.histogram.mean, 6),
+            'max_send_lag': round(tester.max_send_lag, 3),
+            'passed': not reasons,
+            'reasons': reasons,
+        }
+        self.steps.append(step)
+        self._print_step(step)
+        if self.cooldown:
+            time.sleep(self.cooldown)
+        return step
+
+    def _print_step(self, step: Dict[str, Any]) -> None:
+        outcome = "✅" if step['passed'] else "❌ " + "；".join(step['reasons'])
+        percentiles = step['percentiles']
+        print(
+            f"{step['step']:>4}  {step['phase']:<4}{step['level']:>10g}{step['throughput']:>12.2f}"
+            f"{format_latency(percentiles['p50']):>11}{format_latency(percentiles['p99']):>11}"
+            f"{step['error_rate']:>8.1f}%  {outcome}"
+        )
+
+    def run(self) -> Dict[str, Any]:
+        """執行搜尋並回傳包含各步驟與 knee 的結果"""
+        unit = "並發數" if self.mode == 'concurrency' else "req/s"
+        print(f"🔎 容量搜尋 ({self.mode})：P99 ≤ {format_latency(self.slo_p99)}，"
+              f"錯誤率 ≤ {self.max_error_rate:g}%，每步 {self.step_duration:g} 秒")
+        # 中文字佔兩格寬，欄位寬度扣掉中文字數以對齊數字欄
+        unit_width = 10 - sum(not c.isascii() for c in unit)
+        print(f"{'步驟':>2}  {'階段':<4}{unit:>{unit_width}}{'req/s':>12}{'P50':>11}{'P99':>11}{'錯誤率':>6}  結果")
+
+        # 爬升：找出最後通過與第一次失敗的負載
+        passed: Optional[Dict[str, Any]] = None
+        failed: Optional[Dict[str, Any]] = None
+        level = self._normalize(self.start)
+        while True:
+            step = self._run_step(level, '爬升')
+            if not step['passed']:
+                failed = step
+                break
+            passed = step
+            if self.max_level is not None and level >= self.max_level:
+                break
+            next_level = self._normalize(level * self.factor)
+            if self.max_level is not None:
+                next_level = min(next_level, self._normalize(self.max_level))
+            if next_level <= level:
+                break
+            level = next_level
+
+        # 二分：在通過與失敗之間縮小範圍 (起始負載就失敗時以 0 為下界)
+        if failed is not None:
+            low = passed['level'] if passed is not None else 0.0
+            high = failed['level']
+            while high - low > max(low * self.precision, 1 if self.mode == 'concurrency' else 0.01):
+                level = self._normalize((low + high) / 2)
+                if level <= low or level >= high:
+                    break
+                step = self._run_step(level, '二分')
+                if step['passed']:
+                    low, passed = level, step
+                else:
+                    high = level
+
+        return self._result(passed, failed)
+
+    def _result(self, knee: Optional[Dict[str, Any]], failed: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        best = max(self.steps, key=lambda step: step['throughput']) if self.steps else None
+        return {
+            'mode': self.mode,
+            'slo_p99': self.slo_p99,
+            'max_error_rate': self.max_error_rate,
+            'step_duration': self.step_duration,
+            'steps': self.steps,
+            'knee': knee,
+            # 爬升到上限仍未失敗時，實際容量可能更高
+            'saturated': failed is not None,
+            'peak_throughput': best['throughput'] if best else 0,
+        }
+
+    def print_summary(self, result: Dict[str, Any]) -> None:
+        print("=" * 60)
+        knee = result['knee']
+        if knee is None:
+            print("❌ 起始負載就不符合門檻，請降低 --search-start")
+        else:
+            unit = "並發數" if self.mode == 'concurrency' else "req/s 目標速率"
+            percentiles = knee['percentiles']
+            print(f"📌 Knee: {unit} {knee['level']:g}，吞吐量 {knee['throughput']:.2f} req/s，"
+                  f"P50 {format_latency(percentiles['p50'])}，P99 {format_latency(percentiles['p99'])}，"
+                  f"錯誤率 {knee['error_rate']:.1f}%")
+            if not result['saturated']:
+                print("⚠️  已達搜尋上限仍符合門檻，實際容量可能更高 (可提高 --search-max)")
+        print(f"📈 各步驟最高吞吐量: {result['peak_throughput']:.2f} req/s")
+
+    @staticmethod
+    def save_report(result: Dict[str, Any], output_file: str) -> None:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({'capacity': result}, f, indent=2, ensure_ascii=False)
+        print(f"📄 容量搜尋報告已生成: {output_file}")
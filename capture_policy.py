@@ -0,0 +1,101 @@
+"""
+回應本文擷取策略 - 高吞吐量測試時避免解析與保存每一筆回應本文
+"""
+
+import argparse
+import itertools
+import json
+from typing import Any, Optional
+
+# all: 完整擷取並解析；none: 讀完本文但不解析；status: 只記錄狀態碼，不讀取本文；
+# head:N: 只保留前 N 個位元組；failures: 只擷取失敗的回應；sample:K: 每 K 筆擷取 1 筆
+CAPTURE_MODES = ('all', 'none', 'status', 'head', 'failures', 'sample')
+
+
+class CapturePolicy:
+    """決定每筆回應是否讀取、解析並保存本文"""
+
+    def __init__(self, mode: str = 'all', size: Optional[int] = None, every: Optional[int] = None):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"不支援的擷取模式: {mode} (可用: {', '.join(CAPTURE_MODES)})")
+        if mode == 'head' and (size is None or size <= 0):
+            raise ValueError("head 模式需要指定大於 0 的位元組數，例如 head:512")
+        if mode == 'sample' and (every is None or every <= 0):
+            raise ValueError("sample 模式需要指定大於 0 的間隔，例如 sample:100")
+        self.mode = mode
+        self.size = size
+        self.every = every
+        self._counter = itertools.count()
+
+    @classmethod
+    def from_spec(cls, spec: str) -> 'CapturePolicy':
+        """解析命令列格式，例如 none、failures、head:512、sample:100"""
+        mode, _, value = spec.partition(':')
+        mode = mode.strip().lower()
+        try:
+            number = int(value) if value else None
+        except ValueError:
+            raise ValueError(f"無效的擷取設定: {spec}")
+        if mode == 'head':
+            return cls(mode, size=number)
+        if mode == 'sample':
+            return cls(mode, every=number)
+        if value:
+            raise ValueError(f"{mode} 模式不接受參數: {spec}")
+        return cls(mode)
+
+    @property
+    def reads_body(self) -> bool:
+        """是否需要讀取本文 (status 模式收到回應標頭即釋放)"""
+        return self.mode != 'status'
+
+    @property
+    def max_bytes(self) -> Optional[int]:
+        """最多保留的本文位元組數，None 表示不限制"""
+        return self.size if self.mode == 'head' else None
+
+    def should_capture(self, status: int) -> bool:
+        """依狀態碼決定這筆回應是否保存本文"""
+        if self.mode in ('all', 'head'):
+            return True
+        if self.mode == 'failures':
+            return not 200 <= status < 300
+        if self.mode == 'sample':
+            return next(self._counter) % self.every == 0
+        return False
+
+    @staticmethod
+    def decode(raw: bytes, truncated: bool = False) -> Any:
+        """將本文解析為 JSON，失敗或已截斷時保留為文字"""
+        if not truncated:
+            try:
+                return json.loads(raw)
+            except ValueError:
+                pass
+        return raw.decode('utf-8', errors='replace')
+
+    def __getstate__(self) -> dict:
+        # itertools.count 不能直接序列化，傳給 worker 程序時重新計數
+        state = self.__dict__.copy()
+        del state['_counter']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._counter = itertools.count()
+
+    def __str__(self) -> str:
+        if self.mode == 'head':
+            return f"head:{self.size}"
+        if self.mode == 'sample':
+            return f"sample:{self.every}"
+        return self.mode
+
+
+def capture_spec(spec: str) -> str:
+    """命令列 --capture 的驗證：格式錯誤時由 argparse 顯示原因，而不是在執行時丟出例外"""
+    try:
+        CapturePolicy.from_spec(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return spec
@@ -5,12 +5,25 @@
 
 import argparse
 import json
+import os
 import sys
-import asyncio
+import time
 from smart_api_tester import SmartApiTester
 from batch_tester import BatchTester
-from report_generator import ReportGenerator
-from concurrent_api_tester import ConcurrentApiTester
+from capture_policy import CapturePolicy, capture_spec
+from report_generator import REPORT_MODES, create_report_generator
+from concurrent_api_tester import ConcurrentApiTester, add_connector_arguments, connector_options_from_args
+from capacity_search import SEARCH_MODES, CapacitySearch
+from load_profile import LoadProfile
+from traffic_mix import TrafficMix
+from data_feeder import DataFeeder, add_feed_arguments
+from request_template import BUILTIN_VARIABLES
+from regression_gate import DEFAULT_BASELINE_DIR, BaselineStore, RegressionGate
+from report_generator import ComparisonReportGenerator
+from self_benchmark import (BENCHMARK_ENGINES, DEFAULT_RESULTS_DIR, LATENCY_DISTRIBUTIONS, SelfBenchmark,
+                            StandInServer, compare_results, latest_result, load_results, print_comparison)
+from http_session import add_session_arguments, create_session_from_args
+from metrics_server import add_metrics_argument
 
 def print_banner():
     """列印工具橫幅"""
@@ -35,7 +48,10 @@ def run_smart_test(args):
     tester = SmartApiTester(
         base_url=args.base_url,
         endpoint=args.endpoint,
-        timeout=args.timeout
+        timeout=args.timeout,
+        session=create_session_from_args(args, min_pool_size=args.parallel),
+        parallelism=args.parallel,
+        results_file=args.jsonl
     )
     
     # 執行全面測試
@@ -51,10 +67,8 @@ def run_smart_test(args):
             with open(report_file, 'r', encoding='utf-8') as f:
                 report_data = json.load(f)
             
-            # 直接使用詳細測試結果，ReportGenerator期望的是結果列表
-            test_results = report_data['detailed_results']
-            
-            generator = ReportGenerator(test_results)
+            # 直接使用詳細測試結果，智能測試的結果數量不多，固定列出每一筆
+            generator = create_report_generator(report_data, 'full', 'detailed_results')
             html_file = report_file.replace('.json', '.html')
             generator.generate_html_report(html_file)
             print(f"📄 HTML報告已生成: {html_file}")
@@ -67,7 +81,16 @@ def run_batch_test(args):
     print(f"📋 批次測試模式: {args.config_file}")
     
     try:
-        tester = BatchTester(args.config_file, max_workers=args.concurrency)
+        tester = BatchTester(
+            args.config_file,
+            max_workers=args.concurrency,
+            session=create_session_from_args(args, min_pool_size=args.concurrency),
+            engine=args.engine,
+            results_file=args.jsonl,
+            capture=CapturePolicy.from_spec(args.capture),
+            metrics_port=args.metrics_port,
+            feeder=DataFeeder(args.feed, args.feed_mode) if args.feed else None
+        )
         tester.run_batch_tests()
         
         # 生成JSON報告
@@ -80,10 +103,8 @@ def run_batch_test(args):
                 with open(report_file, 'r', encoding='utf-8') as f:
                     report_data = json.load(f)
                 
-                # 對於批次測試，使用results欄位
-                test_results = report_data.get('results', [])
-                
-                generator = ReportGenerator(test_results)
+                # 對於批次測試，使用results欄位；大量結果時改用彙總報告
+                generator = create_report_generator(report_data, args.report_mode)
                 html_file = report_file.replace('.json', '.html')
                 generator.generate_html_report(html_file)
                 print(f"📄 HTML報告已生成: {html_file}")
@@ -95,29 +116,207 @@ def run_batch_test(args):
         print(f"❌ 批次測試失敗: {e}")
         sys.exit(1)
 
+def run_capacity_search(args, mix=None, data=None, headers=None, feeder=None):
+    """逐步提高負載，找出符合 SLO 的最大吞吐量"""
+    if args.profile:
+        print("❌ --find-capacity 不能與 --profile 同時使用")
+        sys.exit(1)
+    start = args.search_start
+    if start is None:
+        start = args.concurrency if args.find_capacity == 'concurrency' else (args.rate or 10)
+
+    search = CapacitySearch(
+        tester_options={
+            'base_url': args.base_url,
+            'endpoint': args.endpoint or '',
+            'method': args.method,
+            'mix': mix,
+            'data': data,
+            'headers': headers,
+            'feeder': feeder,
+            'connector': connector_options_from_args(args),
+            'concurrency': args.concurrency,
+            'timeout': args.timeout,
+            'processes': args.processes,
+            'capture': CapturePolicy.from_spec(args.capture),
+        },
+        mode=args.find_capacity,
+        start=start,
+        factor=args.search_factor,
+        max_level=args.search_max,
+        step_duration=args.step_duration or 10.0,
+        slo_p99=args.slo_p99 / 1000,
+        max_error_rate=args.max_error_rate,
+    )
+    result = search.run()
+    search.print_summary(result)
+    search.save_report(result, args.output or "stress_capacity_report.json")
+
 def run_stress_test(args):
     """執行壓力測試"""
-    print(f"🚀 壓力測試模式: {args.base_url}{args.endpoint}")
+    if args.endpoint is None and not args.mix:
+        print("❌ 請指定 API 端點或 --mix 流量組合設定檔")
+        sys.exit(1)
+    mix = TrafficMix.from_file(args.mix, args.base_url) if args.mix else None
+    data = json.loads(args.data) if args.data else None
+    headers = {"Content-Type": "application/json", **json.loads(args.headers)} if args.headers else None
+    feeder = DataFeeder(args.feed, args.feed_mode) if args.feed else None
+    if feeder is not None:
+        templates = [args.endpoint, data, headers]
+        if mix is not None:
+            templates += [[case['url'], case['data'], case['headers']] for case in mix.entries]
+        missing = [name for name in feeder.missing_fields(*templates) if name not in BUILTIN_VARIABLES]
+        if missing:
+            print(f"❌ 資料檔 {args.feed} 沒有這些欄位: {', '.join(missing)}")
+            sys.exit(1)
+    print(f"🚀 壓力測試模式: {args.base_url}{args.endpoint or ''}")
+    if args.find_capacity:
+        run_capacity_search(args, mix, data, headers, feeder)
+        return
+
+    # 指定持續時間時不限制請求數，除非同時指定 --requests
+    num_requests = args.requests
+    profile = LoadProfile.from_file(args.profile) if args.profile else None
+    if num_requests is None and not args.duration and profile is None:
+        num_requests = 100
 
     tester = ConcurrentApiTester(
         base_url=args.base_url,
-        endpoint=args.endpoint,
+        endpoint=args.endpoint or '',
+        mix=mix,
+        data=data,
+        headers=headers,
+        feeder=feeder,
+        connector=connector_options_from_args(args),
         method=args.method,
-        num_requests=args.requests,
+        num_requests=num_requests,
         concurrency=args.concurrency,
         timeout=args.timeout,
+        rate=args.rate,
+        duration=args.duration,
+        processes=args.processes,
+        profile=profile,
+        results_file=args.jsonl,
+        capture=CapturePolicy.from_spec(args.capture),
+        live=args.live,
+        metrics_port=args.metrics_port,
     )
 
-    asyncio.run(tester.run_tests())
+    if args.rate:
+        print(f"⏱️ 開放式負載: 每秒 {args.rate} 個請求 (不受並發數限制)")
+    if args.duration:
+        print(f"⏳ 持續時間: {args.duration} 秒")
+    if profile:
+        stages = ", ".join(stage['name'] for stage in profile.stages)
+        print(f"📈 負載設定 ({profile.mode}): {stages}，共 {profile.total_duration:g} 秒")
+    if tester.processes < args.processes:
+        print(f"⚠️ 並發數 {tester.concurrency} 少於程序數，只使用 {tester.processes} 個 worker 程序")
+    elif tester.processes > 1:
+        print(f"🧵 使用 {tester.processes} 個 worker 程序")
+
+    tester.run()
+    tester.print_summary()
 
     report_file = args.output or "stress_test_report.json"
     tester.generate_report(report_file)
 
     if args.html_report:
         html_file = report_file.replace('.json', '.html')
-        tester.generate_html_report(report_file, html_file)
+        tester.generate_html_report(report_file, html_file, args.report_mode)
         print(f"📄 HTML報告已生成: {html_file}")
 
+def run_baseline(args):
+    """保存或列出基準快照"""
+    store = BaselineStore(args.dir)
+    if args.list or not args.report_file:
+        baselines = store.list()
+        if not baselines:
+            print(f"📭 {args.dir} 中沒有任何基準")
+        for baseline in baselines:
+            print(f"📌 {baseline.get('name')}: {baseline.get('requests')} 請求，"
+                  f"來源 {baseline.get('source')} ({baseline.get('created')})")
+        return
+
+    name = args.name or os.path.splitext(os.path.basename(args.report_file))[0]
+    try:
+        path = store.save(name, args.report_file)
+    except (OSError, ValueError) as e:
+        print(f"❌ 無法保存基準: {e}")
+        sys.exit(1)
+    print(f"📌 基準已保存: {name} ({path})")
+
+def run_compare(args):
+    """比較基準與目前的報告，出現回歸時以非零代碼結束"""
+    store = BaselineStore(args.dir)
+    try:
+        baseline = store.load(args.baseline)
+        current = store.load(args.current)
+    except (OSError, ValueError) as e:
+        print(f"❌ 無法載入報告: {e}")
+        sys.exit(2)
+
+    gate = RegressionGate(tolerance=args.tolerance, alpha=args.alpha)
+    comparison = gate.compare(baseline, current)
+    gate.print_comparison(comparison)
+    if args.output:
+        gate.save_report(comparison, args.output)
+    if args.html_report:
+        ComparisonReportGenerator(comparison, current['stats']).generate_html_report(args.html_report)
+    if comparison['regressed']:
+        sys.exit(1)
+
+def run_benchmark(args):
+    """以替身伺服器量測各引擎本身的效能，保存結果並可與前一次比較"""
+    try:
+        server = StandInServer(
+            latency=args.latency / 1000,
+            distribution=args.distribution,
+            spread=args.spread,
+            payload_size=args.payload_size,
+            error_rate=args.error_rate / 100,
+            port=args.port,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+    if args.serve:
+        with server:
+            print(f"🧪 替身伺服器執行中: {server.base_url} (Ctrl+C 結束)")
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+        return
+
+    previous = args.compare
+    if previous == 'latest':
+        previous = latest_result(args.dir)
+        if previous is None:
+            print(f"⚠️ {args.dir} 中沒有先前的結果，略過比較")
+    try:
+        before = load_results(previous) if previous else None
+        engines = tuple(args.engines.split(',')) if args.engines else BENCHMARK_ENGINES
+        benchmark = SelfBenchmark(server, engines=engines, requests=args.requests,
+                                  concurrency=args.concurrency, warmup=args.warmup, capture=args.capture)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+
+    with server:
+        result = benchmark.run()
+    benchmark.print_summary(result)
+    path = benchmark.save(result, args.dir)
+    print(f"📄 基準結果已保存: {path}")
+
+    if before is not None:
+        comparison = compare_results(before, result, tolerance=args.tolerance)
+        print_comparison(comparison)
+        if comparison['regressed']:
+            sys.exit(1)
+
 def create_sample_configs():
     """創建範例配置檔案"""
     # 智能測試配置
@@ -195,15 +394,40 @@ def main():
   
   # 批次測試
   python comprehensive_api_tester.py batch tests.json
+
+  # 以 async 引擎並發執行大量測試案例
+  python comprehensive_api_tester.py batch tests.json --engine async --concurrency 50
   
   # 生成範例配置檔案
   python comprehensive_api_tester.py create-samples
 
+  # 保存基準，之後與新的報告比較 (P95/P99 變慢超過 10% 時結束代碼為 1)
+  python comprehensive_api_tester.py baseline stress_test_report.json --name main
+  python comprehensive_api_tester.py compare main stress_test_report.json --html-report compare.html
+
+  # 以本機替身伺服器量測各引擎的吞吐量、CPU、記憶體與計時誤差，並與上一次結果比較
+  python comprehensive_api_tester.py benchmark --latency 10 --distribution lognormal --compare
+
   # 帶HTML報告的測試
   python comprehensive_api_tester.py smart http://localhost:8000 /api/users --html-report
 
   # 壓力測試
   python comprehensive_api_tester.py stress http://localhost:8000 /api/list_contracts --requests 500 --concurrency 50
+
+  # 固定到達速率 (每秒 200 個請求) 的壓力測試
+  python comprehensive_api_tester.py stress http://localhost:8000 /api/list_contracts --requests 2000 --rate 200
+
+  # 持續 10 分鐘的長時間壓力測試
+  python comprehensive_api_tester.py stress http://localhost:8000 /api/list_contracts --duration 600 --concurrency 50
+
+  # 依設定檔分階段爬升、持平、突波與降載
+  python comprehensive_api_tester.py stress http://localhost:8000 /api/list_contracts --profile load_profile.yaml
+
+  # 依權重混合多個端點，每秒 300 個請求
+  python comprehensive_api_tester.py stress http://localhost:8000 --mix traffic_mix.json --rate 300 --duration 600
+
+  # 使用 4 個程序產生負載
+  python comprehensive_api_tester.py stress http://localhost:8000 /api/list_contracts --requests 100000 --concurrency 200 --processes 4
         """
     )
     
@@ -215,24 +439,113 @@ def main():
     smart_parser.add_argument('endpoint', help='API端點 (例: /api/list_contracts)')
     smart_parser.add_argument('--timeout', type=int, default=30, help='請求逾時時間 (預設: 30秒)')
     smart_parser.add_argument('--html-report', action='store_true', help='生成HTML報告')
+    smart_parser.add_argument('--parallel', type=int, default=1, help='同時送出的場景請求數 (預設: 1)')
+    smart_parser.add_argument('--jsonl', help='將每筆結果逐筆寫入此 JSONL 檔，報告只保留摘要')
+    add_session_arguments(smart_parser)
     
     # 批次測試指令
     batch_parser = subparsers.add_parser('batch', help='批次配置檔案測試')
     batch_parser.add_argument('config_file', help='測試配置檔案 (JSON/YAML)')
     batch_parser.add_argument('--output', help='輸出報告檔案名稱')
+    batch_parser.add_argument('--concurrency', type=int, default=1, help='同時執行的測試案例數 (預設: 1)')
+    batch_parser.add_argument('--engine', choices=['thread', 'async'], default='thread',
+                              help='執行引擎: thread 為每個案例一個執行緒，async 為單一 aiohttp session (預設: thread)')
     batch_parser.add_argument('--html-report', action='store_true', help='生成HTML報告')
+    batch_parser.add_argument('--report-mode', choices=REPORT_MODES, default='auto',
+                              help='HTML報告模式: full 列出每筆請求，aggregate 分組彙總並分頁，auto 依結果數量選擇 (預設: auto)')
+    batch_parser.add_argument('--capture', default='all', type=capture_spec,
+                              help='回應本文擷取: all、none (讀完不解析)、status (只記錄狀態碼)、head:N、failures、sample:K (預設: all)')
+    batch_parser.add_argument('--jsonl', help='將每筆結果逐筆寫入此 JSONL 檔，報告只保留摘要')
+    add_metrics_argument(batch_parser)
+    add_feed_arguments(batch_parser)
+    add_session_arguments(batch_parser)
 
     # 壓力測試指令
     stress_parser = subparsers.add_parser('stress', help='並發壓力測試')
     stress_parser.add_argument('base_url', help='API基礎URL (例: http://localhost:8000)')
-    stress_parser.add_argument('endpoint', help='API端點 (例: /api/list_contracts)')
+    stress_parser.add_argument('endpoint', nargs='?', help='API端點 (例: /api/list_contracts；使用 --mix 時可省略)')
     stress_parser.add_argument('--method', default='GET', help='HTTP 方法 (預設: GET)')
-    stress_parser.add_argument('--requests', type=int, default=100, help='總請求數 (預設: 100)')
+    stress_parser.add_argument('--requests', type=int, help='總請求數 (預設: 100；指定 --duration 時不限)')
+    stress_parser.add_argument('--duration', type=float, help='持續執行秒數，時間到即停止送出請求')
     stress_parser.add_argument('--concurrency', type=int, default=10, help='同時並發數 (預設: 10)')
     stress_parser.add_argument('--timeout', type=int, default=10, help='逾時秒數 (預設: 10)')
+    stress_parser.add_argument('--processes', type=int, default=1, help='worker 程序數，請求數/速率/並發數平均分配 (預設: 1)')
+    stress_parser.add_argument('--profile', help='分階段負載設定檔 (JSON/YAML)，依階段調整速率或並發數')
+    stress_parser.add_argument('--rate', type=float, help='開放式負載: 固定每秒發送的請求數，延遲自排定發送時間起算')
+    stress_parser.add_argument('--data', help='請求本文 (JSON 格式，可含 {{欄位}} 佔位符)')
+    stress_parser.add_argument('--headers', help='自訂 HTTP headers (JSON 格式，可含 {{欄位}} 佔位符)')
+    add_feed_arguments(stress_parser)
+    stress_parser.add_argument('--mix', help='流量組合設定檔 (批次測試格式，每個測試案例可加 weight)，依權重混合多個端點')
     stress_parser.add_argument('--output', help='輸出報告檔案名稱')
     stress_parser.add_argument('--html-report', action='store_true', help='生成HTML報告')
+    stress_parser.add_argument('--report-mode', choices=REPORT_MODES, default='auto',
+                               help='HTML報告模式: full 列出每筆請求，aggregate 分組彙總並分頁，auto 依結果數量選擇 (預設: auto)')
+    stress_parser.add_argument('--capture', default='all', type=capture_spec,
+                               help='回應本文擷取: all、none (讀完不解析)、status (只記錄狀態碼)、head:N、failures、sample:K (預設: all)')
+    stress_parser.add_argument('--jsonl', help='將每筆結果逐筆寫入此 JSONL 檔，報告只保留摘要')
+    stress_parser.add_argument('--live', action='store_true',
+                               help='執行期間每秒更新即時儀表板 (RPS、進行中請求、滾動 P50/P99、錯誤率)')
+    add_connector_arguments(stress_parser)
+    add_metrics_argument(stress_parser)
+    stress_parser.add_argument('--find-capacity', choices=SEARCH_MODES,
+                               help='容量搜尋: 逐步提高並發數或速率，找出符合 SLO 的最大負載')
+    stress_parser.add_argument('--slo-p99', type=float, default=300,
+                               help='容量搜尋的 P99 延遲上限毫秒數 (預設: 300)')
+    stress_parser.add_argument('--max-error-rate', type=float, default=1.0,
+                               help='容量搜尋的錯誤率上限百分比 (預設: 1)')
+    stress_parser.add_argument('--step-duration', type=float,
+                               help='容量搜尋每一步的秒數 (預設: 10)')
+    stress_parser.add_argument('--search-start', type=float,
+                               help='容量搜尋的起始負載 (預設: --concurrency 或 --rate)')
+    stress_parser.add_argument('--search-max', type=float, help='容量搜尋的負載上限')
+    stress_parser.add_argument('--search-factor', type=float, default=2.0,
+                               help='容量搜尋爬升時每步的倍數 (預設: 2)')
     
+    # 基準與回歸比較指令
+    baseline_parser = subparsers.add_parser('baseline', help='保存或列出效能基準')
+    baseline_parser.add_argument('report_file', nargs='?', help='壓力/批次測試的 JSON 報告')
+    baseline_parser.add_argument('--name', help='基準名稱 (預設: 報告檔名)')
+    baseline_parser.add_argument('--list', action='store_true', help='列出已保存的基準')
+    baseline_parser.add_argument('--dir', default=DEFAULT_BASELINE_DIR, help=f'基準目錄 (預設: {DEFAULT_BASELINE_DIR})')
+
+    compare_parser = subparsers.add_parser('compare', help='與基準比較延遲與吞吐量，偵測效能回歸')
+    compare_parser.add_argument('baseline', help='基準名稱，或報告/快照檔案')
+    compare_parser.add_argument('current', help='目前的報告檔案 (或基準名稱)')
+    compare_parser.add_argument('--tolerance', type=float, default=10.0,
+                                help='P95/P99 允許增加的百分比，超過即判定回歸 (預設: 10)')
+    compare_parser.add_argument('--alpha', type=float, default=0.05,
+                                help='KS 檢定的顯著水準，分佈差異不顯著時不判定回歸 (預設: 0.05)')
+    compare_parser.add_argument('--output', help='將比較結果寫入此 JSON 檔')
+    compare_parser.add_argument('--html-report', help='將比較結果寫入此 HTML 檔')
+    compare_parser.add_argument('--dir', default=DEFAULT_BASELINE_DIR, help=f'基準目錄 (預設: {DEFAULT_BASELINE_DIR})')
+
+    # 自我效能基準指令
+    benchmark_parser = subparsers.add_parser('benchmark', help='以本機替身伺服器量測各引擎本身的效能')
+    benchmark_parser.add_argument('--engines', help=f"要量測的引擎，以逗號分隔 (預設: {','.join(BENCHMARK_ENGINES)})")
+    benchmark_parser.add_argument('--requests', type=int, default=2000, help='每個引擎的請求數 (預設: 2000)')
+    benchmark_parser.add_argument('--concurrency', type=int, default=20,
+                                  help='batch 與 concurrent 引擎的並發數，api 引擎固定為 1 (預設: 20)')
+    benchmark_parser.add_argument('--warmup', type=int, default=50, help='量測前的暖機請求數 (預設: 50)')
+    benchmark_parser.add_argument('--capture', default='all', type=capture_spec,
+                                  help='回應本文擷取: all、none、status、head:N、failures、sample:K (預設: all)')
+    benchmark_parser.add_argument('--latency', type=float, default=10.0, help='替身伺服器的注入延遲毫秒數 (預設: 10)')
+    benchmark_parser.add_argument('--distribution', choices=LATENCY_DISTRIBUTIONS, default='fixed',
+                                  help='延遲分佈: fixed 固定、uniform 均勻、exponential 指數 (平均值)、'
+                                       'lognormal 對數常態 (中位數) (預設: fixed)')
+    benchmark_parser.add_argument('--spread', type=float, default=0.5,
+                                  help='uniform 的相對範圍 (±) 或 lognormal 的對數標準差 (預設: 0.5)')
+    benchmark_parser.add_argument('--payload-size', type=int, default=512, help='回應本文位元組數 (預設: 512)')
+    benchmark_parser.add_argument('--error-rate', type=float, default=0.0, help='回傳 500 的比例百分比 (預設: 0)')
+    benchmark_parser.add_argument('--seed', type=int, help='替身伺服器的亂數種子')
+    benchmark_parser.add_argument('--port', type=int, default=0, help='替身伺服器埠號 (預設: 自動選擇)')
+    benchmark_parser.add_argument('--serve', action='store_true',
+                                  help='只啟動替身伺服器，供 stress/batch 等指令手動測試')
+    benchmark_parser.add_argument('--compare', nargs='?', const='latest',
+                                  help='與先前的結果檔比較 (不指定檔案時使用 --dir 中最近一次的結果)')
+    benchmark_parser.add_argument('--tolerance', type=float, default=10.0,
+                                  help='吞吐量下降或 CPU/請求增加超過此百分比即判定回歸 (預設: 10)')
+    benchmark_parser.add_argument('--dir', default=DEFAULT_RESULTS_DIR, help=f'結果目錄 (預設: {DEFAULT_RESULTS_DIR})')
+
     # 建立範例檔案指令
     samples_parser = subparsers.add_parser('create-samples', help='建立範例配置檔案')
     
@@ -252,6 +565,12 @@ def main():
         run_batch_test(args)
     elif args.command == 'stress':
         run_stress_test(args)
+    elif args.command == 'baseline':
+        run_baseline(args)
+    elif args.command == 'compare':
+        run_compare(args)
+    elif args.command == 'benchmark':
+        run_benchmark(args)
     elif args.command == 'create-samples':
         create_sample_configs()
     else:
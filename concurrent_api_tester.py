@@ -2,25 +2,282 @@
 """Concurrent API stress tester using asyncio and aiohttp."""
 
 import asyncio
+import math
+import multiprocessing
+import queue
+import threading
 import time
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
 import aiohttp
 
+from capture_policy import CapturePolicy
+from data_feeder import DataFeeder
+from latency_histogram import LatencyHistogram, format_latency
+from live_dashboard import LiveDashboard, LiveWindow, seconds_until_tick
+from load_profile import LoadProfile
+from metrics_server import LoopLagMonitor, MetricsServer, format_metrics
+from request_template import RequestTemplate
+from request_timing import RequestTiming, print_phase_summary
+from result_sink import JsonlResultSink, concat_jsonl
+from result_store import ResultStore, to_record
+from stats_accumulator import GroupStats, StatsAccumulator, error_class
+from traffic_mix import TrafficMix
+
+# Longest step the open-loop scheduler advances without re-reading the rate,
+# so slow stretches of a ramp do not overshoot into the next stage.
+PROFILE_STEP = 0.05
+
+# Bodies captured by default are the full response; unlike the other modes
+# this keeps text bodies to their first 200 characters as before.
+FULL_CAPTURE = CapturePolicy()
+TEXT_PREVIEW_CHARS = 200
+
+# aiohttp's own connector defaults, except that a limit of None is filled in
+# per run: the concurrency for closed-loop runs, unlimited (0) for open loop.
+CONNECTOR_DEFAULTS: Dict[str, Any] = {
+    "limit": None,
+    "limit_per_host": 0,
+    "keepalive_timeout": 15.0,
+    "ttl_dns_cache": 10,
+    "force_close": False,
+}
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """Tracing hooks that fill the RequestTiming passed as ``trace_request_ctx``.
+
+    aiohttp reports TCP and TLS setup as one connection-create span, so the
+    TLS handshake is part of ``connect`` here; DNS lookups that miss the
+    connector's cache are taken out of it and reported as ``dns``.
+    """
+    config = aiohttp.TraceConfig()
+
+    async def on_queued_start(session, ctx, params):
+        ctx.queued_at = time.perf_counter()
+
+    async def on_queued_end(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx.add("queue", time.perf_counter() - ctx.queued_at)
+
+    async def on_create_start(session, ctx, params):
+        ctx.create_at = time.perf_counter()
+        ctx.dns_time = 0.0
+
+    async def on_dns_start(session, ctx, params):
+        ctx.resolve_at = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            seconds = time.perf_counter() - ctx.resolve_at
+            ctx.trace_request_ctx.add("dns", seconds)
+            if hasattr(ctx, "dns_time"):
+                ctx.dns_time += seconds
+
+    async def on_create_end(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            connect = time.perf_counter() - ctx.create_at - ctx.dns_time
+            ctx.trace_request_ctx.add("connect", connect)
+
+    async def on_headers_sent(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx.sent_at = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        timing = ctx.trace_request_ctx
+        if timing is not None and timing.sent_at is not None:
+            timing.response_at = time.perf_counter()
+            timing.add("ttfb", timing.response_at - timing.sent_at)
+            timing.sent_at = None
+
+    config.on_connection_queued_start.append(on_queued_start)
+    config.on_connection_queued_end.append(on_queued_end)
+    config.on_connection_create_start.append(on_create_start)
+    config.on_connection_create_end.append(on_create_end)
+    config.on_dns_resolvehost_start.append(on_dns_start)
+    config.on_dns_resolvehost_end.append(on_dns_end)
+    config.on_request_headers_sent.append(on_headers_sent)
+    config.on_request_end.append(on_request_end)
+    return config
+
+
+def create_client_session(
+    headers: Optional[Dict[str, str]] = None,
+    limit: int = 100,
+    limit_per_host: int = 0,
+    keepalive_timeout: float = 15.0,
+    ttl_dns_cache: Optional[int] = 10,
+    force_close: bool = False,
+) -> aiohttp.ClientSession:
+    """Create the aiohttp session shared by every request of a run.
+
+    ``limit`` and ``limit_per_host`` cap the open connections (0 means no
+    cap); requests beyond them wait for a pooled connection, which shows up
+    as the ``queue`` phase. ``force_close`` opens a new connection for every
+    request, so ``keepalive_timeout`` does not apply to it.
+    """
+    options: Dict[str, Any] = {} if force_close else {"keepalive_timeout": keepalive_timeout}
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=ttl_dns_cache,
+        force_close=force_close,
+        **options,
+    )
+    return aiohttp.ClientSession(
+        headers=headers,
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=None),
+        trace_configs=[create_trace_config()],
+    )
+
+
+def add_connector_arguments(parser) -> None:
+    """Add the aiohttp connector options to a command line parser."""
+    parser.add_argument('--limit', type=int,
+                        help='每個程序最多同時開啟的連線數，0 表示不限 (預設: 並發數；固定速率時不限)')
+    parser.add_argument('--limit-per-host', type=int, default=0,
+                        help='每個主機最多同時開啟的連線數，0 表示不限 (預設: 0)')
+    parser.add_argument('--keepalive-timeout', type=float, default=15.0,
+                        help='閒置的 keep-alive 連線保留秒數 (預設: 15)')
+    parser.add_argument('--dns-ttl', type=int, default=10,
+                        help='DNS 解析結果快取秒數 (預設: 10)')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='停用 keep-alive，每個請求都建立新連線')
+
+
+def connector_options_from_args(args) -> Dict[str, Any]:
+    """Connector settings for ConcurrentApiTester from parsed arguments."""
+    return {
+        "limit": args.limit,
+        "limit_per_host": args.limit_per_host,
+        "keepalive_timeout": args.keepalive_timeout,
+        "ttl_dns_cache": args.dns_ttl,
+        "force_close": args.no_keep_alive,
+    }
+
+
+async def send_request(
+    session: aiohttp.ClientSession,
+    method: str,
+    url: str,
+    data: Any = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 10,
+    start: Optional[float] = None,
+    capture: CapturePolicy = FULL_CAPTURE,
+    timing: Optional[RequestTiming] = None,
+    body: Optional[bytes] = None,
+) -> Tuple[Dict[str, Any], Optional[float]]:
+    """Send one request and build its result record.
+
+    Returns the record and the unrounded latency in seconds, measured from
+    ``start`` (a ``time.perf_counter()`` value, defaulting to now), or None
+    when no response was received. ``capture`` decides whether the body is
+    read, parsed and stored. The record carries the wall-clock ``started``
+    time; ``result_store.to_record`` turns it into the report timestamp.
+    A ``timing`` is filled with the per-phase breakdown when the session was
+    made by ``create_client_session``; the body phase ends once it is read.
+    A ``body`` of pre-serialized bytes is sent as is instead of ``data``.
+    """
+    if start is None:
+        start = time.perf_counter()
+    result: Dict[str, Any] = {
+        "method": method,
+        "url": url,
+        "started": time.time(),
+        "success": False,
+        "status_code": None,
+        "response_time": 0.0,
+        "error": None,
+        "response_data": None,
+    }
+    elapsed = None
+    try:
+        async with session.request(
+            method,
+            url,
+            json=data if data and body is None else None,
+            data=body,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            trace_request_ctx=timing,
+        ) as resp:
+            elapsed = time.perf_counter() - start
+            result["response_time"] = round(elapsed, 3)
+            result["status_code"] = resp.status
+            result["response_data"] = await _read_body(resp, capture)
+            result["success"] = 200 <= resp.status < 300
+            if timing is not None:
+                timing.finish()
+    except Exception as e:  # network or timeout error
+        result["error"] = str(e)
+    return result, elapsed
+
+
+async def _drain(resp: aiohttp.ClientResponse) -> None:
+    """Read and discard the rest of a body so the connection can be reused."""
+    while await resp.content.readany():
+        pass
+
+
+async def _read_body(resp: aiohttp.ClientResponse, capture: CapturePolicy) -> Any:
+    """Read the response body as the capture policy asks; None when not kept."""
+    if not capture.reads_body:
+        # The connection is only reused if the body already arrived in full.
+        resp.release()
+        return None
+    if not capture.should_capture(resp.status):
+        await _drain(resp)
+        return None
+
+    limit = capture.max_bytes
+    if limit is None:
+        data = capture.decode(await resp.read())
+        if capture.mode == "all" and isinstance(data, str):
+            data = data[:TEXT_PREVIEW_CHARS]
+        return data
+
+    # Read one byte past the limit to tell a truncated body from a short one.
+    raw = bytearray()
+    while len(raw) <= limit:
+        chunk = await resp.content.read(limit + 1 - len(raw))
+        if not chunk:
+            break
+        raw += chunk
+    truncated = len(raw) > limit
+    if truncated:
+        await _drain(resp)
+    return capture.decode(bytes(raw[:limit]), truncated)
+
 
 class ConcurrentApiTester:
-    """Send many concurrent requests to a single endpoint."""
+    """Send many concurrent requests to a single endpoint or a weighted mix."""
 
     def __init__(
         self,
         base_url: str,
         endpoint: str,
         method: str = "GET",
-        num_requests: int = 100,
+        num_requests: Optional[int] = 100,
         concurrency: int = 10,
         timeout: int = 10,
         headers: Optional[Dict[str, str]] = None,
         data: Optional[Dict[str, Any]] = None,
+        rate: Optional[float] = None,
+        duration: Optional[float] = None,
+        processes: int = 1,
+        profile: Optional[LoadProfile] = None,
+        shard: Tuple[int, int] = (0, 1),
+        results_file: Optional[str] = None,
+        capture: Optional[CapturePolicy] = None,
+        live: bool = False,
+        live_queue: Any = None,
+        metrics_port: Optional[int] = None,
+        mix: Optional[TrafficMix] = None,
+        connector: Optional[Dict[str, Any]] = None,
+        feeder: Optional[DataFeeder] = None,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.endpoint = endpoint
@@ -31,71 +288,593 @@ class ConcurrentApiTester:
         self.timeout = timeout
         self.headers = headers or {"Content-Type": "application/json"}
         self.data = data
-        self.results: List[Dict[str, Any]] = []
+        # Open-loop mode: requests are sent on a fixed schedule of `rate`
+        # per second regardless of how many are still outstanding.
+        self.rate = rate
+        # With a duration the run stops after that many seconds; the request
+        # budget may then be None to mean "as many as fit".
+        self.duration = duration
+        # A staged load profile drives the arrival rate or the number of
+        # active workers over time, and ends the run after its last stage.
+        self.profile = profile
+        self.shard = shard
+        if profile is not None:
+            if duration is None:
+                self.duration = profile.total_duration
+            if profile.mode == "concurrency":
+                # Workers are numbered across all shards; this shard owns
+                # every ``shard[1]``-th slot starting at ``shard[0]``.
+                slots = math.ceil(profile.peak)
+                self.concurrency = len(range(shard[0], slots, shard[1]))
+        if num_requests is None and self.duration is None:
+            raise ValueError("num_requests or duration is required")
+        # A traffic mix picks each request's test case by weight; method,
+        # endpoint and data then come from the case instead of the above.
+        self.mix = mix
+        # Each request takes the next row of the data file and fills the
+        # {{field}} placeholders of its URL, headers and body; with several
+        # processes every worker reads its own share of the rows.
+        if feeder is not None and feeder.shard != shard:
+            feeder = feeder.for_shard(shard)
+        self.feeder = feeder
+        # URL, headers and body are compiled once; a request only fills in
+        # its placeholders, and a constant body is sent as cached bytes.
+        fields = feeder.fields if feeder is not None else ()
+        self.template = RequestTemplate(self.method, self.url, data, self.headers, fields)
+        self._case_templates = {
+            case["name"]: RequestTemplate(case["method"], case["url"], case["data"], case["headers"], fields)
+            for case in mix.entries
+        } if mix is not None else {}
+        self._seq = 0
+        # Connection pool settings; see create_client_session().
+        self.connector = dict(CONNECTOR_DEFAULTS, **(connector or {}))
+        # Each process runs its own event loop and session on a shard of
+        # the request budget / target rate; see run().
+        self.processes = max(1, processes)
+        # In a closed loop every process runs at least one worker, so more
+        # processes than workers would raise the total concurrency.
+        if not rate and (profile is None or profile.mode == "concurrency"):
+            self.processes = min(self.processes, max(1, self.concurrency))
+        self.worker_stats: List[Dict[str, Any]] = []
+        self.deadline: Optional[float] = None
+        self.dispatched = 0
+        # With a results file every record is streamed to JSONL as it
+        # completes instead of being kept in ``results``; summaries come
+        # from ``stats`` either way.
+        self.results_file = results_file
+        self._sink: Optional[JsonlResultSink] = None
+        # Which response bodies are read and kept; "none" and "status" keep
+        # the load generator's CPU on sending rather than decoding bodies.
+        self.capture = capture or CapturePolicy()
+        dimensions = []
+        if profile is not None:
+            dimensions.append("stage")
+        if mix is not None:
+            dimensions.append("test_case_name")
+        self.results = ResultStore(case_field=dimensions[0] if dimensions else None)
+        # Updated once per request; per-stage and per-test-case latency
+        # histograms for profiles and mixes.
+        self.stats = StatsAccumulator(*dimensions, percentile_dimensions=dimensions)
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self.max_send_lag = 0.0
+        # Live view: completed requests also go into per-second buckets that
+        # a once-a-second task renders (or, in a worker process, forwards
+        # to the parent through ``live_queue``).
+        self.live = live
+        self.live_queue = live_queue
+        self.live_window = LiveWindow() if live or live_queue is not None else None
+        self._live_forwarded = 0
+        self._dashboard: Optional[LiveDashboard] = None
+        self.in_flight = 0
+        # Optional Prometheus endpoint, read straight from ``stats``; each
+        # worker process serves its own on ``metrics_port + worker id``.
+        self.metrics_port = metrics_port
+        self.loop_lag: Optional[LoopLagMonitor] = None
 
-    async def _run_single(self, session: aiohttp.ClientSession, sem: asyncio.Semaphore) -> None:
-        """Execute a single request and record statistics."""
-        async with sem:
-            start = time.time()
-            result: Dict[str, Any] = {
-                "method": self.method,
-                "url": self.url,
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "success": False,
-                "status_code": None,
-                "response_time": 0.0,
-                "error": None,
-                "response_data": None,
-            }
-            try:
-                async with session.request(
-                    self.method,
-                    self.url,
-                    json=self.data if self.data else None,
-                    timeout=self.timeout,
-                ) as resp:
-                    elapsed = time.time() - start
-                    result["response_time"] = round(elapsed, 3)
-                    result["status_code"] = resp.status
-                    try:
-                        result["response_data"] = await resp.json()
-                    except Exception:
-                        text = await resp.text()
-                        result["response_data"] = text[:200]
-                    result["success"] = 200 <= resp.status < 300
-            except Exception as e:  # network or timeout error
-                result["error"] = str(e)
+    @property
+    def total_requests(self) -> int:
+        return self.stats.total
+
+    @property
+    def successful_requests(self) -> int:
+        return self.stats.successes
+
+    @property
+    def histogram(self) -> LatencyHistogram:
+        return self.stats.histogram
+
+    async def _send(self, session: aiohttp.ClientSession, scheduled: Optional[float] = None) -> None:
+        """Execute a single request and record statistics.
+
+        Latency is measured from ``scheduled`` when given (open loop), so
+        time spent waiting behind earlier requests is not hidden.
+        """
+        start = time.perf_counter()
+        if scheduled is not None:
+            self.max_send_lag = max(self.max_send_lag, start - scheduled)
+            start = scheduled
+        keys = {}
+        if self.profile is not None:
+            keys["stage"] = (self.profile.stage_at(start - self.started_at) or self.profile.stages[-1])["name"]
+        template, timeout = self.template, self.timeout
+        if self.mix is not None:
+            case = self.mix.pick()
+            keys["test_case_name"] = case["name"]
+            template = self._case_templates[case["name"]]
+            timeout = case["timeout"] or self.timeout
+        row = None
+        if self.feeder is not None:
+            row = self.feeder.next_row()
+            if row is None:
+                # A unique feed ran out of rows: this request is not sent.
+                self.dispatched -= 1
+                return
+        # {{seq}} counts across all worker processes without repeating.
+        seq = self.shard[0] + self._seq * self.shard[1]
+        self._seq += 1
+        url, headers, body = template.render(row, seq)
+        timing = RequestTiming()
+        self.in_flight += 1
+        result, elapsed = await send_request(
+            session, template.method, url, headers=headers, timeout=timeout, start=start,
+            capture=self.capture, timing=timing, body=body,
+        )
+        self.in_flight -= 1
+        if self.live_window is not None:
+            self.live_window.record(elapsed, None if result["success"] else error_class(result))
+        result.update(keys)
+        self.stats.add(result, elapsed, timing.phases, **keys)
+        self._record(result)
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        """Keep or stream a finished request's record."""
+        if self._sink is not None:
+            self._sink.write(to_record(result))
+        else:
             self.results.append(result)
 
+    def _claim(self) -> bool:
+        """Reserve the next request; False once the budget or deadline is used up."""
+        if self.num_requests is not None and self.dispatched >= self.num_requests:
+            return False
+        if self.feeder is not None and self.feeder.exhausted:
+            return False
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return False
+        self.dispatched += 1
+        return True
+
+    def _worker_active(self, slot: int) -> bool:
+        """Whether worker ``slot`` should be sending under a concurrency profile."""
+        if self.profile is None or self.profile.mode != "concurrency":
+            return True
+        _, level = self.profile.level_at(time.perf_counter() - self.started_at)
+        return slot < round(level)
+
+    async def _worker(self, session: aiohttp.ClientSession, slot: int = 0) -> None:
+        """Send requests back to back until there is nothing left to claim."""
+        while True:
+            if not self._worker_active(slot):
+                if self.deadline is not None and time.perf_counter() >= self.deadline:
+                    return
+                await asyncio.sleep(PROFILE_STEP)
+                continue
+            if not self._claim():
+                return
+            await self._send(session)
+
+    async def _run_closed_loop(self, session: aiohttp.ClientSession) -> None:
+        """Keep at most ``concurrency`` requests in flight.
+
+        A fixed pool of workers pulls from a shared counter, so scheduler
+        memory depends on ``concurrency`` rather than on the request budget.
+        """
+        index, count = self.shard
+        workers = [
+            asyncio.ensure_future(self._worker(session, index + i * count))
+            for i in range(self.concurrency)
+        ]
+        await asyncio.gather(*workers)
+
+    def _rate_at(self, elapsed: float) -> float:
+        """Target arrival rate ``elapsed`` seconds into the run."""
+        if self.profile is not None and self.profile.mode == "rate":
+            return self.profile.level_at(elapsed)[1]
+        return self.rate
+
+    async def _run_open_loop(self, session: aiohttp.ClientSession) -> None:
+        """Send requests on an arrival-rate schedule.
+
+        The rate is re-read at least every PROFILE_STEP seconds, so staged
+        profiles ramp smoothly. Only requests still in flight are tracked;
+        with a per-request timeout that is bounded by roughly
+        ``rate * timeout`` tasks.
+        """
+        in_flight = set()
+        scheduled = self.started_at
+        credit = 0.0
+        sent = 0
+        while self.num_requests is None or sent < self.num_requests:
+            if self.deadline is not None and scheduled >= self.deadline:
+                break
+            if self.feeder is not None and self.feeder.exhausted:
+                break
+            rate = self._rate_at(scheduled - self.started_at)
+            wait = (1.0 - credit) / rate if rate > 0 else math.inf
+            if wait > PROFILE_STEP:
+                credit += rate * PROFILE_STEP
+                scheduled += PROFILE_STEP
+                continue
+            scheduled += max(wait, 0.0)
+            credit = 0.0
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self._send(session, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            self.dispatched += 1
+            sent += 1
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    def _remaining(self, elapsed: float, completed: int) -> Optional[float]:
+        """Estimated seconds left: from the duration, or from the pace so far."""
+        if self.duration:
+            return max(self.duration - elapsed, 0.0)
+        if self.num_requests and completed and elapsed > 0:
+            return max(self.num_requests - completed, 0) / (completed / elapsed)
+        return None
+
+    def _forward_live(self, until: int) -> None:
+        """Send the finished per-second buckets before ``until`` to the parent."""
+        seconds = []
+        for second in range(max(self._live_forwarded, until - self.live_window.seconds), until):
+            data = self.live_window.second_data(second)
+            if data is not None:
+                seconds.append(data)
+        self._live_forwarded = until
+        self.live_queue.put({"worker": self.shard[0], "in_flight": self.in_flight, "seconds": seconds})
+
+    async def _live_loop(self) -> None:
+        """Refresh the live view, or feed the parent process, once a second."""
+        self._live_forwarded = int(time.monotonic())
+        while True:
+            # Fire just after each second closes so its bucket is complete.
+            await asyncio.sleep(seconds_until_tick(0.05))
+            if self.live_queue is not None:
+                self._forward_live(int(time.monotonic()))
+            else:
+                self._refresh_live()
+
+    def _refresh_live(self) -> None:
+        if self._dashboard is None:
+            self._dashboard = LiveDashboard(self.live_window)
+        elapsed = time.perf_counter() - self.started_at
+        self._dashboard.refresh(elapsed, self._remaining(elapsed, self.live_window.total), self.in_flight)
+
+    def _connector_options(self) -> Dict[str, Any]:
+        """Connector settings with the connection limit filled in for this run."""
+        options = dict(self.connector)
+        if options["limit"] is None:
+            open_loop = self.rate or (self.profile is not None and self.profile.mode == "rate")
+            options["limit"] = 0 if open_loop else self.concurrency
+        return options
+
+    def render_metrics(self) -> str:
+        """Prometheus text for the metrics endpoint."""
+        return format_metrics(self.stats, self.in_flight, self.loop_lag)
+
     async def run_tests(self) -> None:
         """Run the stress test."""
-        sem = asyncio.Semaphore(self.concurrency)
-        timeout = aiohttp.ClientTimeout(total=None)
-        async with aiohttp.ClientSession(headers=self.headers, timeout=timeout) as session:
-            tasks = [self._run_single(session, sem) for _ in range(self.num_requests)]
-            await asyncio.gather(*tasks)
+        if self.results_file:
+            self._sink = JsonlResultSink(self.results_file)
+        live_task = lag_task = server = None
+        try:
+            if self.metrics_port is not None:
+                self.loop_lag = LoopLagMonitor()
+                lag_task = asyncio.ensure_future(self.loop_lag.run())
+                server = MetricsServer(self.render_metrics, self.metrics_port).start()
+            async with create_client_session(self.headers, **self._connector_options()) as session:
+                self.started_at = time.perf_counter()
+                self.deadline = self.started_at + self.duration if self.duration else None
+                self.dispatched = 0
+                if self.live_window is not None:
+                    live_task = asyncio.ensure_future(self._live_loop())
+                if self.rate or (self.profile is not None and self.profile.mode == "rate"):
+                    await self._run_open_loop(session)
+                else:
+                    await self._run_closed_loop(session)
+                self.finished_at = time.perf_counter()
+        finally:
+            if live_task is not None:
+                live_task.cancel()
+                if self.live_queue is not None:
+                    # Include the partial last second so the parent's totals match.
+                    self._forward_live(int(time.monotonic()) + 1)
+                else:
+                    self._refresh_live()
+            if lag_task is not None:
+                lag_task.cancel()
+            if server is not None:
+                server.stop()
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
+
+    def _shard_options(self) -> List[Dict[str, Any]]:
+        """Split the request budget, concurrency and rate across processes."""
+        shards = []
+        for worker_id in range(self.processes):
+            num_requests = None
+            if self.num_requests is not None:
+                num_requests = self.num_requests // self.processes
+                num_requests += 1 if worker_id < self.num_requests % self.processes else 0
+            concurrency = self.concurrency // self.processes
+            concurrency += 1 if worker_id < self.concurrency % self.processes else 0
+            profile = self.profile
+            if profile is not None and profile.mode == "rate":
+                profile = profile.scaled(1 / self.processes)
+            shards.append({
+                "base_url": self.base_url,
+                "endpoint": self.endpoint,
+                "method": self.method,
+                "num_requests": num_requests,
+                "concurrency": max(1, concurrency),
+                "timeout": self.timeout,
+                "headers": self.headers,
+                "data": self.data,
+                "rate": self.rate / self.processes if self.rate else None,
+                "duration": self.duration,
+                "profile": profile,
+                "shard": (worker_id, self.processes),
+                "results_file": f"{self.results_file}.part{worker_id}" if self.results_file else None,
+                "capture": self.capture,
+                "live_queue": None,
+                "metrics_port": self.metrics_port + worker_id if self.metrics_port is not None else None,
+                "mix": self.mix,
+                "connector": self.connector,
+                "feeder": self.feeder,
+            })
+        return shards
+
+    def _relay_live(self, updates: Any, done: threading.Event) -> None:
+        """Merge the workers' per-second buckets and redraw the live view."""
+        dashboard = LiveDashboard(self.live_window)
+        in_flight: Dict[int, int] = {}
+        started = time.perf_counter()
+        while True:
+            finished = done.wait(seconds_until_tick(0.3))
+            while True:
+                try:
+                    update = updates.get_nowait()
+                except queue.Empty:
+                    break
+                in_flight[update["worker"]] = update["in_flight"]
+                for data in update["seconds"]:
+                    self.live_window.merge_second(data)
+            elapsed = time.perf_counter() - started
+            dashboard.refresh(elapsed, self._remaining(elapsed, self.live_window.total), sum(in_flight.values()))
+            if finished:
+                return
+
+    def run(self) -> None:
+        """Run the stress test, spreading it over worker processes if requested."""
+        if self.processes == 1:
+            asyncio.run(self.run_tests())
+            return
+
+        shards = self._shard_options()
+        relay = manager = None
+        done = threading.Event()
+        if self.live:
+            # Workers push one message per second; this thread merges and draws.
+            manager = multiprocessing.Manager()
+            updates = manager.Queue()
+            for shard in shards:
+                shard["live_queue"] = updates
+            relay = threading.Thread(target=self._relay_live, args=(updates, done), daemon=True)
+            relay.start()
+        try:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                outcomes = list(pool.map(_run_shard, shards))
+        finally:
+            if relay is not None:
+                done.set()
+                relay.join()
+                manager.shutdown()
+        if self.results_file:
+            concat_jsonl([shard["results_file"] for shard in shards], self.results_file)
+
+        # Process start-up is excluded: the run lasts as long as the slowest worker.
+        longest = max(outcome["duration"] for outcome in outcomes)
+        self.started_at = 0.0
+        self.finished_at = longest
+        for worker_id, outcome in enumerate(outcomes):
+            self.results.extend(outcome["results"])
+            self.stats.merge(outcome["stats"])
+            self.max_send_lag = max(self.max_send_lag, outcome["max_send_lag"])
+            if self.feeder is not None:
+                self.feeder.rows_read += outcome["rows_read"]
+            requests = outcome["stats"].total
+            self.worker_stats.append({
+                "worker": worker_id,
+                "requests": requests,
+                "duration": round(outcome["duration"], 3),
+                "throughput": round(requests / outcome["duration"], 2)
+                if outcome["duration"] > 0
+                else 0,
+            })
+
+    def _rate_summary(self) -> Dict[str, Any]:
+        """Scheduled vs. achieved request rate for the run."""
+        duration = self.finished_at - self.started_at
+        return {
+            "mode": "profile" if self.profile else "open" if self.rate else "closed",
+            "duration": round(duration, 3),
+            "target_rate": self.rate,
+            "achieved_rate": round(self.total_requests / duration, 2) if duration > 0 else 0,
+            "max_send_lag": round(self.max_send_lag, 3),
+        }
+
+    def _pool_summary(self) -> Dict[str, Any]:
+        """Connector settings and how long requests waited for a pooled connection.
+
+        The wait is part of each request's response time; it is reported on
+        its own so a client-side connection limit is not read as server latency.
+        """
+        wait = self.stats.phases.get("queue")
+        waited = wait.count if wait is not None else 0
+        return {
+            **self._connector_options(),
+            "waited_requests": waited,
+            "waited_share": round(waited / self.total_requests * 100, 2) if self.total_requests else 0,
+            "wait_mean": round(wait.mean, 6) if waited else 0.0,
+            "wait_p99": wait.percentile(99) if waited else 0.0,
+            "wait_max": wait.max if waited else 0.0,
+        }
+
+    def _stage_report(self) -> List[Dict[str, Any]]:
+        """Per-stage counts, throughput and latency for a load profile run."""
+        report = []
+        if self.profile is None:
+            return report
+        groups = self.stats.group("stage")
+        for stage in self.profile.stages:
+            group = groups.get(stage["name"])
+            if group is None:
+                group = groups[stage["name"]] = GroupStats(percentiles=True)
+            report.append({
+                "name": stage["name"],
+                "duration": stage["duration"],
+                "requests": group.count,
+                "successes": group.successes,
+                "success_rate": group.success_rate,
+                "throughput": round(group.count / stage["duration"], 2),
+                "percentiles": group.latency.percentiles(),
+                "latency_histogram": group.latency.to_dict(),
+            })
+        return report
+
+    def _mix_report(self) -> List[Dict[str, Any]]:
+        """Per-test-case share, throughput, latency and errors for a traffic mix run."""
+        report = []
+        if self.mix is None:
+            return report
+        groups = self.stats.group("test_case_name")
+        duration = self.finished_at - self.started_at
+        for case in self.mix.entries:
+            group = groups.get(case["name"])
+            if group is None:
+                group = groups[case["name"]] = GroupStats(percentiles=True)
+            report.append({
+                "name": case["name"],
+                "method": case["method"],
+                "url": case["url"],
+                "weight": case["weight"],
+                "target_share": round(self.mix.share(case), 2),
+                "share": round(group.count / self.total_requests * 100, 2) if self.total_requests else 0,
+                "requests": group.count,
+                "successes": group.successes,
+                "success_rate": group.success_rate,
+                "throughput": round(group.count / duration, 2) if duration > 0 else 0,
+                "errors": dict(group.errors.most_common()),
+                "percentiles": group.latency.percentiles(),
+                "latency_histogram": group.latency.to_dict(),
+            })
+        return report
 
     def print_summary(self) -> None:
         """Print summary statistics for the run."""
-        total = len(self.results)
-        successes = sum(1 for r in self.results if r["success"])
-        times = [r["response_time"] for r in self.results if r["response_time"] > 0]
+        total = self.total_requests
+        successes = self.successful_requests
         success_rate = (successes / total * 100) if total else 0
-        avg_time = sum(times) / len(times) if times else 0
-        max_time = max(times) if times else 0
-        min_time = min(times) if times else 0
+        avg_time = self.histogram.mean
+        max_time = self.histogram.max
+        min_time = self.histogram.min
 
         print("=" * 60)
         print("📊 壓力測試結果")
         print("=" * 60)
-        print(f"URL: {self.url}")
-        print(f"方法: {self.method}")
+        if self.mix is not None:
+            print(f"流量組合: {len(self.mix.entries)} 個測試案例")
+        else:
+            print(f"URL: {self.url}")
+            print(f"方法: {self.method}")
+        if self.feeder is not None:
+            exhausted = "，已全部讀完" if self.feeder.exhausted else ""
+            print(f"資料檔: {self.feeder.path} ({self.feeder.mode})，讀取 {self.feeder.rows_read} 列{exhausted}")
         print(f"總請求數: {total}")
         print(f"成功請求: {successes}")
         print(f"成功率: {success_rate:.1f}%")
         print(f"平均回應時間: {avg_time:.3f}s")
         print(f"最快回應時間: {min_time:.3f}s")
         print(f"最慢回應時間: {max_time:.3f}s")
+        for name, value in self.histogram.percentiles().items():
+            print(f"{name.upper()} 回應時間: {format_latency(value)}")
+        statuses = ", ".join(
+            f"{status or '無回應'}: {count}"
+            for status, count in sorted(self.stats.status_counts.items(), key=lambda item: -item[1])
+        )
+        print(f"狀態碼分佈: {statuses}")
+        print_phase_summary(self.stats.phase_summary())
+        pool = self._pool_summary()
+        keep_alive = "停用" if pool["force_close"] else f"{pool['keepalive_timeout']:g}s"
+        print(f"🔌 連線池: 上限 {pool['limit'] or '不限'}，每主機 {pool['limit_per_host'] or '不限'}，"
+              f"keep-alive {keep_alive}，DNS 快取 {pool['ttl_dns_cache']}s")
+        if pool["waited_requests"]:
+            print(f"⏳ 等待連線池: {pool['waited_requests']} 個請求 ({pool['waited_share']:.1f}%)，"
+                  f"平均 {format_latency(pool['wait_mean'])}，P99 {format_latency(pool['wait_p99'])}，"
+                  f"最久 {format_latency(pool['wait_max'])}")
+            print("   回應時間包含用戶端等待連線的時間，並非伺服器延遲；可用 --limit 提高連線上限")
+        if self.stats.error_counts:
+            print("錯誤類別:")
+            for name, count in self.stats.error_counts.most_common(10):
+                print(f"  {name}: {count}")
+
+        rates = self._rate_summary()
+        if self.rate:
+            print(f"目標速率: {rates['target_rate']:.2f} req/s")
+            print(f"實際速率: {rates['achieved_rate']:.2f} req/s")
+            print(f"最大發送延遲: {rates['max_send_lag']:.3f}s")
+        else:
+            print(f"吞吐量: {rates['achieved_rate']:.2f} req/s")
+
+        if self.worker_stats:
+            print("-" * 60)
+            print(f"Worker 程序數: {len(self.worker_stats)}")
+            for worker in self.worker_stats:
+                print(f"  Worker {worker['worker']}: {worker['requests']} 請求, {worker['throughput']:.2f} req/s")
+            throughputs = [w["throughput"] for w in self.worker_stats]
+            if min(throughputs) > 0:
+                print(f"吞吐量不平衡 (最大/最小): {max(throughputs) / min(throughputs):.2f}x")
+
+        if self.profile is not None:
+            print("-" * 60)
+            print(f"📈 負載階段 ({self.profile.mode})")
+            print("階段" + " " * 12 + "  請求數" + "    成功率" + f"{'req/s':>10}{'P50':>11}{'P99':>11}")
+            for stage in self._stage_report():
+                print(
+                    f"{stage['name']:<16}{stage['requests']:>8}{stage['success_rate']:>9.1f}%"
+                    f"{stage['throughput']:>10.2f}{format_latency(stage['percentiles']['p50']):>11}"
+                    f"{format_latency(stage['percentiles']['p99']):>11}"
+                )
+
+        if self.mix is not None:
+            print("-" * 60)
+            print("🔀 各測試案例 (實際比例/設定比例)")
+            for case in self._mix_report():
+                print(f"  {case['name']} ({case['method']} {case['url']})")
+                print(
+                    f"    {case['requests']} 請求 {case['share']:.1f}%/{case['target_share']:.1f}%"
+                    f"  成功率 {case['success_rate']:.1f}%  {case['throughput']:.2f} req/s"
+                    f"  P50 {format_latency(case['percentiles']['p50'])}"
+                    f"  P99 {format_latency(case['percentiles']['p99'])}"
+                )
+                if case["errors"]:
+                    errors = ", ".join(f"{name}: {count}" for name, count in list(case["errors"].items())[:3])
+                    print(f"    錯誤類別: {errors}")
 
     def generate_report(self, output_file: str) -> None:
         """Generate JSON report."""
@@ -103,36 +882,58 @@ class ConcurrentApiTester:
 
         report = {
             "summary": {
-                "total_requests": len(self.results),
-                "successful_requests": sum(1 for r in self.results if r["success"]),
+                "total_requests": self.total_requests,
+                "successful_requests": self.successful_requests,
                 "success_rate": (
-                    sum(1 for r in self.results if r["success"]) / len(self.results) * 100
-                    if self.results
-                    else 0
-                ),
-                "average_time": (
-                    sum(r["response_time"] for r in self.results) / len(self.results)
-                    if self.results
+                    self.successful_requests / self.total_requests * 100
+                    if self.total_requests
                     else 0
                 ),
-                "max_time": max((r["response_time"] for r in self.results), default=0),
-                "min_time": min((r["response_time"] for r in self.results), default=0),
+                "average_time": round(self.histogram.mean, 6),
+                "max_time": self.histogram.max,
+                "min_time": self.histogram.min,
+                **self._rate_summary(),
+                "percentiles": self.histogram.percentiles(),
+                "phases": self.stats.phase_summary(),
+                "connection_pool": self._pool_summary(),
             },
-            "results": self.results,
+            "latency_histogram": self.histogram.to_dict(),
+            "stats": self.stats.to_dict(),
+            "capture": str(self.capture),
+            "workers": self.worker_stats,
+            **({"profile": self.profile.to_dict(), "stages": self._stage_report()} if self.profile else {}),
+            **({"mix": self.mix.to_dict(), "test_cases": self._mix_report()} if self.mix else {}),
+            **({"feed": {**self.feeder.to_dict(), "rows_read": self.feeder.rows_read}} if self.feeder else {}),
         }
+        if self.results_file:
+            report["results_file"] = self.results_file
+        else:
+            report["results"] = list(self.results)
 
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(report, f, indent=2, ensure_ascii=False)
         print(f"📄 JSON 報告已生成: {output_file}")
 
-    def generate_html_report(self, json_file: str, html_file: str) -> None:
-        """Generate HTML report from JSON using ReportGenerator."""
-        from report_generator import ReportGenerator
+    def generate_html_report(self, json_file: str, html_file: str, mode: str = "auto") -> None:
+        """Generate HTML report from JSON using ReportGenerator (aggregated for large runs)."""
+        from report_generator import create_report_generator
         import json
 
         with open(json_file, "r", encoding="utf-8") as f:
             data = json.load(f)
-        generator = ReportGenerator(data.get("results", []))
+        generator = create_report_generator(data, mode)
         # modify summary card to include extra metrics if necessary
         generator.generate_html_report(html_file)
 
+
+def _run_shard(options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one worker process' share of a stress test and return its outcome."""
+    tester = ConcurrentApiTester(**options)
+    asyncio.run(tester.run_tests())
+    return {
+        "results": tester.results,
+        "stats": tester.stats,
+        "duration": tester.finished_at - tester.started_at,
+        "max_send_lag": tester.max_send_lag,
+        "rows_read": tester.feeder.rows_read if tester.feeder is not None else 0,
+    }
@@ -0,0 +1,246 @@
+"""
+資料驅動請求 - 從大型 CSV/JSONL 檔逐列讀取資料，填入 URL、標頭與本文中的 {{欄位}} 佔位符
+"""
+
+import csv
+import json
+import mmap
+import os
+import random
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+FEED_MODES = ('sequential', 'random', 'unique')
+
+PLACEHOLDER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+
+class DataFeeder:
+    """以 mmap 逐列讀取資料檔，不會把整個檔案載入記憶體
+
+    檔案格式依副檔名判斷：.csv 第一列為欄位名稱 (欄位內不支援換行)；
+    .jsonl/.ndjson 每列一個 JSON 物件，欄位以第一列為準。
+
+    mode:
+        sequential  依檔案順序讀取，讀到結尾後從頭開始
+        random      每次隨機選一列 (第一次使用時建立各列的位移索引)
+        unique      依檔案順序讀取且每列只用一次，讀完後 exhausted 為 True
+
+    shard 為 (worker 編號, worker 數)：sequential 與 unique 模式下資料區依位元組平均
+    切成 worker 數段 (邊界對齊到列首)，每個 worker 只讀取自己那一段，多程序時各列只會
+    分給一個 worker，也不必掃過其他 worker 的資料。各段列數依列長而定，大致相同。
+    """
+
+    def __init__(self, path: str, mode: str = 'sequential', shard: Tuple[int, int] = (0, 1)):
+        if mode not in FEED_MODES:
+            raise ValueError(f"不支援的資料讀取模式: {mode} (可用: {', '.join(FEED_MODES)})")
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            self.format = 'csv'
+        elif extension in ('.jsonl', '.ndjson'):
+            self.format = 'jsonl'
+        else:
+            raise ValueError(f"不支援的資料檔格式: {path} (可用: .csv、.jsonl、.ndjson)")
+        self.path = path
+        self.mode = mode
+        self.shard = shard
+        self.fields: List[str] = []
+        self.rows_read = 0
+        self.exhausted = False
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._offsets: Optional[array] = None
+        # 第一筆資料列的位移 (CSV 跳過標題列)、此 worker 的資料範圍與目前讀取位置
+        self._start = 0
+        self._range = (0, 0)
+        self._position = 0
+        # 開啟一次以讀出欄位名稱，也讓檔案不存在或為空時立即報錯
+        self._open()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # mmap 不能序列化；送到 worker 程序後再重新開啟
+        state = dict(self.__dict__)
+        state.update(_file=None, _map=None, _offsets=None)
+        return state
+
+    def for_shard(self, shard: Tuple[int, int]) -> 'DataFeeder':
+        """回傳給某個 worker 使用、從頭讀取的新 feeder"""
+        return DataFeeder(self.path, self.mode, shard)
+
+    def _open(self) -> None:
+        self._file = open(self.path, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.close()
+            raise ValueError(f"資料檔是空的: {self.path}")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.format == 'csv':
+            header, self._start = self._read_line(0)
+            self.fields = next(csv.reader([header.decode('utf-8-sig')]))
+        else:
+            first = self._first_line()
+            if first is None:
+                raise ValueError(f"資料檔沒有任何資料列: {self.path}")
+            self.fields = list(self._parse(first))
+        self._range = self._shard_range()
+        self._position = self._range[0]
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def _read_line(self, position: int) -> Tuple[bytes, int]:
+        """讀取從 position 開始的一列，回傳內容與下一列的位移"""
+        end = self._map.find(b'\n', position)
+        if end == -1:
+            end = len(self._map)
+        return self._map[position:end].rstrip(b'\r'), end + 1
+
+    def _line_start(self, position: int) -> int:
+        """position 所在列的下一個列首 (position 本身是列首時不變)"""
+        if position <= self._start:
+            return self._start
+        end = self._map.find(b'\n', position - 1)
+        return len(self._map) if end == -1 else end + 1
+
+    def _shard_range(self) -> Tuple[int, int]:
+        """此 worker 負責的位元組範圍 [開始, 結束)，兩端都是列首"""
+        index, count = self.shard
+        size = len(self._map) - self._start
+        return (
+            self._line_start(self._start + size * index // count),
+            self._line_start(self._start + size * (index + 1) // count),
+        )
+
+    def _first_line(self) -> Optional[bytes]:
+        position = self._start
+        while position < len(self._map):
+            line, position = self._read_line(position)
+            if line.strip():
+                return line
+        return None
+
+    def _parse(self, line: bytes) -> Dict[str, Any]:
+        if self.format == 'csv':
+            return dict(zip(self.fields, next(csv.reader([line.decode('utf-8')]))))
+        return json.loads(line)
+
+    def _build_index(self) -> array:
+        """記錄每一筆非空白資料列的位移 (每列 8 位元組)"""
+        offsets = array('Q')
+        position = self._start
+        size = len(self._map)
+        while position < size:
+            end = self._map.find(b'\n', position)
+            if end == -1:
+                end = size
+            if self._map[position:end].strip():
+                offsets.append(position)
+            position = end + 1
+        if not offsets:
+            raise ValueError(f"資料檔沒有任何資料列: {self.path}")
+        return offsets
+
+    def _next_line(self) -> Optional[bytes]:
+        """依檔案順序取得此 worker 範圍內的下一筆資料列"""
+        start, end = self._range
+        wrapped = False
+        while True:
+            if self._position >= end:
+                if self.mode == 'unique':
+                    return None
+                if wrapped:
+                    raise ValueError(f"資料檔沒有分配給 worker {self.shard[0]} 的資料列: {self.path}")
+                self._position = start
+                wrapped = True
+            line, self._position = self._read_line(self._position)
+            if line.strip():
+                return line
+
+    def next_row(self) -> Optional[Dict[str, Any]]:
+        """取得下一列資料；unique 模式讀完時回傳 None"""
+        if self.exhausted:
+            return None
+        if self._map is None:
+            self._open()
+        if self.mode == 'random':
+            if self._offsets is None:
+                self._offsets = self._build_index()
+            line = self._read_line(self._offsets[random.randrange(len(self._offsets))])[0]
+        else:
+            line = self._next_line()
+            if line is None:
+                self.exhausted = True
+                return None
+        self.rows_read += 1
+        return self._parse(line)
+
+    def missing_fields(self, *templates: Any) -> List[str]:
+        """templates 中引用、但資料檔沒有的欄位名稱"""
+        return sorted(placeholders(templates) - set(self.fields))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成可寫入報告的格式"""
+        return {'file': self.path, 'mode': self.mode, 'fields': self.fields}
+
+
+def placeholders(value: Any) -> set:
+    """找出字串、字典與串列中所有 {{欄位}} 佔位符的欄位名稱"""
+    if isinstance(value, str):
+        return set(PLACEHOLDER.findall(value))
+    if isinstance(value, dict):
+        value = list(value.keys()) + list(value.values())
+    if isinstance(value, (list, tuple)):
+        names = set()
+        for item in value:
+            names |= placeholders(item)
+        return names
+    return set()
+
+
+def value_text(value: Any, url: bool = False) -> str:
+    """佔位符的值嵌入字串時的文字；物件與串列轉成 JSON"""
+    if value is None:
+        text = ''
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value, ensure_ascii=False)
+    else:
+        text = str(value)
+    return quote(text, safe='') if url else text
+
+
+def fill_text(text: str, row: Dict[str, Any], url: bool = False) -> str:
+    """將字串中的佔位符換成資料列的值；url 為 True 時值會經過 URL 編碼"""
+    if '{{' not in text:
+        return text
+    return PLACEHOLDER.sub(lambda match: value_text(row.get(match.group(1)), url), text)
+
+
+def fill_value(value: Any, row: Dict[str, Any]) -> Any:
+    """遞迴填入 JSON 本文；整個字串只有一個佔位符時保留原本的型別 (例如 JSONL 的數字)"""
+    if isinstance(value, str):
+        match = PLACEHOLDER.fullmatch(value)
+        if match:
+            return row.get(match.group(1))
+        return fill_text(value, row)
+    if isinstance(value, dict):
+        return {fill_text(key, row): fill_value(item, row) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_value(item, row) for item in value]
+    return value
+
+
+def fill_headers(headers: Optional[Dict[str, str]], row: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    if not headers:
+        return headers
+    return {name: fill_text(str(value), row) for name, value in headers.items()}
+
+
+def add_feed_arguments(parser) -> None:
+    """在命令列加入資料檔參數"""
+    parser.add_argument('--feed', help='資料檔 (CSV/JSONL)，每個請求讀取一列填入端點、標頭與本文中的 {{欄位}}')
+    parser.add_argument('--feed-mode', choices=FEED_MODES, default='sequential',
+                        help='資料列讀取方式: sequential 依序循環、random 隨機、unique 每列只用一次 (預設: sequential)')
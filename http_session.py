@@ -0,0 +1,99 @@
+"""
+共用的連線池 HTTP Session - 讓同步測試器重複使用 keep-alive 連線
+"""
+
+import argparse
+from typing import Dict, Optional
+
+import requests
+from urllib3.util.retry import Retry
+
+from request_timing import TimedHTTPAdapter
+
+
+def create_session(
+    pool_connections: int = 10,
+    pool_maxsize: int = 10,
+    max_retries: int = 0,
+    keep_alive: bool = True,
+    headers: Optional[Dict[str, str]] = None,
+) -> requests.Session:
+    """建立具連線池的 requests Session
+
+    pool_connections: 快取的主機連線池數量
+    pool_maxsize: 每個主機最多保留的連線數
+    max_retries: 連線失敗時的重試次數 (僅冪等方法會在讀取錯誤時重試)
+    keep_alive: 關閉時每個請求都會要求伺服器結束連線
+
+    連線使用分段計時的 urllib3 連線類別，請求以 request_timing.start_timing()
+    開始量測時會記錄 DNS、連線、TLS 與首位元組時間。
+    """
+    session = requests.Session()
+    retry = Retry(total=max_retries, backoff_factor=0.1, raise_on_status=False)
+    adapter = TimedHTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    if headers:
+        session.headers.update(headers)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def get_connection_stats(session: requests.Session) -> Dict[str, int]:
+    """統計 Session 目前連線池開啟與重複使用的連線數"""
+    opened = 0
+    requests_sent = 0
+    seen = set()
+
+    for adapter in session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            requests_sent += pool.num_requests
+
+    return {
+        'requests': requests_sent,
+        'connections_opened': opened,
+        'connections_reused': max(requests_sent - opened, 0),
+    }
+
+
+def add_session_arguments(parser: argparse.ArgumentParser) -> None:
+    """在命令列加入連線池相關參數"""
+    parser.add_argument('--pool-connections', type=int, default=10,
+                        help='快取的主機連線池數量 (預設: 10)')
+    parser.add_argument('--pool-maxsize', type=int, default=10,
+                        help='每個主機最多保留的連線數 (預設: 10)')
+    parser.add_argument('--retries', type=int, default=0,
+                        help='連線失敗重試次數 (預設: 0)')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='停用 keep-alive，每個請求都建立新連線')
+
+
+def create_session_from_args(args: argparse.Namespace, min_pool_size: int = 0) -> requests.Session:
+    """依命令列參數建立 Session"""
+    return create_session(
+        pool_connections=args.pool_connections,
+        pool_maxsize=max(args.pool_maxsize, min_pool_size),
+        max_retries=args.retries,
+        keep_alive=not args.no_keep_alive,
+    )
+
+
+def print_connection_stats(stats: Dict[str, int]) -> None:
+    """輸出連線重複使用統計"""
+    print(f"🔌 連線: 開啟 {stats['connections_opened']} 條，"
+          f"重複使用 {stats['connections_reused']} 次 (共 {stats['requests']} 個請求)")
@@ -0,0 +1,211 @@
+"""
+HDR 風格的延遲直方圖 - 固定記憶體、O(1) 記錄、可跨 worker 合併
+"""
+
+from array import array
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# 報告中固定輸出的百分位
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def format_latency(seconds: float) -> str:
+    """將延遲格式化為易讀字串 (1 秒以下以毫秒顯示)"""
+    if seconds >= 1:
+        return f"{seconds:.3f}s"
+    return f"{seconds * 1000:.2f}ms"
+
+
+class LatencyHistogram:
+    """以微秒為單位的對數分桶直方圖
+
+    每個 2 的次方區間再線性切成 2^(sub_bucket_bits-1) 個子桶，
+    預設 7 bits 時相對誤差小於 1.6%，記錄與合併都不需要保存原始資料。
+    """
+
+    def __init__(self, sub_bucket_bits: int = 7, max_value_us: int = 3_600_000_000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count >> 1
+        self.max_value_us = max_value_us
+        self.counts = array('q', bytes(8 * (self._index(max_value_us) + 1)))
+        self.total_count = 0
+        self.sum_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    def _index(self, value: int) -> int:
+        """計算數值所屬的桶索引"""
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.sub_bucket_half + ((value >> shift) - self.sub_bucket_half)
+
+    def _bucket_range(self, index: int) -> Tuple[int, int]:
+        """取得桶索引涵蓋的數值範圍 (含上下界)"""
+        if index < self.sub_bucket_count:
+            return index, index
+        offset = index - self.sub_bucket_count
+        shift = offset // self.sub_bucket_half + 1
+        mantissa = offset % self.sub_bucket_half + self.sub_bucket_half
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        """記錄一筆延遲 (秒)"""
+        value = int(seconds * 1_000_000)
+        if value < 0:
+            value = 0
+        elif value > self.max_value_us:
+            value = self.max_value_us
+        self.counts[self._index(value)] += 1
+        self.total_count += 1
+        self.sum_us += value
+        if self.min_us is None or value < self.min_us:
+            self.min_us = value
+        if value > self.max_us:
+            self.max_us = value
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """合併另一個相同設定的直方圖"""
+        if (other.sub_bucket_bits, other.max_value_us) != (self.sub_bucket_bits, self.max_value_us):
+            raise ValueError("無法合併設定不同的直方圖")
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total_count += other.total_count
+        self.sum_us += other.sum_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    @property
+    def count(self) -> int:
+        return self.total_count
+
+    @property
+    def mean(self) -> float:
+        return self.sum_us / self.total_count / 1_000_000 if self.total_count else 0.0
+
+    @property
+    def min(self) -> float:
+        return (self.min_us or 0) / 1_000_000
+
+    @property
+    def max(self) -> float:
+        return self.max_us / 1_000_000
+
+    def percentile(self, percent: float) -> float:
+        """取得百分位延遲 (秒)，回傳所在桶的上界"""
+        if not self.total_count:
+            return 0.0
+        target = max(1, int(percent / 100 * self.total_count + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            if seen >= target:
+                high = min(self._bucket_range(index)[1], self.max_us)
+                return high / 1_000_000
+        return self.max
+
+    def cumulative_counts(self, bounds: Iterable[float]) -> List[int]:
+        """各上界 (秒，遞增) 以下的筆數；跨越上界的桶歸到下一個上界，與 percentile 同樣取桶的上界"""
+        bounds_us = [bound * 1_000_000 for bound in bounds]
+        result = [0] * len(bounds_us)
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            high = self._bucket_range(index)[1]
+            for position, bound in enumerate(bounds_us):
+                if high <= bound:
+                    result[position] += count
+                    break
+        running = 0
+        for position, count in enumerate(result):
+            running += count
+            result[position] = running
+        return result
+
+    def ks_distance(self, other: 'LatencyHistogram') -> float:
+        """兩個直方圖累積分佈的最大差距 (Kolmogorov-Smirnov 統計量)，兩者的分桶設定必須相同"""
+        if (self.sub_bucket_bits, self.max_value_us) != (other.sub_bucket_bits, other.max_value_us):
+            raise ValueError("直方圖的分桶設定不同，無法比較")
+        if not self.total_count or not other.total_count:
+            return 0.0
+        distance = 0.0
+        seen = other_seen = 0
+        for count, other_count in zip(self.counts, other.counts):
+            if not count and not other_count:
+                continue
+            seen += count
+            other_seen += other_count
+            distance = max(distance, abs(seen / self.total_count - other_seen / other.total_count))
+        return distance
+
+    def percentiles(self) -> Dict[str, float]:
+        """取得報告用的固定百分位 (秒)"""
+        return {f"p{p:g}": round(self.percentile(p), 6) for p in PERCENTILES}
+
+    def distribution(self, num_bins: int = 20) -> List[Dict[str, Any]]:
+        """將桶重新分組成最多 num_bins 個對數區間，供圖表使用"""
+        if not self.total_count:
+            return []
+        low = max(self.min_us or 1, 1)
+        high = max(self.max_us, low + 1)
+        ratio = (high / low) ** (1 / num_bins)
+        edges = [low * ratio ** i for i in range(num_bins + 1)]
+        edges[-1] = high + 1
+        bins = [0] * num_bins
+
+        position = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            value = self._bucket_range(index)[0]
+            while position < num_bins - 1 and value >= edges[position + 1]:
+                position += 1
+            bins[position] += count
+
+        return [
+            {'low': edges[i] / 1_000_000, 'high': edges[i + 1] / 1_000_000, 'count': bins[i]}
+            for i in range(num_bins)
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成可寫入 JSON 報告的格式 (只保存非零桶)"""
+        return {
+            'unit': 'us',
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'max_value_us': self.max_value_us,
+            'count': self.total_count,
+            'sum': self.sum_us,
+            'min': self.min_us,
+            'max': self.max_us,
+            'buckets': [[index, count] for index, count in enumerate(self.counts) if count],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyHistogram':
+        """從 JSON 報告還原直方圖"""
+        histogram = cls(data['sub_bucket_bits'], data['max_value_us'])
+        for index, count in data['buckets']:
+            histogram.counts[index] = count
+        histogram.total_count = data['count']
+        histogram.sum_us = data['sum']
+        histogram.min_us = data['min']
+        histogram.max_us = data['max']
+        return histogram
+
+    @classmethod
+    def from_latencies(cls, latencies: Iterable[float]) -> 'LatencyHistogram':
+        """由回應時間序列建立直方圖，略過沒有收到回應的 0 值"""
+        histogram = cls()
+        for value in filter(None, latencies):
+            histogram.record(value)
+        return histogram
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]]) -> 'LatencyHistogram':
+        """由既有的結果記錄建立直方圖 (沒有直方圖快照的舊報告使用)"""
+        return cls.from_latencies(result['response_time'] for result in results)
@@ -0,0 +1,161 @@
+"""
+壓力測試即時儀表板 - 以每秒一格的環狀視窗累計請求，每秒重繪一次終端畫面
+"""
+
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, TextIO
+
+from latency_histogram import LatencyHistogram, format_latency
+
+# 滾動百分位與錯誤率涵蓋的秒數
+LIVE_WINDOW_SECONDS = 10
+
+
+class _SecondBucket:
+    """某一秒內完成的請求數、錯誤類別與延遲"""
+
+    __slots__ = ('second', 'count', 'errors', 'histogram')
+
+    def __init__(self):
+        self.reset(-1)
+
+    def reset(self, second: int) -> None:
+        self.second = second
+        self.count = 0
+        self.errors: Counter = Counter()
+        self.histogram = LatencyHistogram()
+
+
+class LiveWindow:
+    """以 time.monotonic() 的整數秒分格的環狀計數器
+
+    請求路徑上只做一次取餘數與幾個累加；百分位在重繪時才合併最近幾格的直方圖。
+    monotonic 時鐘在同一台機器的各程序間一致，worker 程序送回的每秒資料可直接合併。
+    """
+
+    def __init__(self, seconds: int = LIVE_WINDOW_SECONDS):
+        self.seconds = seconds
+        # 多保留一格給目前尚未結束的這一秒
+        self.buckets = [_SecondBucket() for _ in range(seconds + 1)]
+        self.total = 0
+        self.failed = 0
+
+    def _bucket(self, second: int) -> _SecondBucket:
+        bucket = self.buckets[second % len(self.buckets)]
+        if bucket.second != second:
+            bucket.reset(second)
+        return bucket
+
+    def record(self, latency: Optional[float], error: Optional[str] = None) -> None:
+        """記錄一筆完成的請求；error 為失敗時的錯誤類別"""
+        bucket = self._bucket(int(time.monotonic()))
+        bucket.count += 1
+        self.total += 1
+        if latency is not None:
+            bucket.histogram.record(latency)
+        if error is not None:
+            bucket.errors[error] += 1
+            self.failed += 1
+
+    def second_data(self, second: int) -> Optional[Dict[str, Any]]:
+        """取得某一秒的資料 (可序列化，供 worker 程序送回主程序)"""
+        bucket = self.buckets[second % len(self.buckets)]
+        if bucket.second != second or not bucket.count:
+            return None
+        return {
+            'second': second,
+            'count': bucket.count,
+            'errors': dict(bucket.errors),
+            'histogram': bucket.histogram.to_dict(),
+        }
+
+    def merge_second(self, data: Dict[str, Any]) -> None:
+        """併入 worker 程序送回的某一秒資料"""
+        bucket = self._bucket(data['second'])
+        bucket.count += data['count']
+        bucket.errors.update(data['errors'])
+        bucket.histogram.merge(LatencyHistogram.from_dict(data['histogram']))
+        self.total += data['count']
+        self.failed += sum(data['errors'].values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """最近一個完整秒的 RPS，以及最近 seconds 個完整秒的百分位與錯誤類別"""
+        current = int(time.monotonic())
+        histogram = LatencyHistogram()
+        errors: Counter = Counter()
+        count = 0
+        last_second = 0
+        for bucket in self.buckets:
+            if current - self.seconds <= bucket.second < current:
+                count += bucket.count
+                errors.update(bucket.errors)
+                histogram.merge(bucket.histogram)
+                if bucket.second == current - 1:
+                    last_second = bucket.count
+        return {
+            'rps': last_second,
+            'count': count,
+            'errors': errors,
+            'p50': histogram.percentile(50) if histogram.count else None,
+            'p99': histogram.percentile(99) if histogram.count else None,
+        }
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = max(int(seconds), 0)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class LiveDashboard:
+    """每秒重繪一次的即時摘要
+
+    輸出到終端時以 ANSI 控制碼覆寫上一次的畫面；輸出被導向檔案時每秒附加一行。
+    """
+
+    def __init__(self, window: LiveWindow, stream: TextIO = sys.stdout):
+        self.window = window
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self._lines = 0
+
+    def render(self, elapsed: float, remaining: Optional[float], in_flight: int) -> List[str]:
+        """組出畫面內容"""
+        snapshot = self.window.snapshot()
+        window = self.window
+        time_line = f"⏳ 已執行 {_format_duration(elapsed)}"
+        if remaining is not None:
+            time_line += f" / 剩餘 {_format_duration(remaining)}"
+        time_line += f"   完成 {window.total} 請求 (失敗 {window.failed})"
+
+        p50 = format_latency(snapshot['p50']) if snapshot['p50'] is not None else '-'
+        p99 = format_latency(snapshot['p99']) if snapshot['p99'] is not None else '-'
+        rate_line = (f"⚡ RPS {snapshot['rps']:>6}   進行中 {in_flight:>5}   "
+                     f"近 {window.seconds} 秒 P50 {p50}  P99 {p99}")
+
+        count = snapshot['count']
+        failed = sum(snapshot['errors'].values())
+        error_line = f"❗ 近 {window.seconds} 秒錯誤率 {failed / count * 100 if count else 0:.1f}%"
+        if failed:
+            error_line += ": " + ", ".join(
+                f"{name} {n / count * 100:.1f}%" for name, n in snapshot['errors'].most_common(3)
+            )
+        return [time_line, rate_line, error_line]
+
+    def refresh(self, elapsed: float, remaining: Optional[float], in_flight: int) -> None:
+        lines = self.render(elapsed, remaining, in_flight)
+        if self.interactive:
+            # 游標移回上一次畫面的第一行並清除到畫面結尾
+            prefix = f"\x1b[{self._lines}F\x1b[J" if self._lines else ""
+            self.stream.write(prefix + "\n".join(lines) + "\n")
+            self._lines = len(lines)
+        else:
+            self.stream.write(" | ".join(lines) + "\n")
+        self.stream.flush()
+
+
+def seconds_until_tick(offset: float = 0.0) -> float:
+    """距離下一個整數秒 (加上 offset) 的秒數，讓重繪與每秒分格對齊"""
+    now = time.monotonic()
+    return (int(now - offset) + 1 + offset) - now
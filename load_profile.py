@@ -0,0 +1,103 @@
+"""
+分階段負載設定 - 線性爬升、持平、突波與降載
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+
+from batch_tester import load_config_file
+
+PROFILE_MODES = ('rate', 'concurrency')
+
+
+class LoadProfile:
+    """由多個階段組成的負載曲線
+
+    每個階段在 duration 秒內從起始值線性變化到 target，
+    起始值預設為上一階段的結束值，也可以用 from 指定 (例如瞬間突波)。
+    mode 為 rate 時數值代表每秒請求數，為 concurrency 時代表並發數。
+    """
+
+    def __init__(self, mode: str, stages: List[Dict[str, Any]]):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支援的負載模式: {mode} (可用: {', '.join(PROFILE_MODES)})")
+        if not stages:
+            raise ValueError("負載設定中沒有任何階段")
+
+        self.mode = mode
+        self.stages: List[Dict[str, Any]] = []
+        level = 0.0
+        offset = 0.0
+        for i, stage in enumerate(stages, 1):
+            if 'duration' not in stage or 'target' not in stage:
+                raise ValueError(f"第 {i} 個階段缺少 duration 或 target")
+            duration = float(stage['duration'])
+            if duration <= 0:
+                raise ValueError(f"第 {i} 個階段的 duration 必須大於 0")
+            start = float(stage.get('from', level))
+            end = float(stage['target'])
+            # 統計依階段名稱分組，同名的階段會被合併計算
+            name = stage.get('name', f'stage-{i}')
+            if any(existing['name'] == name for existing in self.stages):
+                raise ValueError(f"階段名稱重複: {name}")
+            self.stages.append({
+                'name': name,
+                'offset': offset,
+                'duration': duration,
+                'start': start,
+                'end': end,
+            })
+            level = end
+            offset += duration
+
+    @classmethod
+    def from_file(cls, config_file: str) -> 'LoadProfile':
+        """從 JSON/YAML 檔案載入 (可放在 load_profile 區塊內)"""
+        config = load_config_file(config_file)
+        config = config.get('load_profile', config)
+        return cls(config.get('mode', 'rate'), config.get('stages', []))
+
+    @property
+    def total_duration(self) -> float:
+        last = self.stages[-1]
+        return last['offset'] + last['duration']
+
+    @property
+    def peak(self) -> float:
+        return max(max(stage['start'], stage['end']) for stage in self.stages)
+
+    def stage_at(self, elapsed: float) -> Optional[Dict[str, Any]]:
+        """取得經過 elapsed 秒時所在的階段，結束後回傳 None"""
+        for stage in self.stages:
+            if elapsed < stage['offset'] + stage['duration']:
+                return stage
+        return None
+
+    def level_at(self, elapsed: float) -> Tuple[Optional[str], float]:
+        """取得經過 elapsed 秒時的階段名稱與負載值"""
+        stage = self.stage_at(elapsed)
+        if stage is None:
+            return None, 0.0
+        progress = max(elapsed - stage['offset'], 0.0) / stage['duration']
+        return stage['name'], stage['start'] + (stage['end'] - stage['start']) * progress
+
+    def scaled(self, factor: float) -> 'LoadProfile':
+        """回傳負載值乘上 factor 的新設定 (分配給多個 worker 程序時使用)"""
+        return LoadProfile(self.mode, [
+            {
+                'name': stage['name'],
+                'duration': stage['duration'],
+                'from': stage['start'] * factor,
+                'target': stage['end'] * factor,
+            }
+            for stage in self.stages
+        ])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成可寫入報告的格式"""
+        return {
+            'mode': self.mode,
+            'stages': [
+                {k: stage[k] for k in ('name', 'offset', 'duration', 'start', 'end')}
+                for stage in self.stages
+            ],
+        }
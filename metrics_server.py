@@ -0,0 +1,184 @@
+"""
+Prometheus 指標端點 - 長時間測試時由監控系統抓取測試器本身的累計統計
+"""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+from latency_histogram import LatencyHistogram
+from stats_accumulator import StatsAccumulator
+
+METRIC_PREFIX = 'api_tester'
+
+# Prometheus 直方圖的上界 (秒)，由累計直方圖在抓取時換算
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: object) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: object) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class _MetricsText:
+    """依 Prometheus 文字格式組合指標"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def declare(self, name: str, kind: str, help_text: str) -> str:
+        name = f'{METRIC_PREFIX}_{name}'
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+        return name
+
+    def sample(self, name: str, value: float, **labels: object) -> None:
+        self.lines.append(f'{name}{_labels(**labels)} {value}')
+
+    def histogram(self, name: str, histogram: LatencyHistogram, **labels: object) -> None:
+        counts = histogram.cumulative_counts(LATENCY_BUCKETS)
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            self.sample(f'{name}_bucket', count, **labels, le=f'{bound:g}')
+        self.sample(f'{name}_bucket', histogram.count, **labels, le='+Inf')
+        self.sample(f'{name}_sum', histogram.sum_us / 1_000_000, **labels)
+        self.sample(f'{name}_count', histogram.count, **labels)
+
+    def text(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+def format_metrics(stats: StatsAccumulator, in_flight: int = 0,
+                   loop_lag: Optional['LoopLagMonitor'] = None) -> str:
+    """將累計統計轉成 Prometheus 文字格式
+
+    只讀取累加器中的計數，Counter 以 list() 一次複製，測試仍在寫入時也能安全抓取。
+    """
+    metrics = _MetricsText()
+
+    name = metrics.declare('requests_total', 'counter', '已完成的請求數 (依 HTTP 狀態碼，none 表示沒有回應)')
+    for status, count in sorted(list(stats.status_counts.items()), key=lambda item: str(item[0])):
+        metrics.sample(name, count, status=status if status is not None else 'none')
+
+    name = metrics.declare('requests_by_method_total', 'counter', '已完成的請求數 (依 HTTP 方法)')
+    for method, count in sorted(list(stats.method_counts.items())):
+        metrics.sample(name, count, method=method)
+
+    name = metrics.declare('request_failures_total', 'counter', '失敗的請求數 (依錯誤類別)')
+    for error, count in sorted(list(stats.error_counts.items())):
+        metrics.sample(name, count, error_class=error)
+
+    if stats.groups:
+        requests_name = metrics.declare('group_requests_total', 'counter',
+                                        '已完成的請求數 (依分組，例如測試案例或負載階段)')
+        groups = {dimension: list(groups.items()) for dimension, groups in list(stats.groups.items())}
+        for dimension, items in groups.items():
+            for key, group in items:
+                metrics.sample(requests_name, group.count, dimension=dimension, group=key)
+        success_name = metrics.declare('group_successes_total', 'counter', '成功的請求數 (依分組)')
+        for dimension, items in groups.items():
+            for key, group in items:
+                metrics.sample(success_name, group.successes, dimension=dimension, group=key)
+
+    name = metrics.declare('request_duration_seconds', 'histogram', '回應時間 (秒)')
+    metrics.histogram(name, stats.histogram)
+
+    phases = list(stats.phases.items())
+    if phases:
+        name = metrics.declare('request_phase_seconds', 'histogram', '各請求階段花費的時間 (秒)')
+        for phase, histogram in phases:
+            metrics.histogram(name, histogram, phase=phase)
+
+    name = metrics.declare('in_flight_requests', 'gauge', '目前尚未完成的請求數')
+    metrics.sample(name, in_flight)
+
+    if loop_lag is not None:
+        name = metrics.declare('event_loop_lag_seconds', 'gauge', '最近一次量測的 event loop 延遲 (秒)')
+        metrics.sample(name, round(loop_lag.lag, 6))
+        name = metrics.declare('event_loop_lag_max_seconds', 'gauge', '執行期間最大的 event loop 延遲 (秒)')
+        metrics.sample(name, round(loop_lag.max_lag, 6))
+
+    return metrics.text()
+
+
+class LoopLagMonitor:
+    """定期量測 asyncio.sleep 比預期晚醒來多久，反映 event loop 是否忙不過來"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag = max(time.perf_counter() - start - self.interval, 0.0)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
+
+class MetricsServer:
+    """在背景執行緒提供 /metrics 的 HTTP 伺服器
+
+    render 在每次抓取時呼叫並回傳指標文字；伺服器執行緒為 daemon，不會阻擋程式結束。
+    """
+
+    def __init__(self, render: Callable[[], str], port: int, host: str = '127.0.0.1'):
+        self.render = render
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = server.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # 抓取很頻繁，不輸出存取記錄以免干擾測試輸出
+                pass
+
+        return Handler
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        print(f"📡 指標端點: {self.address}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def add_metrics_argument(parser) -> None:
+    """在命令列加入指標端點參數"""
+    parser.add_argument('--metrics-port', type=int,
+                        help='在此本機埠提供 Prometheus 格式的 /metrics 端點 (多程序時第 i 個 worker 使用 port+i)')
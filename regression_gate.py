@@ -0,0 +1,248 @@
+"""
+效能回歸檢查 - 保存基準快照，並與新的測試報告比較延遲分佈與吞吐量
+"""
+
+import datetime
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+from latency_histogram import LatencyHistogram, format_latency
+from report_generator import load_report_histogram, load_report_stats
+from stats_accumulator import StatsAccumulator
+
+DEFAULT_BASELINE_DIR = '.baselines'
+
+# 比較的百分位；超過容許幅度時判定為回歸的是 GATED_PERCENTILES
+COMPARED_PERCENTILES = (50, 95, 99)
+GATED_PERCENTILES = (95, 99)
+
+
+def ks_p_value(statistic: float, count: int, other_count: int) -> float:
+    """雙樣本 Kolmogorov-Smirnov 檢定的漸近 p 值"""
+    if statistic <= 0 or not count or not other_count:
+        return 1.0
+    effective = math.sqrt(count * other_count / (count + other_count))
+    lam = (effective + 0.12 + 0.11 / effective) * statistic
+    total = 0.0
+    for j in range(1, 101):
+        term = 2 * (-1) ** (j - 1) * math.exp(-2 * j * j * lam * lam)
+        total += term
+        if abs(term) < 1e-10:
+            break
+    return min(max(total, 0.0), 1.0)
+
+
+def load_snapshot(report: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """從壓力/批次測試報告、基準快照或直方圖快照取得可比較的統計
+
+    回傳 name、stats (StatsAccumulator)、duration (沒有執行時間時為 None，無法計算吞吐量)
+    與 histogram_only (只有直方圖時為 True：沒有分組，也不知道錯誤率)。
+    """
+    stats = load_report_stats(report)
+    histogram_only = report.get('histogram_only', stats is None)
+    if stats is None:
+        histogram = report if 'buckets' in report else None
+        histogram = LatencyHistogram.from_dict(histogram) if histogram else load_report_histogram(report)
+        if histogram is None:
+            raise ValueError(f"{name} 中沒有累計統計或延遲直方圖，無法比較")
+        stats = StatsAccumulator()
+        stats.histogram = histogram
+        stats.total = stats.successes = histogram.count
+    duration = report.get('duration', report.get('summary', {}).get('duration'))
+    return {'name': name, 'stats': stats, 'duration': duration or None, 'histogram_only': histogram_only}
+
+
+class BaselineStore:
+    """以目錄保存的基準快照，每個名稱一個 JSON 檔
+
+    快照只保留累計統計 (含直方圖與分組) 與執行時間，不保存逐筆結果。
+    """
+
+    def __init__(self, directory: str = DEFAULT_BASELINE_DIR):
+        self.directory = directory
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f'{name}.json')
+
+    def save(self, name: str, report_file: str) -> str:
+        with open(report_file, 'r', encoding='utf-8') as f:
+            snapshot = load_snapshot(json.load(f), report_file)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'baseline': {
+                    'name': name,
+                    'source': report_file,
+                    'created': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                },
+                'duration': snapshot['duration'],
+                'histogram_only': snapshot['histogram_only'],
+                'stats': snapshot['stats'].to_dict(),
+            }, f, indent=2, ensure_ascii=False)
+        return path
+
+    def list(self) -> List[Dict[str, Any]]:
+        """列出所有基準的名稱、來源與建立時間"""
+        if not os.path.isdir(self.directory):
+            return []
+        baselines = []
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith('.json'):
+                continue
+            with open(os.path.join(self.directory, file_name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            baselines.append({**data.get('baseline', {}), 'requests': data['stats']['total']})
+        return baselines
+
+    def load(self, reference: str) -> Dict[str, Any]:
+        """reference 為報告/快照檔案路徑，或此目錄中的基準名稱"""
+        path = reference if os.path.isfile(reference) else self.path(reference)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"找不到報告或基準: {reference}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return load_snapshot(json.load(f), reference)
+
+
+class RegressionGate:
+    """比較基準與目前的延遲分佈、百分位與吞吐量
+
+    整體以及兩邊都有的每個分組 (測試案例、負載階段) 各比較一次。P95/P99 增加超過
+    tolerance 百分比、且 KS 檢定顯示兩個分佈不同 (p 值小於 alpha) 時判定為回歸，
+    避免樣本太少時的隨機波動被當成回歸。
+    """
+
+    def __init__(self, tolerance: float = 10.0, alpha: float = 0.05):
+        self.tolerance = tolerance
+        self.alpha = alpha
+
+    @staticmethod
+    def _metrics(count: int, successes: Optional[int], histogram: Any, duration: Optional[float]) -> Dict[str, Any]:
+        error_rate = None
+        if successes is not None:
+            error_rate = round((count - successes) / count * 100, 3) if count else 0.0
+        metrics = {
+            'count': count,
+            'error_rate': error_rate,
+            'mean': round(histogram.mean, 6),
+            'throughput': round(count / duration, 2) if duration else None,
+        }
+        for percent in COMPARED_PERCENTILES:
+            metrics[f'p{percent}'] = histogram.percentile(percent) if isinstance(histogram, LatencyHistogram) else None
+        return metrics
+
+    @staticmethod
+    def _change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+        if before is None or after is None or not before:
+            return None
+        return round((after - before) / before * 100, 2)
+
+    def _compare(self, scope: str, baseline: Dict[str, Any], current: Dict[str, Any],
+                 histograms: Optional[tuple]) -> Dict[str, Any]:
+        changes = {
+            key: self._change(baseline[key], current[key])
+            for key in ('mean', 'throughput', *(f'p{p}' for p in COMPARED_PERCENTILES))
+        }
+        ks = None
+        if histograms is not None:
+            statistic = histograms[0].ks_distance(histograms[1])
+            ks = {
+                'statistic': round(statistic, 4),
+                'p_value': ks_p_value(statistic, histograms[0].count, histograms[1].count),
+            }
+        significant = ks is not None and ks['p_value'] < self.alpha
+        regressions = [
+            f"P{percent} +{changes[f'p{percent}']:.1f}%"
+            for percent in GATED_PERCENTILES
+            if changes[f'p{percent}'] is not None and changes[f'p{percent}'] > self.tolerance and significant
+        ]
+        warnings = []
+        if changes['throughput'] is not None and changes['throughput'] < -self.tolerance:
+            warnings.append(f"吞吐量 {changes['throughput']:.1f}%")
+        if None not in (baseline['error_rate'], current['error_rate']) and current['error_rate'] > baseline['error_rate']:
+            warnings.append(f"錯誤率 {baseline['error_rate']:g}% → {current['error_rate']:g}%")
+        return {
+            'scope': scope,
+            'baseline': baseline,
+            'current': current,
+            'changes': changes,
+            'ks': ks,
+            'significant': significant,
+            'regressions': regressions,
+            'warnings': warnings,
+        }
+
+    def compare(self, baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+        """比較兩個 load_snapshot 的結果"""
+        before, after = baseline['stats'], current['stats']
+        scopes = [self._compare(
+            '整體',
+            self._metrics(before.total, None if baseline['histogram_only'] else before.successes,
+                          before.histogram, baseline['duration']),
+            self._metrics(after.total, None if current['histogram_only'] else after.successes,
+                          after.histogram, current['duration']),
+            (before.histogram, after.histogram),
+        )]
+        for dimension, groups in after.groups.items():
+            base_groups = before.groups.get(dimension, {})
+            for key, group in groups.items():
+                base_group = base_groups.get(key)
+                if base_group is None:
+                    continue
+                histograms = None
+                if isinstance(group.latency, LatencyHistogram) and isinstance(base_group.latency, LatencyHistogram):
+                    histograms = (base_group.latency, group.latency)
+                scopes.append(self._compare(
+                    f'{dimension}: {key}',
+                    self._metrics(base_group.count, base_group.successes, base_group.latency, baseline['duration']),
+                    self._metrics(group.count, group.successes, group.latency, current['duration']),
+                    histograms,
+                ))
+        return {
+            'baseline': baseline['name'],
+            'current': current['name'],
+            'tolerance': self.tolerance,
+            'alpha': self.alpha,
+            'scopes': scopes,
+            'regressed': any(scope['regressions'] for scope in scopes),
+        }
+
+    @staticmethod
+    def print_comparison(comparison: Dict[str, Any]) -> None:
+        print("=" * 60)
+        print(f"📊 效能比較: {comparison['baseline']} → {comparison['current']}")
+        print(f"容許幅度: P95/P99 +{comparison['tolerance']:g}%，顯著水準 {comparison['alpha']:g}")
+        print("=" * 60)
+        for scope in comparison['scopes']:
+            before, after, changes = scope['baseline'], scope['current'], scope['changes']
+            status = "❌" if scope['regressions'] else "⚠️ " if scope['warnings'] else "✅"
+            print(f"{status} {scope['scope']} ({before['count']} → {after['count']} 請求)")
+            for percent in COMPARED_PERCENTILES:
+                key = f'p{percent}'
+                if before[key] is None or after[key] is None:
+                    continue
+                change = f" ({changes[key]:+.1f}%)" if changes[key] is not None else ""
+                print(f"    P{percent}: {format_latency(before[key])} → {format_latency(after[key])}{change}")
+            if before['throughput'] is not None and after['throughput'] is not None:
+                change = f" ({changes['throughput']:+.1f}%)" if changes['throughput'] is not None else ""
+                print(f"    吞吐量: {before['throughput']:.2f} → {after['throughput']:.2f} req/s{change}")
+            if scope['ks'] is not None:
+                verdict = "分佈有顯著差異" if scope['significant'] else "分佈無顯著差異"
+                print(f"    KS 檢定: D={scope['ks']['statistic']:.4f}, p={scope['ks']['p_value']:.4g} ({verdict})")
+            for message in scope['regressions']:
+                print(f"    ❌ 回歸: {message}")
+            for message in scope['warnings']:
+                print(f"    ⚠️  {message}")
+        print("=" * 60)
+        if comparison['regressed']:
+            print("❌ 偵測到效能回歸")
+        else:
+            print("✅ 沒有超過容許幅度的效能回歸")
+
+    @staticmethod
+    def save_report(comparison: Dict[str, Any], output_file: str) -> None:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({'comparison': comparison}, f, indent=2, ensure_ascii=False)
+        print(f"📄 比較報告已生成: {output_file}")
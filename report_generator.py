@@ -1,162 +1,138 @@
+import heapq
+import html
 import json
+import os
 import datetime
-from typing import List, Dict, Any
+from typing import Iterable, Dict, Any, List, Optional, TextIO
+from urllib.parse import urlsplit
 
-class ReportGenerator:
-    def __init__(self, results: List[Dict[str, Any]]):
-        self.results = results
-        self.timestamp = datetime.datetime.now()
-
-    def generate_html_report(self, output_file: str = "api_test_report.html"):
-        """生成 HTML 測試報告"""
-        html_content = self._generate_html()
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        print(f"📄 HTML 測試報告已生成: {output_file}")
+from latency_histogram import LatencyHistogram, format_latency
+from result_sink import JsonlResults
+from request_timing import PHASE_LABELS
+from result_store import ResultStore
+from stats_accumulator import StatsAccumulator
 
-    def _generate_html(self) -> str:
-        """生成 HTML 內容"""
-        # 計算統計資料
-        total_tests = len(self.results)
-        successful_tests = sum(1 for r in self.results if r['success'])
-        failed_tests = total_tests - successful_tests
-        success_rate = (successful_tests / total_tests * 100) if total_tests > 0 else 0
-        
-        # 計算回應時間統計
-        valid_times = [r['response_time'] for r in self.results if r['response_time'] > 0]
-        avg_response_time = sum(valid_times) / len(valid_times) if valid_times else 0
-        max_response_time = max(valid_times) if valid_times else 0
-        min_response_time = min(valid_times) if valid_times else 0
-
-        html = f"""
-<!DOCTYPE html>
-<html lang="zh-TW">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>API 測試報告</title>
-    <style>
-        * {{
+# 報告樣式與腳本，其他報告 (例如比較報告) 也共用
+REPORT_CSS = """
+        * {
             margin: 0;
             padding: 0;
             box-sizing: border-box;
-        }}
+        }
         
-        body {{
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             min-height: 100vh;
             padding: 20px;
-        }}
+        }
         
-        .container {{
+        .container {
             max-width: 1200px;
             margin: 0 auto;
             background: white;
             border-radius: 15px;
             box-shadow: 0 20px 40px rgba(0,0,0,0.1);
             overflow: hidden;
-        }}
+        }
         
-        .header {{
+        .header {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             color: white;
             padding: 30px;
             text-align: center;
-        }}
+        }
         
-        .header h1 {{
+        .header h1 {
             font-size: 2.5em;
             margin-bottom: 10px;
-        }}
+        }
         
-        .header .subtitle {{
+        .header .subtitle {
             opacity: 0.9;
             font-size: 1.1em;
-        }}
+        }
         
-        .summary {{
+        .summary {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 20px;
             padding: 30px;
             background: #f8f9fa;
-        }}
+        }
         
-        .summary-card {{
+        .summary-card {
             background: white;
             padding: 20px;
             border-radius: 10px;
             text-align: center;
             box-shadow: 0 5px 15px rgba(0,0,0,0.08);
             transition: transform 0.3s ease;
-        }}
+        }
         
-        .summary-card:hover {{
+        .summary-card:hover {
             transform: translateY(-5px);
-        }}
+        }
         
-        .summary-card .number {{
+        .summary-card .number {
             font-size: 2.5em;
             font-weight: bold;
             margin-bottom: 5px;
-        }}
+        }
         
-        .summary-card .label {{
+        .summary-card .label {
             color: #666;
             font-size: 0.9em;
             text-transform: uppercase;
             letter-spacing: 1px;
-        }}
+        }
         
-        .success {{ color: #28a745; }}
-        .danger {{ color: #dc3545; }}
-        .info {{ color: #17a2b8; }}
-        .warning {{ color: #ffc107; }}
+        .success { color: #28a745; }
+        .danger { color: #dc3545; }
+        .info { color: #17a2b8; }
+        .warning { color: #ffc107; }
         
-        .results {{
+        .results {
             padding: 30px;
-        }}
+        }
         
-        .results h2 {{
+        .results h2 {
             margin-bottom: 20px;
             color: #333;
             border-bottom: 3px solid #667eea;
             padding-bottom: 10px;
-        }}
+        }
         
-        .test-item {{
+        .test-item {
             background: white;
             border: 1px solid #e9ecef;
             border-radius: 8px;
             margin-bottom: 15px;
             overflow: hidden;
             transition: all 0.3s ease;
-        }}
+        }
         
-        .test-item:hover {{
+        .test-item:hover {
             box-shadow: 0 5px 15px rgba(0,0,0,0.1);
             transform: translateY(-2px);
-        }}
+        }
         
-        .test-header {{
+        .test-header {
             padding: 15px 20px;
             background: #f8f9fa;
             border-bottom: 1px solid #e9ecef;
             cursor: pointer;
-        }}
+        }
         
-        .test-header.success {{
+        .test-header.success {
             border-left: 4px solid #28a745;
-        }}
+        }
         
-        .test-header.failed {{
+        .test-header.failed {
             border-left: 4px solid #dc3545;
-        }}
+        }
         
-        .test-method {{
+        .test-method {
             display: inline-block;
             padding: 4px 8px;
             border-radius: 4px;
@@ -164,51 +140,51 @@ class ReportGenerator:
             font-weight: bold;
             color: white;
             margin-right: 10px;
-        }}
+        }
         
-        .method-GET {{ background: #28a745; }}
-        .method-POST {{ background: #007bff; }}
-        .method-PUT {{ background: #fd7e14; }}
-        .method-PATCH {{ background: #6610f2; }}
-        .method-DELETE {{ background: #dc3545; }}
+        .method-GET { background: #28a745; }
+        .method-POST { background: #007bff; }
+        .method-PUT { background: #fd7e14; }
+        .method-PATCH { background: #6610f2; }
+        .method-DELETE { background: #dc3545; }
         
-        .test-url {{
+        .test-url {
             font-family: monospace;
             color: #666;
             margin-left: 10px;
-        }}
+        }
         
-        .test-status {{
+        .test-status {
             float: right;
             font-weight: bold;
-        }}
+        }
         
-        .test-details {{
+        .test-details {
             padding: 20px;
             background: #f8f9fa;
             display: none;
-        }}
+        }
         
-        .test-details.show {{
+        .test-details.show {
             display: block;
-        }}
+        }
         
-        .detail-row {{
+        .detail-row {
             margin-bottom: 10px;
-        }}
+        }
         
-        .detail-label {{
+        .detail-label {
             font-weight: bold;
             color: #333;
             display: inline-block;
             width: 120px;
-        }}
+        }
         
-        .detail-value {{
+        .detail-value {
             color: #666;
-        }}
+        }
         
-        .response-content {{
+        .response-content {
             background: #2d3748;
             color: #e2e8f0;
             padding: 15px;
@@ -219,127 +195,511 @@ class ReportGenerator:
             max-height: 300px;
             overflow-y: auto;
             margin-top: 10px;
-        }}
+        }
+        
+        .latency {
+            padding: 30px;
+            border-bottom: 1px solid #e9ecef;
+        }
+        
+        .latency h2 {
+            margin-bottom: 20px;
+            color: #333;
+            border-bottom: 3px solid #667eea;
+            padding-bottom: 10px;
+        }
+        
+        .latency-grid {
+            display: grid;
+            grid-template-columns: 250px 1fr;
+            gap: 30px;
+        }
         
-        .footer {{
+        .percentile-table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+        
+        .percentile-table th, .percentile-table td {
+            padding: 8px 12px;
+            border-bottom: 1px solid #e9ecef;
+            text-align: left;
+        }
+        
+        .percentile-table td:last-child {
+            font-family: monospace;
+            text-align: right;
+        }
+        
+        .chart-row {
+            display: flex;
+            align-items: center;
+            margin-bottom: 4px;
+            font-size: 0.8em;
+        }
+        
+        .chart-label {
+            width: 160px;
+            font-family: monospace;
+            color: #666;
+        }
+        
+        .chart-bar {
+            height: 14px;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            border-radius: 3px;
+            margin-right: 8px;
+        }
+        
+        .chart-count {
+            color: #666;
+        }
+        
+        .footer {
             background: #333;
             color: white;
             text-align: center;
             padding: 20px;
             font-size: 0.9em;
-        }}
+        }
+        
+        .group-table {
+            width: 100%;
+            border-collapse: collapse;
+            font-size: 0.9em;
+        }
+        
+        .group-table th, .group-table td {
+            padding: 8px 12px;
+            border-bottom: 1px solid #e9ecef;
+            text-align: left;
+        }
+        
+        .group-table td.num {
+            font-family: monospace;
+            text-align: right;
+        }
+        
+        .group-table tr.failed td:first-child {
+            border-left: 4px solid #dc3545;
+        }
+        
+        .group-table td.worse {
+            color: #dc3545;
+            font-weight: bold;
+        }
         
-        @media (max-width: 768px) {{
-            .summary {{
+        .group-table td.better {
+            color: #28a745;
+        }
+        
+        .section-note {
+            color: #666;
+            font-size: 0.9em;
+            margin-bottom: 15px;
+        }
+        
+        .pager {
+            display: flex;
+            align-items: center;
+            gap: 10px;
+            margin-bottom: 15px;
+        }
+        
+        .pager button {
+            padding: 6px 14px;
+            border: 1px solid #667eea;
+            border-radius: 4px;
+            background: white;
+            color: #667eea;
+            cursor: pointer;
+        }
+        
+        @media (max-width: 768px) {
+            .summary {
+                grid-template-columns: 1fr;
+            }
+            
+            .latency-grid {
                 grid-template-columns: 1fr;
-            }}
+            }
             
-            .test-status {{
+            .test-status {
                 float: none;
                 display: block;
                 margin-top: 5px;
-            }}
-        }}
-    </style>
+            }
+        }
+"""
+
+REPORT_SCRIPT = """
+        function toggleDetails(element) {
+            const details = element.nextElementSibling;
+            details.classList.toggle('show');
+        }
+        
+        // 自動展開失敗的測試
+        document.addEventListener('DOMContentLoaded', function() {
+            const failedTests = document.querySelectorAll('.test-header.failed');
+            failedTests.forEach(header => {
+                header.nextElementSibling.classList.add('show');
+            });
+        });
+"""
+
+# 每筆回應內容在報告中最多顯示的字元數
+MAX_RESPONSE_CHARS = 4000
+
+# full: 每筆結果一個項目；aggregate: 分組統計加上抽樣；auto: 依結果數量選擇
+REPORT_MODES = ('full', 'aggregate', 'auto')
+# auto 模式下超過此結果數改用彙總報告
+AUTO_AGGREGATE_THRESHOLD = 2000
+
+AGGREGATE_SCRIPT = REPORT_SCRIPT + """
+        // 逐頁載入伴隨資料檔 (以 script 標籤載入，直接開啟本機檔案也能使用)
+        let currentPage = 0;
+
+        function loadReportPage(page, rows) {
+            const body = document.getElementById('page-rows');
+            body.replaceChildren();
+            rows.forEach(row => {
+                const tr = document.createElement('tr');
+                if (!row[5]) tr.className = 'failed';
+                [row[0], row[1], row[2], row[3] || 'N/A', row[4] + 's', row[6] || ''].forEach((value, i) => {
+                    const td = document.createElement('td');
+                    td.textContent = value;
+                    if (i === 4) td.className = 'num';
+                    tr.appendChild(td);
+                });
+                body.appendChild(tr);
+            });
+            currentPage = page;
+            document.getElementById('page-info').textContent = page + ' / ' + REPORT_DATA.pages;
+        }
+
+        function showReportPage(page) {
+            page = Math.min(Math.max(page, 1), REPORT_DATA.pages);
+            const old = document.getElementById('page-loader');
+            if (old) old.remove();
+            const loader = document.createElement('script');
+            loader.id = 'page-loader';
+            loader.src = REPORT_DATA.dir + '/page-' + String(page).padStart(5, '0') + '.js';
+            loader.onerror = () => {
+                document.getElementById('page-info').textContent = '無法載入 ' + loader.src;
+            };
+            document.body.appendChild(loader);
+        }
+"""
+
+class ReportGenerator:
+    def __init__(self, results: Iterable[Dict[str, Any]], histogram: Optional[LatencyHistogram] = None,
+                 stats: Optional[StatsAccumulator] = None):
+        # results 可以是串列或可重複迭代的來源 (例如 JsonlResults)，報告會走訪兩次
+        self.results = results
+        # 測試器的累計統計，有提供時摘要數字直接讀取，不必走訪結果
+        self.stats = stats
+        if histogram is None and stats is not None:
+            histogram = stats.histogram
+        # 沒有提供直方圖快照時，從結果記錄重建 (精度受限於記錄中的毫秒數)
+        if histogram is None:
+            if isinstance(results, ResultStore):
+                histogram = LatencyHistogram.from_latencies(results.latency)
+            else:
+                histogram = LatencyHistogram.from_results(results)
+        self.histogram = histogram
+        self.timestamp = datetime.datetime.now()
+
+    def generate_html_report(self, output_file: str = "api_test_report.html"):
+        """生成 HTML 測試報告，各區塊直接寫入檔案"""
+        with open(output_file, 'w', encoding='utf-8') as f:
+            self._write_html(f)
+        
+        print(f"📄 HTML 測試報告已生成: {output_file}")
+
+    def _write_html(self, out: TextIO) -> None:
+        """依序寫出 HTML 內容"""
+        self._write_head(out, "API 測試報告")
+        self._write_summary(out, self._summary_stats())
+        out.write(self._generate_latency_section())
+        out.write(self._generate_phase_section())
+        out.write(self._generate_breakdown_section())
+        out.write("""
+        <div class="results">
+            <h2>📋 測試結果詳情</h2>
+""")
+        self._write_test_items(out, self.results)
+        out.write("""
+        </div>
+""")
+        self._write_footer(out)
+
+    def _summary_stats(self) -> Dict[str, Any]:
+        """計算摘要數字 (有累計統計時直接讀取，否則走訪一次結果)"""
+        if self.stats is not None:
+            summary = self.stats.summary()
+            return {
+                'total_tests': summary['total'],
+                'successful_tests': summary['successes'],
+                'failed_tests': summary['failed'],
+                'success_rate': summary['success_rate'],
+                'avg_response_time': summary['mean'],
+                'max_response_time': summary['max'],
+                'min_response_time': summary['min'],
+            }
+        if isinstance(self.results, ResultStore):
+            return self._store_summary_stats(self.results)
+        
+        total_tests = 0
+        successful_tests = 0
+        time_count = 0
+        time_sum = 0.0
+        max_response_time = 0.0
+        min_response_time = None
+        for r in self.results:
+            total_tests += 1
+            if r['success']:
+                successful_tests += 1
+            response_time = r['response_time']
+            if response_time > 0:
+                time_count += 1
+                time_sum += response_time
+                max_response_time = max(max_response_time, response_time)
+                min_response_time = response_time if min_response_time is None else min(min_response_time, response_time)
+        
+        return {
+            'total_tests': total_tests,
+            'successful_tests': successful_tests,
+            'failed_tests': total_tests - successful_tests,
+            'success_rate': (successful_tests / total_tests * 100) if total_tests > 0 else 0,
+            'avg_response_time': time_sum / time_count if time_count else 0,
+            'max_response_time': max_response_time,
+            'min_response_time': min_response_time or 0,
+        }
+
+    @staticmethod
+    def _store_summary_stats(store: ResultStore) -> Dict[str, Any]:
+        """直接對欄位陣列計算摘要數字"""
+        total_tests = len(store)
+        successful_tests = store.success_count()
+        latency = store.latency_summary()
+        return {
+            'total_tests': total_tests,
+            'successful_tests': successful_tests,
+            'failed_tests': total_tests - successful_tests,
+            'success_rate': (successful_tests / total_tests * 100) if total_tests > 0 else 0,
+            'avg_response_time': latency['mean'],
+            'max_response_time': latency['max'],
+            'min_response_time': latency['min'],
+        }
+
+    def _write_head(self, out: TextIO, title: str) -> None:
+        """寫出文件開頭與頁首"""
+        out.write(f"""
+<!DOCTYPE html>
+<html lang="zh-TW">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{html.escape(title)}</title>
+    <style>{REPORT_CSS}    </style>
 </head>
 <body>
     <div class="container">
         <div class="header">
-            <h1>🚀 API 測試報告</h1>
+            <h1>🚀 {html.escape(title)}</h1>
             <div class="subtitle">
                 生成時間: {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}
             </div>
         </div>
-        
+""")
+
+    def _write_summary(self, out: TextIO, stats: Dict[str, Any]) -> None:
+        """寫出摘要卡片"""
+        out.write(f"""
         <div class="summary">
             <div class="summary-card">
-                <div class="number info">{total_tests}</div>
+                <div class="number info">{stats['total_tests']}</div>
                 <div class="label">總測試數</div>
             </div>
             <div class="summary-card">
-                <div class="number success">{successful_tests}</div>
+                <div class="number success">{stats['successful_tests']}</div>
                 <div class="label">成功</div>
             </div>
             <div class="summary-card">
-                <div class="number danger">{failed_tests}</div>
+                <div class="number danger">{stats['failed_tests']}</div>
                 <div class="label">失敗</div>
             </div>
             <div class="summary-card">
-                <div class="number warning">{success_rate:.1f}%</div>
+                <div class="number warning">{stats['success_rate']:.1f}%</div>
                 <div class="label">成功率</div>
             </div>
             <div class="summary-card">
-                <div class="number info">{avg_response_time:.3f}s</div>
+                <div class="number info">{stats['avg_response_time']:.3f}s</div>
                 <div class="label">平均回應時間</div>
             </div>
             <div class="summary-card">
-                <div class="number info">{min_response_time:.3f}s</div>
+                <div class="number info">{stats['min_response_time']:.3f}s</div>
                 <div class="label">最快回應時間</div>
             </div>
             <div class="summary-card">
-                <div class="number info">{max_response_time:.3f}s</div>
+                <div class="number info">{stats['max_response_time']:.3f}s</div>
                 <div class="label">最慢回應時間</div>
             </div>
         </div>
-        
-        <div class="results">
-            <h2>📋 測試結果詳情</h2>
-            {self._generate_test_items()}
-        </div>
-        
+""")
+
+    def _write_footer(self, out: TextIO, script: str = REPORT_SCRIPT) -> None:
+        """寫出頁尾與腳本"""
+        out.write(f"""
         <div class="footer">
             <p>📊 報告由 API 自動 Debug 工具生成</p>
         </div>
     </div>
     
-    <script>
-        function toggleDetails(element) {{
-            const details = element.nextElementSibling;
-            details.classList.toggle('show');
-        }}
-        
-        // 自動展開失敗的測試
-        document.addEventListener('DOMContentLoaded', function() {{
-            const failedTests = document.querySelectorAll('.test-header.failed');
-            failedTests.forEach(header => {{
-                header.nextElementSibling.classList.add('show');
-            }});
-        }});
-    </script>
+    <script>{script}    </script>
 </body>
 </html>
+""")
+
+    def _generate_latency_section(self) -> str:
+        """生成百分位表格與延遲分佈圖的 HTML"""
+        if not self.histogram.count:
+            return ""
+
+        rows = "".join(
+            f"<tr><td>{name.upper()}</td><td>{format_latency(value)}</td></tr>"
+            for name, value in self.histogram.percentiles().items()
+        )
+
+        bins = self.histogram.distribution()
+        peak = max(b['count'] for b in bins) or 1
+        bars = "".join(
+            f'''<div class="chart-row"><span class="chart-label">{format_latency(b['low'])} - {format_latency(b['high'])}</span>'''
+            f'''<span class="chart-bar" style="width: {b['count'] / peak * 70:.1f}%"></span>'''
+            f'''<span class="chart-count">{b['count']}</span></div>'''
+            for b in bins
+        )
+
+        return f"""
+        <div class="latency">
+            <h2>⏱️ 延遲分佈</h2>
+            <div class="latency-grid">
+                <table class="percentile-table">
+                    <tr><th>百分位</th><th>回應時間</th></tr>
+                    {rows}
+                </table>
+                <div class="latency-chart">{bars}</div>
+            </div>
+        </div>
         """
-        
-        return html
 
-    def _generate_test_items(self) -> str:
-        """生成測試項目的 HTML"""
-        items_html = ""
-        
-        for i, result in enumerate(self.results):
+    def _generate_phase_section(self) -> str:
+        """生成各請求階段 (DNS、連線、TLS、首位元組、本文) 的時間分解表格"""
+        phases = self.stats.phase_summary() if self.stats is not None else []
+        if not phases:
+            return ""
+
+        # 長條圖以每個請求平均花費的時間比較，沒有經過該階段的請求 (例如重複使用連線) 以 0 計
+        total = self.stats.total or 1
+        shares = [phase['mean'] * phase['count'] / total for phase in phases]
+        peak = max(shares) or 1
+        rows = "".join(
+            f'<tr><td>{PHASE_LABELS[phase["phase"]]}</td><td class="num">{phase["count"]}</td>'
+            f'<td class="num">{format_latency(phase["mean"])}</td>'
+            f'<td class="num">{format_latency(phase["percentiles"]["p50"])}</td>'
+            f'<td class="num">{format_latency(phase["percentiles"]["p90"])}</td>'
+            f'<td class="num">{format_latency(phase["percentiles"]["p99"])}</td>'
+            f'<td class="num">{format_latency(phase["max"])}</td>'
+            f'<td><span class="chart-bar" style="width: {share / peak * 100:.1f}%"></span></td></tr>'
+            for phase, share in zip(phases, shares)
+        )
+
+        return f"""
+        <div class="latency">
+            <h2>🧭 請求階段時間</h2>
+            <p class="section-note">各階段只統計實際經過的請求；重複使用的連線沒有 DNS 與建立連線時間。長條為每個請求平均花費的時間。</p>
+            <table class="group-table">
+                <tr><th>階段</th><th>請求數</th><th>平均</th><th>P50</th><th>P90</th><th>P99</th><th>最大</th><th></th></tr>
+                {rows}
+            </table>
+        </div>
+        """
+
+    def _generate_breakdown_section(self) -> str:
+        """生成狀態碼分佈與錯誤類別表格 (需要累計統計)"""
+        if self.stats is None or not self.stats.total:
+            return ""
+
+        escape = html.escape
+        statuses = "".join(
+            f"<tr><td>{status or '無回應'}</td><td>{count}</td></tr>"
+            for status, count in self.stats.status_counts.most_common()
+        )
+        errors = "".join(
+            f"<tr><td>{escape(str(name))}</td><td>{count}</td></tr>"
+            for name, count in self.stats.error_counts.most_common(20)
+        ) or "<tr><td>無</td><td>0</td></tr>"
+
+        return f"""
+        <div class="latency">
+            <h2>🧾 狀態碼與錯誤類別</h2>
+            <div class="latency-grid">
+                <table class="percentile-table">
+                    <tr><th>狀態碼</th><th>請求數</th></tr>
+                    {statuses}
+                </table>
+                <table class="percentile-table">
+                    <tr><th>錯誤類別</th><th>次數</th></tr>
+                    {errors}
+                </table>
+            </div>
+        </div>
+        """
+
+    @staticmethod
+    def _format_response(data: Any) -> str:
+        """格式化回應內容，過長時截斷"""
+        if not data:
+            return ""
+        if isinstance(data, (dict, list)):
+            text = json.dumps(data, ensure_ascii=False)
+            # indent 會改用較慢的純 Python 編碼器，只對短內容排版
+            if len(text) <= MAX_RESPONSE_CHARS:
+                text = json.dumps(data, indent=2, ensure_ascii=False)
+        else:
+            text = str(data)
+        if len(text) > MAX_RESPONSE_CHARS:
+            text = f"{text[:MAX_RESPONSE_CHARS]}\n… (已截斷，共 {len(text)} 字元)"
+        return text
+
+    def _write_test_items(self, out: TextIO, results: Iterable[Dict[str, Any]]) -> None:
+        """逐筆寫出測試項目的 HTML"""
+        escape = html.escape
+        for result in results:
             status_class = "success" if result['success'] else "failed"
             status_text = "✅ 成功" if result['success'] else "❌ 失敗"
-            method = result['method']
-            
-            # 格式化回應內容
-            response_content = ""
-            if result['response_data']:
-                if isinstance(result['response_data'], (dict, list)):
-                    response_content = json.dumps(result['response_data'], indent=2, ensure_ascii=False)
-                else:
-                    response_content = str(result['response_data'])
+            method = escape(str(result['method']))
+            response_content = self._format_response(result['response_data'])
+            error_row = (
+                f'<div class="detail-row"><span class="detail-label">錯誤:</span><span class="detail-value">{escape(str(result["error"]))}</span></div>'
+                if result['error'] else ''
+            )
+            response_row = (
+                f'<div class="detail-row"><span class="detail-label">回應內容:</span><div class="response-content">{escape(response_content)}</div></div>'
+                if response_content else ''
+            )
             
-            items_html += f"""
+            out.write(f"""
             <div class="test-item">
                 <div class="test-header {status_class}" onclick="toggleDetails(this)">
                     <span class="test-method method-{method}">{method}</span>
-                    <span class="test-url">{result['url']}</span>
+                    <span class="test-url">{escape(str(result['url']))}</span>
                     <span class="test-status">{status_text}</span>
                 </div>
                 <div class="test-details">
                     <div class="detail-row">
                         <span class="detail-label">時間:</span>
-                        <span class="detail-value">{result['timestamp']}</span>
+                        <span class="detail-value">{escape(str(result['timestamp']))}</span>
                     </div>
                     <div class="detail-row">
                         <span class="detail-label">狀態碼:</span>
@@ -349,26 +709,352 @@ class ReportGenerator:
                         <span class="detail-label">回應時間:</span>
                         <span class="detail-value">{result['response_time']}秒</span>
                     </div>
-                    {f'<div class="detail-row"><span class="detail-label">錯誤:</span><span class="detail-value">{result["error"]}</span></div>' if result['error'] else ''}
-                    {f'<div class="detail-row"><span class="detail-label">回應內容:</span><div class="response-content">{response_content}</div></div>' if response_content else ''}
+                    {error_row}
+                    {response_row}
                 </div>
             </div>
-            """
+""")
+
+class AggregateReportGenerator(ReportGenerator):
+    """大量結果的彙總報告
+
+    依端點/方法/狀態分組統計，只嵌入有限的個別請求 (失敗請求與最慢的請求)，
+    完整結果分頁寫入伴隨的資料檔，在瀏覽器中按需載入。
+    """
+
+    # 超過此分組數後，其餘組合併為一組，避免路徑中含 ID 時分組無限增加
+    MAX_GROUPS = 500
+    OTHER_ENDPOINT = '(其他)'
+
+    def __init__(self, results: Iterable[Dict[str, Any]], histogram: Optional[LatencyHistogram] = None,
+                 stats: Optional[StatsAccumulator] = None, max_failures: int = 200, slowest: int = 50,
+                 page_size: int = 1000):
+        super().__init__(results, histogram, stats)
+        self.max_failures = max_failures
+        self.slowest = slowest
+        self.page_size = page_size
+
+    def generate_html_report(self, output_file: str = "api_test_report.html"):
+        """生成彙總 HTML 報告與分頁資料檔"""
+        data_dir = f"{os.path.splitext(output_file)[0]}_data"
+        os.makedirs(data_dir, exist_ok=True)
+        aggregate = self._aggregate(data_dir)
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            self._write_aggregate_html(f, aggregate, os.path.basename(data_dir))
         
-        return items_html
+        print(f"📄 HTML 彙總報告已生成: {output_file} (分頁資料: {data_dir})")
+
+    def _group_key(self, result: Dict[str, Any], groups: Dict[tuple, Dict[str, Any]]) -> tuple:
+        status = str(result['status_code']) if result['status_code'] else '錯誤'
+        key = (urlsplit(str(result['url'])).path or '/', result['method'], status)
+        if key not in groups and len(groups) >= self.MAX_GROUPS:
+            key = (self.OTHER_ENDPOINT, result['method'], status)
+        return key
+
+    def _aggregate(self, data_dir: str) -> Dict[str, Any]:
+        """走訪一次結果：分組統計、抽樣並寫出分頁資料檔"""
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        failures: List[Dict[str, Any]] = []
+        slowest: List[tuple] = []
+        page: List[list] = []
+        pages = 0
+        total = 0
+        successful = 0
+
+        def flush_page():
+            nonlocal pages, page
+            pages += 1
+            with open(os.path.join(data_dir, f"page-{pages:05d}.js"), 'w', encoding='utf-8') as f:
+                f.write(f"loadReportPage({pages}, {json.dumps(page, ensure_ascii=False, default=str)});\n")
+            page = []
+
+        for result in self.results:
+            total += 1
+            key = self._group_key(result, groups)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {'count': 0, 'success': 0, 'histogram': LatencyHistogram()}
+            group['count'] += 1
+            if result['response_time'] > 0:
+                group['histogram'].record(result['response_time'])
+
+            if result['success']:
+                successful += 1
+                group['success'] += 1
+            elif len(failures) < self.max_failures:
+                failures.append(result)
+
+            # 以 (回應時間, 序號) 排序的最小堆積，保留最慢的 N 筆
+            entry = (result['response_time'], total, result)
+            if len(slowest) < self.slowest:
+                heapq.heappush(slowest, entry)
+            elif entry > slowest[0]:
+                heapq.heapreplace(slowest, entry)
+
+            page.append([
+                result['timestamp'], result['method'], result['url'], result['status_code'],
+                result['response_time'], result['success'], result['error'],
+            ])
+            if len(page) >= self.page_size:
+                flush_page()
+        if page:
+            flush_page()
+
+        return {
+            'total': total,
+            'successful': successful,
+            'groups': groups,
+            'failures': failures,
+            'slowest': [entry[2] for entry in sorted(slowest, reverse=True)],
+            'pages': pages,
+        }
+
+    def _aggregate_stats(self, aggregate: Dict[str, Any]) -> Dict[str, Any]:
+        """由分組結果與直方圖取得摘要數字"""
+        total = aggregate['total']
+        successful = aggregate['successful']
+        return {
+            'total_tests': total,
+            'successful_tests': successful,
+            'failed_tests': total - successful,
+            'success_rate': (successful / total * 100) if total > 0 else 0,
+            'avg_response_time': self.histogram.mean,
+            'max_response_time': self.histogram.max,
+            'min_response_time': self.histogram.min,
+        }
+
+    def _write_aggregate_html(self, out: TextIO, aggregate: Dict[str, Any], data_dir: str) -> None:
+        """依序寫出彙總報告內容"""
+        self._write_head(out, "API 測試彙總報告")
+        self._write_summary(out, self._aggregate_stats(aggregate))
+        out.write(self._generate_latency_section())
+        out.write(self._generate_phase_section())
+        out.write(self._generate_breakdown_section())
+        self._write_group_section(out, aggregate)
+
+        failed = aggregate['total'] - aggregate['successful']
+        out.write(f"""
+        <div class="results">
+            <h2>❌ 失敗請求樣本</h2>
+            <div class="section-note">共 {failed} 個失敗請求，顯示前 {len(aggregate['failures'])} 個</div>
+""")
+        self._write_test_items(out, aggregate['failures'])
+        out.write(f"""
+        </div>
+        
+        <div class="results">
+            <h2>🐢 最慢的 {len(aggregate['slowest'])} 個請求</h2>
+""")
+        self._write_test_items(out, aggregate['slowest'])
+        out.write(f"""
+        </div>
+        
+        <div class="results">
+            <h2>📋 全部結果</h2>
+            <div class="section-note">完整結果分頁存放於 {html.escape(data_dir)}/，需與本報告放在同一目錄</div>
+            <div class="pager">
+                <button onclick="showReportPage(currentPage - 1)">◀ 上一頁</button>
+                <span id="page-info">尚未載入</span>
+                <button onclick="showReportPage(currentPage + 1)">下一頁 ▶</button>
+            </div>
+            <table class="group-table">
+                <thead><tr><th>時間</th><th>方法</th><th>URL</th><th>狀態碼</th><th>回應時間</th><th>錯誤</th></tr></thead>
+                <tbody id="page-rows"></tbody>
+            </table>
+        </div>
+""")
+        script = (
+            f"\n        const REPORT_DATA = {json.dumps({'dir': data_dir, 'pages': aggregate['pages']}, ensure_ascii=False)};"
+            + AGGREGATE_SCRIPT
+        )
+        self._write_footer(out, script)
+
+    def _write_group_section(self, out: TextIO, aggregate: Dict[str, Any]) -> None:
+        """寫出分組統計表與各組 P99 圖表"""
+        groups = sorted(aggregate['groups'].items(), key=lambda item: item[1]['count'], reverse=True)
+        total = aggregate['total'] or 1
+        escape = html.escape
+
+        out.write("""
+        <div class="latency">
+            <h2>📊 依端點 / 方法 / 狀態分組</h2>
+            <table class="group-table">
+                <tr><th>端點</th><th>方法</th><th>狀態</th><th>請求數</th><th>佔比</th><th>P50</th><th>P90</th><th>P99</th><th>最慢</th></tr>
+""")
+        for (endpoint, method, status), group in groups:
+            percentiles = group['histogram'].percentiles()
+            row_class = "" if group['success'] == group['count'] else ' class="failed"'
+            out.write(
+                f'<tr{row_class}><td>{escape(endpoint)}</td><td>{escape(str(method))}</td><td>{escape(status)}</td>'
+                f'<td class="num">{group["count"]}</td><td class="num">{group["count"] / total * 100:.1f}%</td>'
+                f'<td class="num">{format_latency(percentiles["p50"])}</td>'
+                f'<td class="num">{format_latency(percentiles["p90"])}</td>'
+                f'<td class="num">{format_latency(percentiles["p99"])}</td>'
+                f'<td class="num">{format_latency(group["histogram"].max)}</td></tr>\n'
+            )
+        out.write("""
+            </table>
+        </div>
+""")
+
+        # 請求數最多的前 20 組的 P99 長條圖
+        charted = [(key, group['histogram'].percentile(99)) for key, group in groups[:20] if group['histogram'].count]
+        if not charted:
+            return
+        peak = max(p99 for _, p99 in charted) or 1
+        out.write("""
+        <div class="latency">
+            <h2>⏱️ 各組 P99 延遲</h2>
+""")
+        for (endpoint, method, status), p99 in charted:
+            out.write(
+                f'<div class="chart-row"><span class="chart-label" style="width: 320px">{escape(str(method))} {escape(endpoint)} [{escape(status)}]</span>'
+                f'<span class="chart-bar" style="width: {p99 / peak * 50:.1f}%"></span>'
+                f'<span class="chart-count">{format_latency(p99)}</span></div>\n'
+            )
+        out.write("""
+        </div>
+""")
+
+class ComparisonReportGenerator(ReportGenerator):
+    """基準與目前測試的比較報告 (由 regression_gate.RegressionGate.compare 的結果產生)
+
+    延遲分佈區塊顯示目前的測試；比較表中變差超過容許幅度的數值以紅色標示。
+    """
+
+    def __init__(self, comparison: Dict[str, Any], stats: Optional[StatsAccumulator] = None):
+        super().__init__([], stats=stats)
+        self.comparison = comparison
+
+    def _write_html(self, out: TextIO) -> None:
+        comparison = self.comparison
+        self._write_head(out, "效能回歸比較報告")
+        scopes = comparison['scopes']
+        regressed = sum(1 for scope in scopes if scope['regressions'])
+        verdict_class, verdict = ('danger', '回歸') if comparison['regressed'] else ('success', '通過')
+        out.write(f"""
+        <div class="summary">
+            <div class="summary-card">
+                <div class="number {verdict_class}">{verdict}</div>
+                <div class="label">結果</div>
+            </div>
+            <div class="summary-card">
+                <div class="number info">{len(scopes)}</div>
+                <div class="label">比較項目</div>
+            </div>
+            <div class="summary-card">
+                <div class="number danger">{regressed}</div>
+                <div class="label">回歸項目</div>
+            </div>
+            <div class="summary-card">
+                <div class="number warning">+{comparison['tolerance']:g}%</div>
+                <div class="label">P95/P99 容許幅度</div>
+            </div>
+        </div>
+""")
+        out.write(self._generate_comparison_section())
+        out.write(self._generate_latency_section())
+        self._write_footer(out)
+
+    def _change_cell(self, change: Optional[float], higher_is_worse: bool = True) -> str:
+        if change is None:
+            return '<td class="num">-</td>'
+        worse = change > 0 if higher_is_worse else change < 0
+        css = ''
+        if abs(change) > self.comparison['tolerance']:
+            css = ' worse' if worse else ' better'
+        return f'<td class="num{css}">{change:+.1f}%</td>'
+
+    def _generate_comparison_section(self) -> str:
+        escape = html.escape
+        rows = []
+        for scope in self.comparison['scopes']:
+            before, after, changes = scope['baseline'], scope['current'], scope['changes']
+            cells = [f"<td>{escape(scope['scope'])}</td>", f'<td class="num">{before["count"]} → {after["count"]}</td>']
+            for key in changes:
+                if not key.startswith('p'):
+                    continue
+                if before[key] is None or after[key] is None:
+                    cells.append('<td class="num">-</td><td class="num">-</td>')
+                    continue
+                cells.append(f'<td class="num">{format_latency(before[key])} → {format_latency(after[key])}</td>')
+                cells.append(self._change_cell(changes[key]))
+            if before['throughput'] is not None and after['throughput'] is not None:
+                cells.append(f'<td class="num">{before["throughput"]:.2f} → {after["throughput"]:.2f}</td>')
+            else:
+                cells.append('<td class="num">-</td>')
+            cells.append(self._change_cell(changes['throughput'], higher_is_worse=False))
+            ks = scope['ks']
+            cells.append(f'<td class="num">{ks["statistic"]:.4f} / {ks["p_value"]:.3g}</td>' if ks else '<td class="num">-</td>')
+            notes = scope['regressions'] + scope['warnings']
+            cells.append(f"<td>{escape('、'.join(notes)) or '✅'}</td>")
+            row_class = ' class="failed"' if scope['regressions'] else ''
+            rows.append(f"<tr{row_class}>{''.join(cells)}</tr>")
+
+        percentiles = "".join(
+            f"<th>{key.upper()}</th><th>變化</th>" for key in self.comparison['scopes'][0]['changes'] if key.startswith('p')
+        )
+        return f"""
+        <div class="latency">
+            <h2>📊 {escape(str(self.comparison['baseline']))} → {escape(str(self.comparison['current']))}</h2>
+            <p class="section-note">P95/P99 增加超過 {self.comparison['tolerance']:g}% 且 KS 檢定 p 值小於 {self.comparison['alpha']:g} 時判定為回歸。</p>
+            <table class="group-table">
+                <tr><th>項目</th><th>請求數</th>{percentiles}<th>吞吐量 (req/s)</th><th>變化</th><th>KS D / p</th><th>結果</th></tr>
+                {''.join(rows)}
+            </table>
+        </div>
+        """
+
+def create_report_generator(report: Dict[str, Any], mode: str = 'auto', key: str = 'results') -> ReportGenerator:
+    """依報告模式建立產生器，auto 模式在結果數超過門檻時改用彙總報告"""
+    if mode not in REPORT_MODES:
+        raise ValueError(f"不支援的報告模式: {mode} (可用: {', '.join(REPORT_MODES)})")
+
+    results = load_report_results(report, key)
+    histogram = load_report_histogram(report)
+    stats = load_report_stats(report)
+    if mode == 'auto':
+        summary = report.get('summary', {})
+        total = summary.get('total_tests', summary.get('total_requests'))
+        if total is None:
+            total = len(results) if isinstance(results, list) else 0
+        mode = 'aggregate' if total > AUTO_AGGREGATE_THRESHOLD else 'full'
+
+    if mode == 'aggregate':
+        return AggregateReportGenerator(results, histogram=histogram, stats=stats)
+    return ReportGenerator(results, histogram=histogram, stats=stats)
+
+def load_report_results(report: Dict[str, Any], key: str = 'results') -> Iterable[Dict[str, Any]]:
+    """取得 JSON 報告中的結果記錄，結果另存為 JSONL 時回傳可重複走訪該檔的來源"""
+    if 'results_file' in report:
+        return JsonlResults(report['results_file'])
+    return report.get(key, [])
+
+def load_report_histogram(report: Dict[str, Any]) -> Optional[LatencyHistogram]:
+    """取得 JSON 報告中的延遲直方圖快照 (舊報告沒有時回傳 None)"""
+    if 'latency_histogram' in report:
+        return LatencyHistogram.from_dict(report['latency_histogram'])
+    return None
+
+def load_report_stats(report: Dict[str, Any]) -> Optional[StatsAccumulator]:
+    """取得 JSON 報告中的累計統計 (舊報告沒有時回傳 None)"""
+    if 'stats' in report:
+        return StatsAccumulator.from_dict(report['stats'])
+    return None
 
-def generate_report_from_file(results_file: str, output_file: str = "api_test_report.html"):
+def generate_report_from_file(results_file: str, output_file: str = "api_test_report.html", mode: str = 'auto'):
     """從結果檔案生成報告"""
     try:
         with open(results_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        results = data.get('results', [])
-        if not results:
+        key = 'results' if 'results' in data else 'detailed_results'
+        if next(iter(load_report_results(data, key)), None) is None:
             print("❌ 結果檔案中沒有找到測試結果")
             return
         
-        generator = ReportGenerator(results)
+        generator = create_report_generator(data, mode, key)
         generator.generate_html_report(output_file)
         
     except Exception as e:
@@ -378,11 +1064,12 @@ if __name__ == "__main__":
     import sys
     
     if len(sys.argv) < 2:
-        print("用法: python report_generator.py <results_file> [output_file]")
+        print("用法: python report_generator.py <results_file> [output_file] [full|aggregate|auto]")
         print("範例: python report_generator.py test_report.json api_report.html")
         sys.exit(1)
     
     results_file = sys.argv[1]
     output_file = sys.argv[2] if len(sys.argv) > 2 else "api_test_report.html"
+    mode = sys.argv[3] if len(sys.argv) > 3 else "auto"
     
-    generate_report_from_file(results_file, output_file) 
\ No newline at end of file
+    generate_report_from_file(results_file, output_file, mode) 
\ No newline at end of file
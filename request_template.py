@@ -0,0 +1,134 @@
+"""
+預先編譯的請求範本 - URL、標頭與本文的靜態部分只處理一次，每個請求只填入佔位符
+"""
+
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from data_feeder import PLACEHOLDER, value_text
+
+# 不需要資料檔就能使用的變數
+BUILTIN_VARIABLES = ('uuid', 'seq', 'rand_int', 'timestamp')
+
+RAND_INT_MAX = 2 ** 31 - 1
+
+# 本文序列化後的佔位符：整個 JSON 字串只有一個佔位符時連同引號一起取代 (保留值的型別)，
+# 否則是字串中的一段，填入 JSON 跳脫後的文字
+_JSON_PLACEHOLDER = re.compile(r'(")?\{\{\s*(\w+)\s*\}\}(?(1)")')
+
+
+def _json_inline(value: Any) -> str:
+    return json.dumps(value_text(value), ensure_ascii=False)[1:-1]
+
+
+def _json_value(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _url_text(value: Any) -> str:
+    return value_text(value, url=True)
+
+
+class _CompiledText:
+    """切成靜態片段與 (變數名稱, 編碼函式) 的字串範本"""
+
+    __slots__ = ('parts', 'names')
+
+    def __init__(self, text: str, variables: Iterable[str], kind: str):
+        variables = set(variables)
+        pattern = _JSON_PLACEHOLDER if kind == 'json' else PLACEHOLDER
+        self.parts: List[Union[str, Tuple[str, Any]]] = []
+        self.names = set()
+        position = 0
+        for match in pattern.finditer(text):
+            name = match.group(match.lastindex)
+            # 不是內建變數也不是資料檔欄位的 {{...}} 原樣保留
+            if name not in variables:
+                continue
+            if kind == 'json':
+                encode = _json_value if match.group(1) else _json_inline
+            else:
+                encode = _url_text if kind == 'url' else value_text
+            self.parts.append(text[position:match.start()])
+            self.parts.append((name, encode))
+            self.names.add(name)
+            position = match.end()
+        self.parts.append(text[position:])
+
+    @property
+    def constant(self) -> bool:
+        return not self.names
+
+    def render(self, values: Dict[str, Any]) -> str:
+        return ''.join(
+            part if isinstance(part, str) else part[1](values[part[0]])
+            for part in self.parts
+        )
+
+
+class RequestTemplate:
+    """一個請求的 URL、標頭與 JSON 本文範本
+
+    建立時就把本文序列化為 JSON，沒有佔位符的部分直接快取：固定的本文每次都送出
+    同一份位元組，不必每個請求重新序列化。可用的佔位符為內建變數 (uuid、seq、
+    rand_int、timestamp) 與 fields 指定的資料檔欄位；同一個請求中同名的佔位符值相同。
+    """
+
+    def __init__(self, method: str, url: str, data: Any = None,
+                 headers: Optional[Dict[str, str]] = None, fields: Iterable[str] = ()):
+        variables = set(BUILTIN_VARIABLES) | set(fields)
+        self.method = method
+        headers = dict(headers or {})
+        body = None
+        if data:
+            body = json.dumps(data, ensure_ascii=False)
+            # 以位元組送出時 aiohttp 不會自動加上 JSON 的 Content-Type
+            if not any(name.lower() == 'content-type' for name in headers):
+                headers['Content-Type'] = 'application/json'
+
+        self._url = _CompiledText(url, variables, 'url')
+        self._headers = {name: _CompiledText(str(value), variables, 'text') for name, value in headers.items()}
+        self._body = _CompiledText(body, variables, 'json') if body is not None else None
+        self.variables = set(self._url.names)
+        for header in self._headers.values():
+            self.variables |= header.names
+        if self._body is not None:
+            self.variables |= self._body.names
+
+        # 沒有佔位符的部分只產生一次
+        self.url = url if self._url.constant else None
+        self.headers = headers if all(header.constant for header in self._headers.values()) else None
+        self.body = body.encode('utf-8') if body is not None and self._body.constant else None
+
+    @staticmethod
+    def _value(name: str, row: Optional[Dict[str, Any]], seq: int) -> Any:
+        if row is not None and name in row:
+            return row[name]
+        if name == 'seq':
+            return seq
+        if name == 'uuid':
+            return str(uuid.uuid4())
+        if name == 'rand_int':
+            return random.randint(0, RAND_INT_MAX)
+        if name == 'timestamp':
+            return int(time.time() * 1000)
+        return None
+
+    def render(self, row: Optional[Dict[str, Any]] = None,
+               seq: int = 0) -> Tuple[str, Optional[Dict[str, str]], Optional[bytes]]:
+        """產生 (URL, 標頭, 本文位元組)；沒有佔位符時直接回傳快取的值"""
+        if not self.variables:
+            return self.url, self.headers, self.body
+        values = {name: self._value(name, row, seq) for name in self.variables}
+        url = self.url if self.url is not None else self._url.render(values)
+        headers = self.headers
+        if headers is None:
+            headers = {name: header.render(values) for name, header in self._headers.items()}
+        body = self.body
+        if body is None and self._body is not None:
+            body = self._body.render(values).encode('utf-8')
+        return url, headers, body
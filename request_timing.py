@@ -0,0 +1,186 @@
+"""
+請求分段計時 - 以單調時鐘分別記錄 DNS、連線、TLS、首位元組與本文傳輸時間
+
+同步測試器透過自訂的 urllib3 連線類別量測，計時物件放在執行緒區域變數中，
+由 ApiTester 在每個請求前後開始與結束；aiohttp 的量測見 concurrent_api_tester。
+DNS 時間由包裝過的 socket.getaddrinfo 記錄，連線仍完全交給 urllib3 (含多位址重試)。
+"""
+
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from latency_histogram import format_latency
+
+# dns: 解析主機名稱；queue: 等待連線池釋出連線；connect: 建立 TCP 連線
+# (aiohttp 無法分開量測時包含 TLS)；tls: TLS 交握；ttfb: 送出請求到收到回應標頭；
+# body: 讀取回應本文
+PHASES = ('dns', 'queue', 'connect', 'tls', 'ttfb', 'body')
+
+PHASE_LABELS = {
+    'dns': 'DNS 解析',
+    'queue': '等待連線',
+    'connect': '建立連線',
+    'tls': 'TLS 交握',
+    'ttfb': '首位元組',
+    'body': '本文傳輸',
+}
+
+
+class RequestTiming:
+    """單一請求各階段花費的秒數 (沒有經過的階段不會出現)"""
+
+    __slots__ = ('phases', 'connected_at', 'sent_at', 'response_at')
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.connected_at: Optional[float] = None
+        self.sent_at: Optional[float] = None
+        self.response_at: Optional[float] = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        # 重新導向或重試時同一階段可能經過多次，累加起來
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self, now: Optional[float] = None) -> Dict[str, float]:
+        """記錄本文傳輸時間 (從收到回應標頭到現在) 並回傳各階段秒數"""
+        if self.response_at is not None:
+            self.add('body', (now or time.perf_counter()) - self.response_at)
+            self.response_at = None
+        return self.phases
+
+
+def print_phase_summary(summary: List[Dict[str, Any]]) -> None:
+    """輸出各請求階段的平均與百分位 (StatsAccumulator.phase_summary() 的結果)"""
+    if not summary:
+        return
+    print("🧭 分段時間" + " " * 4 + f"{'平均':>9}{'P50':>11}{'P99':>11}")
+    for phase in summary:
+        label = PHASE_LABELS[phase['phase']]
+        # 中文字佔兩格寬，依顯示寬度補齊
+        label += " " * (12 - len(label) - sum(not c.isascii() for c in label))
+        print(
+            f"   {label}{format_latency(phase['mean']):>11}"
+            f"{format_latency(phase['percentiles']['p50']):>11}{format_latency(phase['percentiles']['p99']):>11}"
+        )
+
+
+_local = threading.local()
+
+
+def start_timing() -> RequestTiming:
+    """開始量測目前執行緒接下來送出的請求"""
+    timing = _local.timing = RequestTiming()
+    return timing
+
+
+def stop_timing() -> None:
+    _local.timing = None
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return getattr(_local, 'timing', None)
+
+
+_getaddrinfo = socket.getaddrinfo
+
+
+def _timed_getaddrinfo(*args, **kwargs):
+    """目前執行緒正在量測請求時記錄 DNS 解析時間，否則直接呼叫原本的函式"""
+    timing = current_timing()
+    if timing is None:
+        return _getaddrinfo(*args, **kwargs)
+    start = time.perf_counter()
+    try:
+        return _getaddrinfo(*args, **kwargs)
+    finally:
+        timing.add('dns', time.perf_counter() - start)
+
+
+def install_dns_timing() -> None:
+    """以計時版本取代 socket.getaddrinfo (重複呼叫沒有影響)"""
+    socket.getaddrinfo = _timed_getaddrinfo
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """記錄 DNS、TCP 連線與首位元組時間的 HTTP 連線"""
+
+    def _new_conn(self) -> socket.socket:
+        timing = current_timing()
+        if timing is None:
+            return super()._new_conn()
+
+        # 解析與連線都由 urllib3 處理；DNS 時間由 _timed_getaddrinfo 記錄，其餘為連線時間
+        dns_before = timing.phases.get('dns', 0.0)
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        timing.connected_at = time.perf_counter()
+        dns = timing.phases.get('dns', 0.0) - dns_before
+        timing.add('connect', max(0.0, timing.connected_at - start - dns))
+        if timing.sent_at is not None:
+            # HTTP 連線在送出請求時才建立，首位元組時間從連線完成起算
+            timing.sent_at = timing.connected_at
+        return sock
+
+    def request(self, *args, **kwargs) -> None:
+        timing = current_timing()
+        if timing is not None:
+            timing.sent_at = time.perf_counter()
+        super().request(*args, **kwargs)
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        timing = current_timing()
+        if timing is not None and timing.sent_at is not None:
+            timing.response_at = time.perf_counter()
+            timing.add('ttfb', timing.response_at - timing.sent_at)
+            timing.sent_at = None
+        return response
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    """另外記錄 TLS 交握時間的 HTTPS 連線"""
+
+    def connect(self) -> None:
+        super().connect()
+        timing = current_timing()
+        if timing is not None and timing.connected_at is not None:
+            now = time.perf_counter()
+            timing.add('tls', now - timing.connected_at)
+            timing.connected_at = None
+            if timing.sent_at is not None:
+                timing.sent_at = now
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+    def _get_conn(self, timeout: Optional[float] = None):
+        timing = current_timing()
+        if timing is None:
+            return super()._get_conn(timeout)
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        timing.add('queue', time.perf_counter() - start)
+        return conn
+
+
+class TimedHTTPSConnectionPool(TimedHTTPConnectionPool, HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """使用分段計時連線類別的 requests Adapter"""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        install_dns_timing()
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
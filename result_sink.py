@@ -0,0 +1,71 @@
+"""
+JSONL 結果輸出 - 測試結果完成即逐筆附加寫入，不必保留在記憶體中
+"""
+
+import json
+import os
+import shutil
+import time
+from typing import Dict, Any, Iterator, List
+
+
+class JsonlResultSink:
+    """以緩衝方式將結果逐筆寫入 JSONL 檔案，並定期 flush 到磁碟"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0, buffer_size: int = 1 << 20):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._file = open(path, 'w', encoding='utf-8', buffering=buffer_size)
+        self._last_flush = time.monotonic()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """附加一筆結果"""
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str))
+        self._file.write('\n')
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def flush(self) -> None:
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self) -> 'JsonlResultSink':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """逐筆讀取 JSONL 結果檔"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class JsonlResults:
+    """可重複走訪的 JSONL 結果來源，每次迭代都從檔案開頭重新讀取"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return read_jsonl(self.path)
+
+
+def concat_jsonl(parts: List[str], path: str) -> None:
+    """將多個 worker 的 JSONL 檔合併成一個檔案並刪除原檔"""
+    with open(path, 'wb') as out:
+        for part in parts:
+            with open(part, 'rb') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part)
@@ -0,0 +1,190 @@
+"""
+欄位式結果儲存 - 以陣列保存每筆結果，字串欄位去重，需要時才還原為字典
+"""
+
+import operator
+import time
+from array import array
+from collections import Counter
+from itertools import compress, count
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 每筆結果都有、以欄位陣列保存的鍵；其餘鍵 (例如 response_data) 稀疏存放
+CORE_FIELDS = frozenset(('method', 'url', 'started', 'success', 'status_code', 'response_time', 'error'))
+
+# 最近一次格式化的 (秒數, 字串)，同一秒內的請求不必重複呼叫 strftime
+_last_timestamp = (None, '')
+
+
+def format_timestamp(epoch: float) -> str:
+    """將 time.time() 的值格式化為報告使用的時間字串"""
+    global _last_timestamp
+    second = int(epoch)
+    cached_second, text = _last_timestamp
+    if second != cached_second:
+        text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        _last_timestamp = (second, text)
+    return text
+
+
+def to_record(result: Dict[str, Any]) -> Dict[str, Any]:
+    """將請求剛完成時的結果 (含 started) 轉成報告格式 (含 timestamp)"""
+    record = dict(result)
+    record['timestamp'] = format_timestamp(record.pop('started'))
+    return record
+
+
+class _Interner:
+    """字串去重表，編號 0 保留給 None"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.ids: Dict[Optional[str], int] = {None: 0}
+
+    def id(self, value: Optional[str]) -> int:
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def mapping(self, other: '_Interner') -> List[int]:
+        """other 的編號對應到本表編號的轉換表"""
+        return [self.id(value) for value in other.values]
+
+
+class ResultStore:
+    """以欄位陣列保存測試結果
+
+    延遲、狀態碼、開始時間 (相對於第一筆) 與錯誤編號各存一個陣列，
+    方法、URL、錯誤訊息與分組欄位 (例如測試案例名稱) 只保存一次。
+    迭代時逐筆還原為與先前相同格式的結果字典。
+    """
+
+    def __init__(self, case_field: Optional[str] = None, optional_fields: Tuple[str, ...] = ()):
+        # 以去重編號保存的分組欄位名稱，例如 test_case_name、description、stage
+        self.case_field = case_field
+        # 稀疏存放但還原時一定出現的欄位 (沒有值時為 None)
+        self.optional_fields = optional_fields
+        self.epoch: Optional[float] = None
+        self.started = array('d')
+        self.latency = array('d')
+        self.status = array('H')
+        self.success = array('B')
+        self.error = array('I')
+        self.method = array('H')
+        self.url = array('I')
+        self.case = array('I')
+        self.methods = _Interner()
+        self.urls = _Interner()
+        self.errors = _Interner()
+        self.cases = _Interner()
+        self.extras: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.latency)
+
+    def append(self, result: Dict[str, Any]) -> None:
+        """加入一筆請求剛完成時的結果 (含 started)"""
+        index = len(self.latency)
+        started = result['started']
+        if self.epoch is None:
+            self.epoch = started
+        self.started.append(started - self.epoch)
+        self.latency.append(result['response_time'])
+        self.status.append(result['status_code'] or 0)
+        self.success.append(1 if result['success'] else 0)
+        self.error.append(self.errors.id(result['error']))
+        self.method.append(self.methods.id(result['method']))
+        self.url.append(self.urls.id(result['url']))
+        if self.case_field is not None:
+            self.case.append(self.cases.id(result.get(self.case_field)))
+
+        extras = {
+            key: value for key, value in result.items()
+            if value is not None and key not in CORE_FIELDS and key != self.case_field
+        }
+        if extras:
+            self.extras[index] = extras
+
+    def extend(self, other: 'ResultStore', **tags: Any) -> None:
+        """併入另一個儲存的所有結果，tags 會加到每一筆結果上"""
+        if not len(other):
+            return
+        offset = len(self.latency)
+        if self.epoch is None:
+            self.epoch = other.epoch
+        shift = other.epoch - self.epoch
+        self.started.extend(array('d', map(shift.__add__, other.started)) if shift else other.started)
+        self.latency.extend(other.latency)
+        self.status.extend(other.status)
+        self.success.extend(other.success)
+        self.error.extend(array('I', map(self.errors.mapping(other.errors).__getitem__, other.error)))
+        self.method.extend(array('H', map(self.methods.mapping(other.methods).__getitem__, other.method)))
+        self.url.extend(array('I', map(self.urls.mapping(other.urls).__getitem__, other.url)))
+
+        if self.case_field is not None:
+            if self.case_field in tags:
+                case_id = self.cases.id(tags.pop(self.case_field))
+                self.case.extend(array('I', [case_id]) * len(other))
+            elif other.case_field == self.case_field:
+                self.case.extend(array('I', map(self.cases.mapping(other.cases).__getitem__, other.case)))
+            else:
+                self.case.extend(array('I', bytes(4 * len(other))))
+
+        for index, extras in other.extras.items():
+            self.extras[offset + index] = dict(extras)
+        if tags:
+            for index in range(offset, offset + len(other)):
+                self.extras.setdefault(index, {}).update(tags)
+
+    def record(self, index: int, **tags: Any) -> Dict[str, Any]:
+        """將第 index 筆還原為結果字典"""
+        record = {
+            'method': self.methods.values[self.method[index]],
+            'url': self.urls.values[self.url[index]],
+            'timestamp': format_timestamp(self.epoch + self.started[index]),
+            'success': bool(self.success[index]),
+            'status_code': self.status[index] or None,
+            'response_time': self.latency[index],
+            'error': self.errors.values[self.error[index]],
+            'response_data': None,
+        }
+        if self.case_field is not None:
+            record[self.case_field] = self.cases.values[self.case[index]]
+        for field in self.optional_fields:
+            record[field] = None
+        extras = self.extras.get(index)
+        if extras:
+            record.update(extras)
+        record.update(tags)
+        return record
+
+    def records(self, **tags: Any) -> Iterator[Dict[str, Any]]:
+        """依序還原所有結果字典"""
+        for index in range(len(self.latency)):
+            yield self.record(index, **tags)
+
+    __iter__ = records
+
+    def success_count(self) -> int:
+        return sum(self.success)
+
+    def failed_indices(self) -> Iterator[int]:
+        """失敗結果的索引"""
+        return compress(count(), map(operator.not_, self.success))
+
+    def latency_summary(self) -> Dict[str, float]:
+        """有收到回應的請求之回應時間統計"""
+        valid = array('d', filter(None, self.latency))
+        if not valid:
+            return {'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0}
+        return {'count': len(valid), 'mean': sum(valid) / len(valid), 'min': min(valid), 'max': max(valid)}
+
+    def status_counts(self) -> Dict[Optional[int], int]:
+        """各狀態碼的請求數 (None 表示沒有收到回應)"""
+        return {status or None: n for status, n in Counter(self.status).items()}
+
+    def error_counts(self) -> Dict[str, int]:
+        """各錯誤訊息的次數"""
+        return {self.errors.values[e]: n for e, n in Counter(self.error).items() if e}
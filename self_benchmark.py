@@ -0,0 +1,515 @@
+"""
+自我效能基準 - 以本機替身伺服器量測各執行引擎本身的吞吐量、CPU、記憶體與計時誤差
+"""
+
+import asyncio
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from typing import Any, Dict, Optional, Tuple
+
+from aiohttp import web
+
+from latency_histogram import LatencyHistogram, format_latency
+
+DEFAULT_RESULTS_DIR = '.benchmarks'
+
+BENCHMARK_ENGINES = ('api', 'batch', 'concurrent')
+ENGINE_LABELS = {
+    'api': 'ApiTester (循序)',
+    'batch': 'BatchTester (thread)',
+    'concurrent': 'ConcurrentApiTester',
+}
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+# 替身伺服器的統計端點，不計入基準請求
+STATS_PATH = '/__stats'
+BENCH_PATH = '/bench'
+
+# 比較結果時，吞吐量下降或每個請求的 CPU 增加超過容許幅度即判定回歸
+GATED_METRICS = ('throughput', 'cpu_per_request_us')
+
+
+def sample_latency(rng: random.Random, distribution: str, latency: float, spread: float) -> float:
+    """依分佈抽出一次注入延遲 (秒)
+
+    fixed 固定為 latency；uniform 在 latency × (1 ± spread) 之間；exponential 平均值為
+    latency；lognormal 中位數為 latency、對數標準差為 spread。
+    """
+    if latency <= 0:
+        return 0.0
+    if distribution == 'uniform':
+        return max(0.0, rng.uniform(latency * (1 - spread), latency * (1 + spread)))
+    if distribution == 'exponential':
+        return rng.expovariate(1 / latency)
+    if distribution == 'lognormal':
+        return latency * rng.lognormvariate(0, spread)
+    return latency
+
+
+def _payload(size: int) -> bytes:
+    """約 size 位元組的 JSON 回應本文"""
+    skeleton = b'{"padding":""}'
+    return b'{"padding":"' + b'x' * max(0, size - len(skeleton)) + b'"}'
+
+
+def _create_app(options: Dict[str, Any]) -> web.Application:
+    rng = random.Random(options.get('seed'))
+    payload = _payload(options['payload_size'])
+    state = {'histogram': LatencyHistogram(), 'errors': 0}
+
+    async def handle(request: web.Request) -> web.Response:
+        started = time.perf_counter()
+        await request.read()
+        delay = sample_latency(rng, options['distribution'], options['latency'], options['spread'])
+        if delay:
+            await asyncio.sleep(delay)
+        status = 500 if rng.random() < options['error_rate'] else 200
+        if status != 200:
+            state['errors'] += 1
+        # 伺服器端的處理時間 (含實際睡眠時間)，作為客戶端計時的對照
+        state['histogram'].record(time.perf_counter() - started)
+        return web.Response(body=payload, status=status, content_type='application/json')
+
+    async def stats(request: web.Request) -> web.Response:
+        histogram = state['histogram']
+        body = {'requests': histogram.count, 'errors': state['errors'], 'histogram': histogram.to_dict()}
+        if 'reset' in request.query:
+            state.update(histogram=LatencyHistogram(), errors=0)
+        return web.json_response(body)
+
+    app = web.Application()
+    # 統計端點必須先註冊，否則會被萬用路由攔截
+    app.router.add_get(STATS_PATH, stats)
+    app.router.add_route('*', '/{tail:.*}', handle)
+    return app
+
+
+async def _serve_async(options: Dict[str, Any], sock: socket.socket, ready: Any) -> None:
+    runner = web.AppRunner(_create_app(options), access_log=None)
+    await runner.setup()
+    await web.SockSite(runner, sock).start()
+    ready.put(sock.getsockname()[1])
+    await asyncio.Event().wait()
+
+
+def _serve(options: Dict[str, Any], ready: Any) -> None:
+    """在獨立程序中執行替身伺服器，直到被終止"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((options['host'], options['port']))
+    try:
+        asyncio.run(_serve_async(options, sock, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class StandInServer:
+    """可設定延遲分佈、回應大小與錯誤率的本機 aiohttp 伺服器
+
+    在獨立程序中執行，伺服器的 CPU 不會算進被量測的客戶端。每個請求先讀完本文、
+    睡眠一次注入延遲，再以 error_rate 的機率回傳 500；伺服器端量到的處理時間記錄在
+    直方圖中，可由 /__stats 取得 (加上 ?reset 時讀取後歸零)。
+    """
+
+    def __init__(self, latency: float = 0.01, distribution: str = 'fixed', spread: float = 0.5,
+                 payload_size: int = 512, error_rate: float = 0.0, host: str = '127.0.0.1',
+                 port: int = 0, seed: Optional[int] = None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"不支援的延遲分佈: {distribution} (可用: {', '.join(LATENCY_DISTRIBUTIONS)})")
+        if not 0 <= error_rate <= 1:
+            raise ValueError("錯誤率必須介於 0 與 1 之間")
+        self.options = {
+            'latency': latency,
+            'distribution': distribution,
+            'spread': spread,
+            'payload_size': payload_size,
+            'error_rate': error_rate,
+            'host': host,
+            'port': port,
+            'seed': seed,
+        }
+        self.port: Optional[int] = None
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.options['host']}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> 'StandInServer':
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        self._process = context.Process(target=_serve, args=(self.options, ready), daemon=True)
+        self._process.start()
+        try:
+            self.port = ready.get(timeout=timeout)
+        except Exception:
+            self.stop()
+            raise RuntimeError("替身伺服器無法啟動")
+        return self
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成可寫入結果的格式"""
+        return {key: self.options[key] for key in ('latency', 'distribution', 'spread', 'payload_size', 'error_rate')}
+
+
+def fetch_server_stats(base_url: str, reset: bool = False) -> Dict[str, Any]:
+    """讀取替身伺服器的處理時間統計"""
+    url = f"{base_url}{STATS_PATH}{'?reset=1' if reset else ''}"
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+def _memory_usage() -> Tuple[Optional[int], Optional[int]]:
+    """目前與最高的常駐記憶體 (位元組)；沒有 /proc 的平台回傳 None"""
+    usage = {}
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'VmHWM'):
+                    usage[name] = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return usage.get('VmRSS'), usage.get('VmHWM')
+
+
+def _run_engine(engine: str, base_url: str, requests: int, concurrency: int,
+                capture: str, config_file: Optional[str]) -> Any:
+    """以指定引擎送出 requests 個 GET 請求，回傳測試器 (統計在 tester.stats)"""
+    # 在 worker 程序中才載入，替身伺服器程序不需要這些模組
+    from api_tester import ApiTester
+    from batch_tester import BatchTester
+    from capture_policy import CapturePolicy
+    from concurrent_api_tester import ConcurrentApiTester
+
+    policy = CapturePolicy.from_spec(capture)
+    if engine == 'api':
+        tester = ApiTester(f"{base_url}{BENCH_PATH}", capture=policy)
+        for _ in range(requests):
+            tester.test_get()
+    elif engine == 'batch':
+        tester = BatchTester(config_file, max_workers=concurrency, engine='thread', capture=policy)
+        tester.config['tests'] = tester.config['tests'][:requests]
+        tester.run_batch_tests()
+    else:
+        tester = ConcurrentApiTester(base_url, BENCH_PATH, num_requests=requests,
+                                     concurrency=concurrency, capture=policy)
+        tester.run()
+    return tester
+
+
+def _measure_engine(options: Dict[str, Any]) -> Dict[str, Any]:
+    """在全新的程序中暖機後量測一個引擎；測試器的輸出全部丟棄"""
+    engine = options['engine']
+    run_options = {key: options[key] for key in ('base_url', 'concurrency', 'capture', 'config_file')}
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        # 暖機：載入模組、建立連線，之後才歸零伺服器統計並開始計時
+        if options['warmup']:
+            _run_engine(engine, requests=options['warmup'], **run_options)
+        fetch_server_stats(options['base_url'], reset=True)
+        rss_before, _ = _memory_usage()
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        tester = _run_engine(engine, requests=options['requests'], **run_options)
+        duration = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+        rss_after, peak_rss = _memory_usage()
+    server = fetch_server_stats(options['base_url'])
+    return {
+        'duration': duration,
+        'cpu_seconds': cpu_seconds,
+        'rss_before': rss_before,
+        'rss_after': rss_after,
+        'peak_rss': peak_rss,
+        'total': tester.stats.total,
+        'successes': tester.stats.successes,
+        'histogram': tester.stats.histogram.to_dict(),
+        'server': server,
+    }
+
+
+def _megabytes(value: Optional[int]) -> Optional[float]:
+    return round(value / 1024 / 1024, 2) if value is not None else None
+
+
+def tool_version() -> str:
+    """已安裝套件的版本；從原始碼執行時讀取 pyproject.toml"""
+    try:
+        return metadata.version('api-debug-tool')
+    except metadata.PackageNotFoundError:
+        pass
+    try:
+        import tomllib
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pyproject.toml'), 'rb') as f:
+            return tomllib.load(f)['project']['version']
+    except (OSError, KeyError, ValueError):
+        return 'unknown'
+
+
+def _environment() -> Dict[str, Any]:
+    versions = {}
+    for package in ('aiohttp', 'requests'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **versions,
+    }
+
+
+class SelfBenchmark:
+    """以同一個替身伺服器依序量測各引擎
+
+    每個引擎在新的 spawn 程序中執行 (記憶體與 CPU 不受前一個引擎影響)，先暖機再送出
+    requests 個 GET 請求，量測：
+        吞吐量              請求數 / 牆鐘時間
+        每個請求的 CPU      客戶端程序 (含所有執行緒) 的 CPU 時間 / 請求數，以及每核心每秒請求數
+        記憶體成長          量測期間常駐記憶體的增加量與最高值
+        計時誤差            客戶端量到的延遲減去伺服器端處理時間 (平均與 P50/P99)
+    ApiTester 一次只送一個請求，不套用 concurrency。
+    """
+
+    def __init__(self, server: StandInServer, engines: Tuple[str, ...] = BENCHMARK_ENGINES,
+                 requests: int = 2000, concurrency: int = 20, warmup: int = 50, capture: str = 'all'):
+        unknown = [engine for engine in engines if engine not in BENCHMARK_ENGINES]
+        if unknown:
+            raise ValueError(f"不支援的引擎: {', '.join(unknown)} (可用: {', '.join(BENCHMARK_ENGINES)})")
+        self.server = server
+        self.engines = engines
+        self.requests = requests
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.capture = capture
+
+    def _engine_result(self, engine: str, measured: Dict[str, Any]) -> Dict[str, Any]:
+        client = LatencyHistogram.from_dict(measured['histogram'])
+        server = LatencyHistogram.from_dict(measured['server']['histogram'])
+        total = measured['total']
+        duration = measured['duration']
+        cpu_seconds = measured['cpu_seconds']
+        growth = None
+        if measured['rss_before'] is not None and measured['rss_after'] is not None:
+            growth = measured['rss_after'] - measured['rss_before']
+        return {
+            'engine': engine,
+            'concurrency': 1 if engine == 'api' else self.concurrency,
+            'requests': total,
+            'error_rate': round((total - measured['successes']) / total * 100, 3) if total else 0.0,
+            'duration': round(duration, 3),
+            'throughput': round(total / duration, 2) if duration > 0 else 0.0,
+            'cpu_seconds': round(cpu_seconds, 3),
+            'cpu_per_request_us': round(cpu_seconds / total * 1_000_000, 1) if total else None,
+            'requests_per_cpu_second': round(total / cpu_seconds, 1) if cpu_seconds > 0 else None,
+            'rss_growth_mb': _megabytes(growth),
+            'peak_rss_mb': _megabytes(measured['peak_rss']),
+            'client': {'mean': round(client.mean, 6), 'percentiles': client.percentiles()},
+            'server': {'mean': round(server.mean, 6), 'percentiles': server.percentiles()},
+            'accuracy': {
+                'mean_offset': round(client.mean - server.mean, 6),
+                'p50_offset': round(client.percentile(50) - server.percentile(50), 6),
+                'p99_offset': round(client.percentile(99) - server.percentile(99), 6),
+            },
+            'histogram': measured['histogram'],
+        }
+
+    def run(self) -> Dict[str, Any]:
+        """量測所有引擎並回傳可保存的結果"""
+        base_url = self.server.base_url
+        with tempfile.TemporaryDirectory() as directory:
+            # BatchTester 的每個測試案例送出一個 GET 請求
+            config_file = os.path.join(directory, 'benchmark_tests.json')
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'base_url': base_url,
+                    'tests': [
+                        {'name': f'bench {i}', 'endpoint': BENCH_PATH, 'method': 'GET'}
+                        for i in range(1, max(self.requests, self.warmup) + 1)
+                    ],
+                }, f)
+
+            results = []
+            for engine in self.engines:
+                print(f"⏱️  量測 {ENGINE_LABELS[engine]} ({self.requests} 請求)...")
+                options = {
+                    'engine': engine,
+                    'base_url': base_url,
+                    'requests': self.requests,
+                    'concurrency': self.concurrency,
+                    'warmup': self.warmup,
+                    'capture': self.capture,
+                    'config_file': config_file,
+                }
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    measured = pool.submit(_measure_engine, options).result()
+                results.append(self._engine_result(engine, measured))
+
+        return {
+            'benchmark': {
+                'version': tool_version(),
+                'created': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'requests': self.requests,
+                'concurrency': self.concurrency,
+                'warmup': self.warmup,
+                'capture': self.capture,
+            },
+            'environment': _environment(),
+            'server': self.server.to_dict(),
+            'engines': results,
+        }
+
+    @staticmethod
+    def print_summary(result: Dict[str, Any]) -> None:
+        server = result['server']
+        print("=" * 60)
+        print(f"🏁 自我效能基準 v{result['benchmark']['version']}")
+        print(f"替身伺服器: {server['distribution']} {format_latency(server['latency'])}，"
+              f"回應 {server['payload_size']} bytes，錯誤率 {server['error_rate'] * 100:g}%")
+        print("=" * 60)
+        for entry in result['engines']:
+            accuracy = entry['accuracy']
+            print(f"🔧 {ENGINE_LABELS[entry['engine']]} (並發 {entry['concurrency']})")
+            print(f"    吞吐量: {entry['throughput']:.2f} req/s，{entry['requests']} 請求，"
+                  f"錯誤率 {entry['error_rate']:g}%")
+            if entry['cpu_per_request_us'] is not None:
+                print(f"    CPU: {entry['cpu_per_request_us']:.1f} µs/請求 "
+                      f"(每核心 {entry['requests_per_cpu_second'] or 0:.0f} req/s)")
+            if entry['rss_growth_mb'] is not None:
+                print(f"    記憶體: 成長 {entry['rss_growth_mb']:+.2f} MB，最高 {entry['peak_rss_mb']:.2f} MB")
+            print(f"    計時誤差: 平均 {accuracy['mean_offset'] * 1000:+.3f}ms，"
+                  f"P50 {accuracy['p50_offset'] * 1000:+.3f}ms，P99 {accuracy['p99_offset'] * 1000:+.3f}ms")
+        print("=" * 60)
+
+    @staticmethod
+    def save(result: Dict[str, Any], directory: str = DEFAULT_RESULTS_DIR) -> str:
+        """以版本與時間命名保存結果，回傳檔案路徑"""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(directory, f"{result['benchmark']['version']}_{stamp}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        return path
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    if 'engines' not in result:
+        raise ValueError(f"{path} 不是自我效能基準的結果")
+    return result
+
+
+def _change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or not before:
+        return None
+    return round((after - before) / before * 100, 2)
+
+
+def compare_results(before: Dict[str, Any], after: Dict[str, Any], tolerance: float = 10.0) -> Dict[str, Any]:
+    """比較兩次基準中都有的引擎
+
+    吞吐量下降或每個請求的 CPU 增加超過 tolerance 百分比時判定回歸；記憶體與計時誤差
+    只列出變化。伺服器設定或請求數不同時結果不可直接比較，另外提出警告。
+    """
+    warnings = []
+    if before['server'] != after['server']:
+        warnings.append("替身伺服器設定不同")
+    for key in ('requests', 'concurrency', 'capture'):
+        if before['benchmark'].get(key) != after['benchmark'].get(key):
+            warnings.append(f"{key} 不同: {before['benchmark'].get(key)} → {after['benchmark'].get(key)}")
+
+    previous = {entry['engine']: entry for entry in before['engines']}
+    engines = []
+    for entry in after['engines']:
+        base = previous.get(entry['engine'])
+        if base is None:
+            continue
+        changes = {
+            key: _change(base[key], entry[key])
+            for key in ('throughput', 'cpu_per_request_us', 'rss_growth_mb')
+        }
+        regressions = []
+        if changes['throughput'] is not None and changes['throughput'] < -tolerance:
+            regressions.append(f"吞吐量 {changes['throughput']:.1f}%")
+        if changes['cpu_per_request_us'] is not None and changes['cpu_per_request_us'] > tolerance:
+            regressions.append(f"CPU/請求 +{changes['cpu_per_request_us']:.1f}%")
+        engines.append({
+            'engine': entry['engine'],
+            'baseline': {key: base[key] for key in (*GATED_METRICS, 'rss_growth_mb', 'accuracy')},
+            'current': {key: entry[key] for key in (*GATED_METRICS, 'rss_growth_mb', 'accuracy')},
+            'changes': changes,
+            'regressions': regressions,
+        })
+    return {
+        'baseline': before['benchmark'],
+        'current': after['benchmark'],
+        'tolerance': tolerance,
+        'warnings': warnings,
+        'engines': engines,
+        'regressed': any(engine['regressions'] for engine in engines),
+    }
+
+
+def print_comparison(comparison: Dict[str, Any]) -> None:
+    baseline, current = comparison['baseline'], comparison['current']
+    print("=" * 60)
+    print(f"📊 基準比較: v{baseline['version']} ({baseline['created']}) → v{current['version']} ({current['created']})")
+    print(f"容許幅度: 吞吐量與 CPU/請求 ±{comparison['tolerance']:g}%")
+    for message in comparison['warnings']:
+        print(f"⚠️  {message}，結果可能無法直接比較")
+    print("=" * 60)
+    for engine in comparison['engines']:
+        before, after, changes = engine['baseline'], engine['current'], engine['changes']
+        print(f"{'❌' if engine['regressions'] else '✅'} {ENGINE_LABELS[engine['engine']]}")
+        change = f" ({changes['throughput']:+.1f}%)" if changes['throughput'] is not None else ""
+        print(f"    吞吐量: {before['throughput']:.2f} → {after['throughput']:.2f} req/s{change}")
+        if before['cpu_per_request_us'] is not None and after['cpu_per_request_us'] is not None:
+            change = f" ({changes['cpu_per_request_us']:+.1f}%)" if changes['cpu_per_request_us'] is not None else ""
+            print(f"    CPU/請求: {before['cpu_per_request_us']:.1f} → {after['cpu_per_request_us']:.1f} µs{change}")
+        if before['rss_growth_mb'] is not None and after['rss_growth_mb'] is not None:
+            print(f"    記憶體成長: {before['rss_growth_mb']:+.2f} → {after['rss_growth_mb']:+.2f} MB")
+        print(f"    P99 計時誤差: {before['accuracy']['p99_offset'] * 1000:+.3f} → "
+              f"{after['accuracy']['p99_offset'] * 1000:+.3f}ms")
+        for message in engine['regressions']:
+            print(f"    ❌ 回歸: {message}")
+    print("=" * 60)
+    if comparison['regressed']:
+        print("❌ 偵測到引擎效能回歸")
+    else:
+        print("✅ 沒有超過容許幅度的引擎效能回歸")
+
+
+def latest_result(directory: str = DEFAULT_RESULTS_DIR) -> Optional[str]:
+    """目錄中最近一次保存的結果檔案"""
+    if not os.path.isdir(directory):
+        return None
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')]
+    return max(paths, key=os.path.getmtime) if paths else None
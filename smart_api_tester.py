@@ -1,52 +1,116 @@
 import argparse
 import json
 import time
-from typing import Optional, Dict, Any, List
+import threading
+import concurrent.futures
+from typing import Optional, Dict, Any, List, Tuple
 
 import requests
 from api_tester import ApiTester
-from report_generator import ReportGenerator
+from http_session import (
+    add_session_arguments,
+    create_session,
+    create_session_from_args,
+    get_connection_stats,
+    print_connection_stats,
+)
+from latency_histogram import LatencyHistogram, format_latency
+from report_generator import create_report_generator
+from request_timing import print_phase_summary, start_timing, stop_timing
+from result_sink import JsonlResultSink
+from result_store import ResultStore, to_record
+from stats_accumulator import StatsAccumulator
+
+METHODS_TO_PROBE = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS']
 
 class SmartApiTester:
     """智能API測試器 - 支援自動方法檢測和多場景測試"""
     
-    def __init__(self, base_url: str, endpoint: str, timeout: int = 10, headers: Optional[Dict[str, str]] = None):
+    # 同一次執行中各端點的方法檢測結果，避免重複探測
+    _method_cache: Dict[str, List[str]] = {}
+    _method_cache_lock = threading.Lock()
+    
+    def __init__(self, base_url: str, endpoint: str, timeout: int = 10, headers: Optional[Dict[str, str]] = None,
+                 session: Optional[requests.Session] = None, parallelism: int = 1,
+                 results_file: Optional[str] = None):
         self.base_url = base_url.rstrip('/')
         self.endpoint = endpoint
         self.full_url = f"{self.base_url}{endpoint}"
         self.timeout = timeout
         self.headers = headers or {"Content-Type": "application/json"}
+        # 同時送出的場景請求數，結果仍依固定順序記錄
+        self.parallelism = max(1, parallelism)
+        self.session = session or create_session(pool_maxsize=max(self.parallelism, 10))
         self.supported_methods = []
-        self.test_results = []
+        # 指定 results_file 時結果逐筆寫入 JSONL，不保留在 test_results 中
+        self.results_file = results_file
+        self._sink: Optional[JsonlResultSink] = None
+        self.test_results = ResultStore(case_field='description', optional_fields=('request_data',))
+        # 依方法與測試場景分組的累計統計
+        self.stats = StatsAccumulator('method', 'scenario')
+    
+    @property
+    def histogram(self) -> LatencyHistogram:
+        return self.stats.histogram
         
+    def _probe_method(self, method: str) -> Tuple[Optional[requests.Response], Optional[Exception]]:
+        """送出單一方法的探測請求"""
+        try:
+            response = self.session.request(
+                method=method,
+                url=self.full_url,
+                headers=self.headers,
+                timeout=self.timeout,
+                json={} if method in ['POST', 'PUT', 'PATCH'] else None
+            )
+            return response, None
+        except Exception as e:
+            return None, e
+
     def detect_supported_methods(self) -> List[str]:
-        """自動檢測API支援的HTTP方法"""
+        """自動檢測API支援的HTTP方法
+
+        先送出 OPTIONS，伺服器有回傳 Allow 標頭時直接採用，
+        否則同時探測其餘方法。結果會快取到本次執行結束。
+        """
         print(f"\n🔍 正在檢測 {self.full_url} 支援的HTTP方法...")
         print("=" * 60)
         
-        methods_to_test = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS']
-        supported = []
-        
-        for method in methods_to_test:
-            try:
-                response = requests.request(
-                    method=method,
-                    url=self.full_url,
-                    headers=self.headers,
-                    timeout=self.timeout,
-                    json={} if method in ['POST', 'PUT', 'PATCH'] else None
-                )
-                
-                if response.status_code != 405:  # Method Not Allowed
+        with self._method_cache_lock:
+            cached = self._method_cache.get(self.full_url)
+        if cached is not None:
+            self.supported_methods = list(cached)
+            print(f"📋 支援的方法 (快取): {', '.join(cached) if cached else '無'}")
+            return self.supported_methods
+        
+        probes = {'OPTIONS': self._probe_method('OPTIONS')}
+        options_response = probes['OPTIONS'][0]
+        allow = options_response.headers.get('Allow') if options_response is not None else None
+        
+        if allow:
+            allowed = {m.strip().upper() for m in allow.split(',')}
+            supported = [m for m in METHODS_TO_PROBE if m in allowed]
+            print(f"📨 OPTIONS 回傳 Allow: {allow}")
+        else:
+            remaining = [m for m in METHODS_TO_PROBE if m != 'OPTIONS']
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(remaining)) as executor:
+                for method, outcome in zip(remaining, executor.map(self._probe_method, remaining)):
+                    probes[method] = outcome
+            
+            supported = []
+            for method in METHODS_TO_PROBE:
+                response, error = probes[method]
+                if error is not None:
+                    print(f"❌ {method}: 錯誤 - {str(error)}")
+                elif response.status_code != 405:  # Method Not Allowed
                     supported.append(method)
                     status_emoji = "✅" if response.status_code < 400 else "⚠️"
                     print(f"{status_emoji} {method}: {response.status_code}")
                 else:
                     print(f"❌ {method}: 405 (不支援)")
-                    
-            except Exception as e:
-                print(f"❌ {method}: 錯誤 - {str(e)}")
         
+        with self._method_cache_lock:
+            self._method_cache[self.full_url] = list(supported)
         self.supported_methods = supported
         print(f"\n📋 支援的方法: {', '.join(supported) if supported else '無'}")
         return supported
@@ -64,17 +128,44 @@ class SmartApiTester:
             return
         
         # 2. 對每個支援的方法執行各種測試場景
+        plan = []
         for method in self.supported_methods:
-            self._test_method_scenarios(method)
+            for scenario_name, jobs in self._test_method_scenarios(method):
+                for url, data, description in jobs:
+                    plan.append((method, scenario_name, url, data, description))
+        
+        if self.results_file:
+            self._sink = JsonlResultSink(self.results_file)
+        try:
+            self._run_plan(plan)
+        finally:
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
         
         # 3. 生成總結報告
         self._print_comprehensive_summary()
     
-    def _test_method_scenarios(self, method: str):
-        """對特定HTTP方法執行各種測試場景"""
-        print(f"\n🧪 測試 {method} 方法的各種場景")
-        print("-" * 50)
-        
+    def _run_plan(self, plan: List[tuple]):
+        """以 parallelism 個執行緒送出所有場景請求，並依計畫順序記錄與輸出結果"""
+        def execute(job):
+            method, _, url, data, description = job
+            return self._execute_single_request(method, url, data, description)
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            current = (None, None)
+            for job, (result, response_time, phases) in zip(plan, executor.map(execute, plan)):
+                method, scenario_name = job[0], job[1]
+                if method != current[0]:
+                    print(f"\n🧪 測試 {method} 方法的各種場景")
+                    print("-" * 50)
+                if (method, scenario_name) != current:
+                    print(f"\n{scenario_name}")
+                current = (method, scenario_name)
+                self._record_result(result, response_time, phases)
+    
+    def _test_method_scenarios(self, method: str) -> List[Tuple[str, List[tuple]]]:
+        """建立特定HTTP方法各種測試場景的請求"""
         scenarios = [
             ("✅ 正常值測試", self._test_normal_case),
             ("❌ 缺少欄位測試", self._test_missing_fields),
@@ -83,11 +174,9 @@ class SmartApiTester:
             ("🚫 不存在資源測試", self._test_nonexistent_resource)
         ]
         
-        for scenario_name, test_func in scenarios:
-            print(f"\n{scenario_name}")
-            test_func(method)
+        return [(scenario_name, test_func(method)) for scenario_name, test_func in scenarios]
     
-    def _test_normal_case(self, method: str):
+    def _test_normal_case(self, method: str) -> List[tuple]:
         """正常值測試"""
         normal_data = {
             "name": "測試用戶",
@@ -98,14 +187,13 @@ class SmartApiTester:
         }
         
         if method in ['GET', 'DELETE', 'HEAD', 'OPTIONS']:
-            self._execute_test(method, None, "正常參數")
-        else:
-            self._execute_test(method, normal_data, "正常資料")
+            return [(self.full_url, None, "正常參數")]
+        return [(self.full_url, normal_data, "正常資料")]
     
-    def _test_missing_fields(self, method: str):
+    def _test_missing_fields(self, method: str) -> List[tuple]:
         """缺少欄位測試"""
         if method in ['GET', 'DELETE', 'HEAD', 'OPTIONS']:
-            return
+            return []
         
         incomplete_data_sets = [
             {},  # 完全空的資料
@@ -113,13 +201,12 @@ class SmartApiTester:
             {"email": "test@example.com"}  # 不同的部分欄位
         ]
         
-        for i, data in enumerate(incomplete_data_sets, 1):
-            self._execute_test(method, data, f"缺少欄位 #{i}")
+        return [(self.full_url, data, f"缺少欄位 #{i}") for i, data in enumerate(incomplete_data_sets, 1)]
     
-    def _test_format_errors(self, method: str):
+    def _test_format_errors(self, method: str) -> List[tuple]:
         """格式錯誤測試"""
         if method in ['GET', 'DELETE', 'HEAD', 'OPTIONS']:
-            return
+            return []
         
         invalid_data_sets = [
             {"name": 123, "email": "invalid-email", "age": "not-a-number"},  # 錯誤資料型別
@@ -128,13 +215,12 @@ class SmartApiTester:
             "invalid json string",  # 無效的JSON字串
         ]
         
-        for i, data in enumerate(invalid_data_sets, 1):
-            self._execute_test(method, data, f"格式錯誤 #{i}")
+        return [(self.full_url, data, f"格式錯誤 #{i}") for i, data in enumerate(invalid_data_sets, 1)]
     
-    def _test_boundary_values(self, method: str):
+    def _test_boundary_values(self, method: str) -> List[tuple]:
         """邊界值測試"""
         if method in ['GET', 'DELETE', 'HEAD', 'OPTIONS']:
-            return
+            return []
         
         boundary_data_sets = [
             {"name": "x" * 1000, "age": 999999},  # 極大值
@@ -143,10 +229,9 @@ class SmartApiTester:
             {"name": "🚀🎯❌✅", "age": -999999},  # 特殊字符和負值
         ]
         
-        for i, data in enumerate(boundary_data_sets, 1):
-            self._execute_test(method, data, f"邊界值 #{i}")
+        return [(self.full_url, data, f"邊界值 #{i}") for i, data in enumerate(boundary_data_sets, 1)]
     
-    def _test_nonexistent_resource(self, method: str):
+    def _test_nonexistent_resource(self, method: str) -> List[tuple]:
         """不存在資源測試"""
         # 測試不存在的ID
         nonexistent_endpoints = [
@@ -155,22 +240,19 @@ class SmartApiTester:
             f"{self.endpoint}/00000000-0000-0000-0000-000000000000"
         ]
         
-        for endpoint in nonexistent_endpoints:
-            url = f"{self.base_url}{endpoint}"
-            self._execute_single_request(method, url, None, f"不存在資源: {endpoint}")
-    
-    def _execute_test(self, method: str, data: Any, description: str):
-        """執行單一測試"""
-        self._execute_single_request(method, self.full_url, data, description)
+        return [(f"{self.base_url}{endpoint}", None, f"不存在資源: {endpoint}") for endpoint in nonexistent_endpoints]
     
-    def _execute_single_request(self, method: str, url: str, data: Any, description: str):
-        """執行單一請求"""
+    def _execute_single_request(self, method: str, url: str, data: Any,
+                                description: str) -> Tuple[Dict[str, Any], Optional[float], Optional[Dict[str, float]]]:
+        """執行單一請求，回傳結果、未捨入的回應時間與各請求階段的秒數"""
         start_time = time.time()
+        response_time = None
+        phases = None
         result = {
             'method': method,
             'url': url,
             'description': description,
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'started': start_time,
             'success': False,
             'status_code': None,
             'response_time': 0,
@@ -192,7 +274,9 @@ class SmartApiTester:
                     # 如果無法解析，發送原始字串
                     pass
             
-            response = requests.request(
+            timing = start_timing()
+            start = time.perf_counter()
+            response = self.session.request(
                 method=method.upper(),
                 url=url,
                 json=json_data if json_data else None,
@@ -201,7 +285,9 @@ class SmartApiTester:
                 timeout=self.timeout
             )
             
-            response_time = time.time() - start_time
+            end = time.perf_counter()
+            response_time = end - start
+            phases = timing.finish(end)
             result['response_time'] = round(response_time, 3)
             result['status_code'] = response.status_code
             
@@ -214,28 +300,44 @@ class SmartApiTester:
             # 判斷成功與否
             result['success'] = 200 <= response.status_code < 300
             
-            # 輸出結果
-            status_emoji = "✅" if result['success'] else "❌"
-            print(f"  {status_emoji} {description}: {result['status_code']} ({result['response_time']}s)")
-            
         except Exception as e:
             result['error'] = str(e)
-            print(f"  ❌ {description}: 錯誤 - {str(e)}")
+        finally:
+            stop_timing()
         
-        self.test_results.append(result)
+        return result, response_time, phases
+    
+    def _record_result(self, result: Dict[str, Any], response_time: Optional[float],
+                       phases: Optional[Dict[str, float]] = None):
+        """記錄並輸出單一請求結果"""
+        if result['error']:
+            print(f"  ❌ {result['description']}: 錯誤 - {result['error']}")
+        else:
+            status_emoji = "✅" if result['success'] else "❌"
+            print(f"  {status_emoji} {result['description']}: {result['status_code']} ({result['response_time']}s)")
+        
+        # 更新摘要統計
+        description = result['description']
+        scenario = description.split(':')[0] if ':' in description else description
+        self.stats.add(result, response_time, phases, method=result['method'], scenario=scenario)
+        
+        if self._sink is not None:
+            self._sink.write(to_record(result))
+        else:
+            self.test_results.append(result)
     
     def _print_comprehensive_summary(self):
         """列印全面測試摘要"""
-        if not self.test_results:
+        if not self.stats.total:
             return
         
         print("\n" + "=" * 80)
         print("📊 全面測試摘要報告")
         print("=" * 80)
         
-        total_tests = len(self.test_results)
-        successful_tests = sum(1 for r in self.test_results if r['success'])
-        failed_tests = total_tests - successful_tests
+        total_tests = self.stats.total
+        successful_tests = self.stats.successes
+        failed_tests = self.stats.failed
         
         print(f"🎯 測試目標: {self.full_url}")
         print(f"📋 支援方法: {', '.join(self.supported_methods)}")
@@ -245,70 +347,58 @@ class SmartApiTester:
         print(f"📈 整體成功率: {(successful_tests/total_tests*100):.1f}%")
         
         # 按方法分組統計
-        method_stats = {}
-        for result in self.test_results:
-            method = result['method']
-            if method not in method_stats:
-                method_stats[method] = {'total': 0, 'success': 0}
-            method_stats[method]['total'] += 1
-            if result['success']:
-                method_stats[method]['success'] += 1
-        
         print(f"\n📋 各HTTP方法測試結果:")
-        for method, stats in method_stats.items():
-            success_rate = (stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0
+        for method, stats in self.stats.group('method').items():
+            success_rate = stats.success_rate
             status = "✅" if success_rate >= 80 else "⚠️" if success_rate >= 50 else "❌"
-            print(f"   {status} {method}: {stats['success']}/{stats['total']} ({success_rate:.1f}%)")
+            print(f"   {status} {method}: {stats.successes}/{stats.count} ({success_rate:.1f}%)")
         
         # 測試場景統計
-        scenario_stats = {}
-        for result in self.test_results:
-            scenario = result['description'].split(':')[0] if ':' in result['description'] else result['description']
-            if scenario not in scenario_stats:
-                scenario_stats[scenario] = {'total': 0, 'success': 0}
-            scenario_stats[scenario]['total'] += 1
-            if result['success']:
-                scenario_stats[scenario]['success'] += 1
-        
         print(f"\n🧪 各測試場景結果:")
-        for scenario, stats in scenario_stats.items():
-            success_rate = (stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0
+        for scenario, stats in self.stats.group('scenario').items():
+            success_rate = stats.success_rate
             status = "✅" if success_rate >= 80 else "⚠️" if success_rate >= 50 else "❌"
-            print(f"   {status} {scenario}: {stats['success']}/{stats['total']} ({success_rate:.1f}%)")
+            print(f"   {status} {scenario}: {stats.successes}/{stats.count} ({success_rate:.1f}%)")
         
         # 顯示關鍵問題
         print(f"\n🚨 關鍵發現:")
         
         # 檢查是否有405錯誤（方法不支援）
-        method_errors = [r for r in self.test_results if r['status_code'] == 405]
-        if method_errors:
+        status_counts = self.stats.status_counts
+        if status_counts[405]:
             print(f"   ⚠️ 檢測到不支援的HTTP方法")
         
         # 檢查是否有400錯誤（請求格式問題）
-        format_errors = [r for r in self.test_results if r['status_code'] == 400]
+        format_errors = status_counts[400]
         if format_errors:
-            print(f"   ⚠️ 檢測到請求格式問題 ({len(format_errors)} 個)")
+            print(f"   ⚠️ 檢測到請求格式問題 ({format_errors} 個)")
         
         # 檢查是否有404錯誤（資源不存在）
-        not_found_errors = [r for r in self.test_results if r['status_code'] == 404]
+        not_found_errors = status_counts[404]
         if not_found_errors:
-            print(f"   ✅ 不存在資源測試正常 ({len(not_found_errors)} 個404回應)")
+            print(f"   ✅ 不存在資源測試正常 ({not_found_errors} 個404回應)")
         
         # 檢查是否有500錯誤（伺服器錯誤）
-        server_errors = [r for r in self.test_results if r['status_code'] and r['status_code'] >= 500]
+        server_errors = sum(count for status, count in status_counts.items() if status and status >= 500)
         if server_errors:
-            print(f"   🚨 檢測到伺服器錯誤 ({len(server_errors)} 個)")
+            print(f"   🚨 檢測到伺服器錯誤 ({server_errors} 個)")
         
         # 效能分析
-        valid_times = [r['response_time'] for r in self.test_results if r['response_time'] > 0]
-        if valid_times:
-            avg_time = sum(valid_times) / len(valid_times)
-            max_time = max(valid_times)
-            min_time = min(valid_times)
+        if self.histogram.count:
+            avg_time = self.histogram.mean
+            max_time = self.histogram.max
+            min_time = self.histogram.min
             print(f"\n⚡ 效能分析:")
             print(f"   平均回應時間: {avg_time:.3f}秒")
             print(f"   最快回應時間: {min_time:.3f}秒")
             print(f"   最慢回應時間: {max_time:.3f}秒")
+            for name, value in self.histogram.percentiles().items():
+                print(f"   {name.upper()} 回應時間: {format_latency(value)}")
+            print()
+            print_phase_summary(self.stats.phase_summary())
+        
+        print()
+        print_connection_stats(get_connection_stats(self.session))
     
     def generate_detailed_report(self, output_file: str = None):
         """生成詳細的測試報告"""
@@ -321,16 +411,24 @@ class SmartApiTester:
                 'target_url': self.full_url,
                 'supported_methods': self.supported_methods,
                 'test_timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'total_tests': len(self.test_results)
+                'total_tests': self.stats.total
             },
             'summary': {
-                'total_tests': len(self.test_results),
-                'successful_tests': sum(1 for r in self.test_results if r['success']),
-                'failed_tests': sum(1 for r in self.test_results if not r['success']),
-                'success_rate': (sum(1 for r in self.test_results if r['success']) / len(self.test_results) * 100) if self.test_results else 0
+                'total_tests': self.stats.total,
+                'successful_tests': self.stats.successes,
+                'failed_tests': self.stats.failed,
+                'success_rate': self.stats.success_rate,
+                'percentiles': self.histogram.percentiles(),
+                'phases': self.stats.phase_summary()
             },
-            'detailed_results': self.test_results
+            'latency_histogram': self.histogram.to_dict(),
+            'stats': self.stats.to_dict(),
+            'connections': get_connection_stats(self.session),
         }
+        if self.results_file:
+            report['results_file'] = self.results_file
+        else:
+            report['detailed_results'] = list(self.test_results)
         
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(report, f, indent=2, ensure_ascii=False)
@@ -345,9 +443,14 @@ def main() -> None:
     parser.add_argument("endpoint", help="API 端點，如 /api/list_contracts")
     parser.add_argument("--timeout", type=int, default=10, help="請求逾時秒數")
     parser.add_argument("--html-report", action="store_true", help="輸出 HTML 報告")
+    parser.add_argument("--parallel", type=int, default=1, help="同時送出的場景請求數 (預設: 1)")
+    parser.add_argument("--jsonl", help="將每筆結果逐筆寫入此 JSONL 檔，不保留在記憶體中")
+    add_session_arguments(parser)
     args = parser.parse_args()
 
-    tester = SmartApiTester(args.base_url, args.endpoint, timeout=args.timeout)
+    tester = SmartApiTester(args.base_url, args.endpoint, timeout=args.timeout,
+                            session=create_session_from_args(args, min_pool_size=args.parallel),
+                            parallelism=args.parallel, results_file=args.jsonl)
     tester.run_comprehensive_tests()
 
     report_file = tester.generate_detailed_report()
@@ -355,7 +458,7 @@ def main() -> None:
     if args.html_report:
         with open(report_file, "r", encoding="utf-8") as f:
             report_data = json.load(f)
-        generator = ReportGenerator(report_data["detailed_results"])
+        generator = create_report_generator(report_data, "full", "detailed_results")
         html_file = report_file.replace(".json", ".html")
         generator.generate_html_report(html_file)
         print(f"📄 HTML報告已生成: {html_file}")
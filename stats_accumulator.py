@@ -0,0 +1,297 @@
+"""
+單次走訪統計累加器 - 每筆結果更新一次，摘要與報告直接讀取累計值
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+from latency_histogram import LatencyHistogram
+from request_timing import PHASES
+
+# 摘要中最多保留的失敗結果筆數
+MAX_LISTED_FAILURES = 100
+
+
+def error_class(result: Dict[str, Any]) -> str:
+    """將失敗結果歸類：沒有錯誤訊息時為 HTTP 狀態碼，否則取錯誤訊息冒號前的部分"""
+    if result['error']:
+        return str(result['error']).split(':')[0].strip()[:80] or '未知錯誤'
+    return f"HTTP {result['status_code']}"
+
+
+class LatencyTotals:
+    """只記錄筆數、總和與極值的延遲統計，不需要百分位的分組使用"""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self._min: Optional[float] = None
+        self._max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        if self._min is None or seconds < self._min:
+            self._min = seconds
+        if seconds > self._max:
+            self._max = seconds
+
+    def merge(self, other: Any) -> None:
+        """合併另一個 LatencyTotals 或 LatencyHistogram"""
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.mean * other.count
+        if self._min is None or other.min < self._min:
+            self._min = other.min
+        self._max = max(self._max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def min(self) -> float:
+        return self._min or 0.0
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'count': self.count, 'sum': self.sum, 'min': self._min, 'max': self._max}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LatencyTotals':
+        totals = cls()
+        totals.count = data['count']
+        totals.sum = data['sum']
+        totals._min = data['min']
+        totals._max = data['max']
+        return totals
+
+
+class GroupStats:
+    """單一分組 (例如某個測試案例或負載階段) 的請求數、成功數、錯誤類別與延遲"""
+
+    def __init__(self, percentiles: bool = False):
+        self.count = 0
+        self.successes = 0
+        self.errors: Counter = Counter()
+        self.latency = LatencyHistogram() if percentiles else LatencyTotals()
+
+    def add(self, success: bool, latency: Optional[float], error: Optional[str] = None) -> None:
+        self.count += 1
+        if success:
+            self.successes += 1
+        elif error is not None:
+            self.errors[error] += 1
+        if latency is not None:
+            self.latency.record(latency)
+
+    def merge(self, count: int, successes: int, latency: Any, errors: Optional[Dict[str, int]] = None) -> None:
+        self.count += count
+        self.successes += successes
+        if errors:
+            self.errors.update(errors)
+        self.latency.merge(latency)
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.count * 100 if self.count else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            'count': self.count,
+            'successes': self.successes,
+            'success_rate': self.success_rate,
+            'mean': self.latency.mean,
+            'min': self.latency.min,
+            'max': self.latency.max,
+            'errors': dict(self.errors),
+        }
+        if isinstance(self.latency, LatencyHistogram):
+            summary['percentiles'] = self.latency.percentiles()
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'successes': self.successes,
+            'errors': dict(self.errors),
+            'latency': self.latency.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'GroupStats':
+        group = cls(percentiles='buckets' in data['latency'])
+        group.count = data['count']
+        group.successes = data['successes']
+        group.errors = Counter(data.get('errors', {}))
+        latency_class = LatencyHistogram if 'buckets' in data['latency'] else LatencyTotals
+        group.latency = latency_class.from_dict(data['latency'])
+        return group
+
+
+class StatsAccumulator:
+    """每筆結果更新一次的累計統計
+
+    記錄總數、成功數、狀態碼分佈、錯誤類別、整體延遲直方圖，
+    以及依 dimensions 分組的請求數與延遲；percentile_dimensions
+    中的分組另外保存直方圖以計算百分位。
+    """
+
+    def __init__(self, *dimensions: str, percentile_dimensions: Sequence[str] = (),
+                 max_failures: int = MAX_LISTED_FAILURES):
+        self.dimensions = dimensions
+        self.percentile_dimensions = tuple(percentile_dimensions)
+        self.max_failures = max_failures
+        self.total = 0
+        self.successes = 0
+        self.status_counts: Counter = Counter()
+        self.method_counts: Counter = Counter()
+        self.error_counts: Counter = Counter()
+        self.histogram = LatencyHistogram()
+        # 各請求階段 (DNS、連線、TLS、首位元組、本文) 的延遲直方圖，第一次出現時建立
+        self.phases: Dict[str, LatencyHistogram] = {}
+        self.groups: Dict[str, Dict[Any, GroupStats]] = {dimension: {} for dimension in dimensions}
+        # 最先發生的失敗結果 (方法、錯誤訊息與分組鍵)，供摘要列出
+        self.failures: List[Dict[str, Any]] = []
+
+    def _group(self, dimension: str, key: Any) -> GroupStats:
+        groups = self.groups[dimension]
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = GroupStats(dimension in self.percentile_dimensions)
+        return group
+
+    def _phase(self, phase: str) -> LatencyHistogram:
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = LatencyHistogram()
+        return histogram
+
+    def add(self, result: Dict[str, Any], latency: Optional[float] = None,
+            phases: Optional[Dict[str, float]] = None, **keys: Any) -> None:
+        """記錄一筆結果
+
+        latency 為未捨入的延遲秒數 (沒有回應時為 None)，phases 為各請求階段的秒數，
+        keys 為各分組的鍵。
+        """
+        success = result['success']
+        error = None
+        self.total += 1
+        self.status_counts[result['status_code']] += 1
+        self.method_counts[result['method']] += 1
+        if success:
+            self.successes += 1
+        else:
+            error = error_class(result)
+            self.error_counts[error] += 1
+            if len(self.failures) < self.max_failures:
+                self.failures.append({
+                    'method': result['method'],
+                    'error': result['error'] or f"HTTP {result['status_code']}",
+                    **keys,
+                })
+        if latency is not None:
+            self.histogram.record(latency)
+        if phases:
+            for phase, seconds in phases.items():
+                self._phase(phase).record(seconds)
+        for dimension, key in keys.items():
+            self._group(dimension, key).add(success, latency, error)
+
+    def merge(self, other: 'StatsAccumulator', **keys: Any) -> None:
+        """合併另一個累加器；keys 指定 other 整體所屬的分組"""
+        self.total += other.total
+        self.successes += other.successes
+        self.status_counts.update(other.status_counts)
+        self.method_counts.update(other.method_counts)
+        self.error_counts.update(other.error_counts)
+        self.histogram.merge(other.histogram)
+        for phase, histogram in other.phases.items():
+            self._phase(phase).merge(histogram)
+        for failure in other.failures[:max(self.max_failures - len(self.failures), 0)]:
+            self.failures.append({**failure, **keys})
+
+        for dimension, groups in other.groups.items():
+            if dimension in self.groups and dimension not in keys:
+                for key, group in groups.items():
+                    self._group(dimension, key).merge(group.count, group.successes, group.latency, group.errors)
+        for dimension, key in keys.items():
+            self._group(dimension, key).merge(other.total, other.successes, other.histogram, other.error_counts)
+
+    @property
+    def failed(self) -> int:
+        return self.total - self.successes
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.total * 100 if self.total else 0.0
+
+    def group(self, dimension: str) -> Dict[Any, GroupStats]:
+        """取得某個分組維度的所有分組 (依第一次出現的順序)"""
+        return self.groups[dimension]
+
+    def phase_summary(self) -> List[Dict[str, Any]]:
+        """依請求順序列出各階段的筆數、平均與百分位 (沒有量測到的階段略過)"""
+        return [
+            {
+                'phase': phase,
+                'count': self.phases[phase].count,
+                'mean': self.phases[phase].mean,
+                'max': self.phases[phase].max,
+                'percentiles': self.phases[phase].percentiles(),
+            }
+            for phase in PHASES if phase in self.phases
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        """整體摘要數字"""
+        return {
+            'total': self.total,
+            'successes': self.successes,
+            'failed': self.failed,
+            'success_rate': self.success_rate,
+            'mean': self.histogram.mean,
+            'min': self.histogram.min,
+            'max': self.histogram.max,
+            'percentiles': self.histogram.percentiles(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成可寫入 JSON 報告的格式"""
+        return {
+            'total': self.total,
+            'successes': self.successes,
+            'status_counts': [[status, count] for status, count in self.status_counts.items()],
+            'method_counts': dict(self.method_counts),
+            'error_counts': dict(self.error_counts),
+            'latency_histogram': self.histogram.to_dict(),
+            'phases': {phase: histogram.to_dict() for phase, histogram in self.phases.items()},
+            'percentile_dimensions': list(self.percentile_dimensions),
+            'groups': {
+                dimension: [[key, group.to_dict()] for key, group in groups.items()]
+                for dimension, groups in self.groups.items()
+            },
+            'failures': self.failures,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StatsAccumulator':
+        """從 JSON 報告還原累加器"""
+        stats = cls(*data['groups'], percentile_dimensions=data.get('percentile_dimensions', ()))
+        stats.total = data['total']
+        stats.successes = data['successes']
+        stats.status_counts = Counter({status: count for status, count in data['status_counts']})
+        stats.method_counts = Counter(data.get('method_counts', {}))
+        stats.error_counts = Counter(data['error_counts'])
+        stats.histogram = LatencyHistogram.from_dict(data['latency_histogram'])
+        stats.phases = {
+            phase: LatencyHistogram.from_dict(histogram) for phase, histogram in data.get('phases', {}).items()
+        }
+        for dimension, groups in data['groups'].items():
+            stats.groups[dimension] = {key: GroupStats.from_dict(group) for key, group in groups}
+        stats.failures = data.get('failures', [])
+        return stats
@@ -0,0 +1,143 @@
+"""
+CapacitySearch 的爬升、二分與 knee 判定 (以假的測試器取代實際的壓力測試)
+"""
+
+import pytest
+
+import capacity_search
+from capacity_search import CapacitySearch
+from stats_accumulator import StatsAccumulator
+
+
+class FakeTester:
+    """負載不超過 capacity 時 P99 為 100ms，超過時為 500ms；requests 為 0 時不送出任何請求"""
+
+    capacity = 0.0
+    requests = 10
+    failures = 0
+    created = []
+
+    def __init__(self, **options):
+        self.options = options
+        self.level = options['rate'] if options.get('rate') else options['concurrency']
+        self.stats = StatsAccumulator()
+        self.started_at = 0.0
+        self.finished_at = 1.0
+        self.max_send_lag = 0.0
+        FakeTester.created.append(self)
+
+    def run(self):
+        latency = 0.1 if self.level <= self.capacity else 0.5
+        for i in range(self.requests):
+            success = i >= self.failures
+            self.stats.add({'method': 'GET', 'success': success, 'status_code': 200 if success else 500,
+                            'error': None}, latency)
+
+
+@pytest.fixture
+def fake_tester(monkeypatch):
+    monkeypatch.setattr(capacity_search, 'ConcurrentApiTester', FakeTester)
+    FakeTester.capacity, FakeTester.requests, FakeTester.failures = 0.0, 10, 0
+    FakeTester.created = []
+    return FakeTester
+
+
+def search(**options):
+    options = {'start': 10, 'step_duration': 1, 'slo_p99': 0.3, 'cooldown': 0, **options}
+    return CapacitySearch({'base_url': 'http://localhost', 'endpoint': '/'}, **options)
+
+
+def levels(result):
+    return [(step['phase'], step['level']) for step in result['steps']]
+
+
+def test_ramp_then_bisect_to_knee(fake_tester, capsys):
+    fake_tester.capacity = 37
+    result = search().run()
+    assert levels(result) == [
+        ('爬升', 10), ('爬升', 20), ('爬升', 40),
+        ('二分', 30), ('二分', 35), ('二分', 38),
+    ]
+    assert result['knee']['level'] == 35
+    assert result['saturated']
+
+
+def test_precision_stops_the_bisection_earlier(fake_tester, capsys):
+    fake_tester.capacity = 37
+    result = search(precision=0.5).run()
+    # 二分一次後區間 40 - 30 = 10 已不大於 30 × 0.5，即停止
+    assert [level for phase, level in levels(result) if phase == '二分'] == [30]
+    assert result['knee']['level'] == 30
+
+
+def test_start_load_already_fails(fake_tester, capsys):
+    fake_tester.capacity = 3
+    result = search().run()
+    assert levels(result)[0] == ('爬升', 10)
+    # 以 0 為下界繼續二分
+    assert [level for phase, level in levels(result) if phase == '二分'] == [5, 2, 4, 3]
+    assert result['knee']['level'] == 3
+
+
+def test_start_load_fails_and_nothing_passes(fake_tester, capsys):
+    fake_tester.capacity = 0
+    result = search(start=2).run()
+    assert result['knee'] is None
+    assert all(not step['passed'] for step in result['steps'])
+    search().print_summary(result)
+    assert '起始負載就不符合門檻' in capsys.readouterr().out
+
+
+def test_max_level_stops_an_unsaturated_search(fake_tester, capsys):
+    fake_tester.capacity = 1000
+    result = search(max_level=50).run()
+    assert levels(result) == [('爬升', 10), ('爬升', 20), ('爬升', 40), ('爬升', 50)]
+    assert result['knee']['level'] == 50
+    assert not result['saturated']
+
+
+def test_step_without_requests_counts_as_failed(fake_tester, capsys):
+    fake_tester.capacity = 1000
+    fake_tester.requests = 0
+    step = search()._run_step(10, '爬升')
+    assert step['error_rate'] == 100.0
+    assert not step['passed']
+    assert '沒有完成任何請求' in step['reasons']
+
+
+def test_error_rate_threshold(fake_tester, capsys):
+    fake_tester.capacity = 1000
+    fake_tester.failures = 2
+    step = search(max_error_rate=10)._run_step(10, '爬升')
+    assert step['error_rate'] == 20.0
+    assert not step['passed']
+
+
+def test_rate_mode_keeps_fractional_levels(fake_tester, capsys):
+    fake_tester.capacity = 12.5
+    result = search(mode='rate', start=5, factor=1.5, precision=0.05).run()
+    assert result['knee']['level'] <= 12.5
+    assert result['knee']['level'] > 12.5 * 0.95
+    assert all(tester.options['rate'] == tester.level for tester in fake_tester.created)
+
+
+def test_each_step_gets_a_fresh_feeder(fake_tester, capsys):
+    class Feeder:
+        shard = (0, 1)
+
+        def for_shard(self, shard):
+            return Feeder()
+
+    fake_tester.capacity = 15
+    feeder = Feeder()
+    CapacitySearch({'feeder': feeder}, start=10, step_duration=1, cooldown=0, max_level=20).run()
+    feeders = [tester.options['feeder'] for tester in fake_tester.created]
+    assert len(set(map(id, feeders))) == len(feeders)
+    assert feeder not in feeders
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        CapacitySearch({}, mode='threads')
+    with pytest.raises(ValueError):
+        CapacitySearch({}, factor=1)
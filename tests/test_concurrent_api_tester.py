@@ -0,0 +1,34 @@
+"""
+ConcurrentApiTester 把請求數、並發數與速率分配給 worker 程序的方式
+"""
+
+from concurrent_api_tester import ConcurrentApiTester
+from load_profile import LoadProfile
+
+
+def make_tester(**options):
+    return ConcurrentApiTester('http://localhost:8000', '/items', **options)
+
+
+def test_shards_split_requests_and_concurrency():
+    shards = make_tester(num_requests=10, concurrency=5, processes=3)._shard_options()
+    assert [shard['num_requests'] for shard in shards] == [4, 3, 3]
+    assert [shard['concurrency'] for shard in shards] == [2, 2, 1]
+    assert [shard['shard'] for shard in shards] == [(0, 3), (1, 3), (2, 3)]
+
+
+def test_processes_are_limited_to_closed_loop_concurrency():
+    stress = make_tester(num_requests=100, concurrency=2, processes=4)
+    assert stress.processes == 2
+    assert sum(shard['concurrency'] for shard in stress._shard_options()) == 2
+
+
+def test_open_loop_keeps_all_processes():
+    stress = make_tester(num_requests=100, concurrency=1, rate=400, processes=4)
+    assert stress.processes == 4
+    assert [shard['rate'] for shard in stress._shard_options()] == [100] * 4
+
+
+def test_concurrency_profile_limits_processes_to_peak():
+    profile = LoadProfile('concurrency', [{'duration': 5, 'target': 3}])
+    assert make_tester(num_requests=None, profile=profile, processes=8).processes == 3
@@ -0,0 +1,106 @@
+"""
+DataFeeder 的讀取模式、worker 分段與佔位符填入
+"""
+
+import json
+
+import pytest
+
+from data_feeder import DataFeeder, fill_text, fill_value, placeholders
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'users.csv'
+    path.write_text('id,name\n' + ''.join(f'{i},user{i}\n' for i in range(100)), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture
+def jsonl_file(tmp_path):
+    path = tmp_path / 'users.jsonl'
+    lines = [json.dumps({'id': i, 'tags': ['a', 'b']}) for i in range(10)]
+    # 中間的空白列與結尾沒有換行都要能處理
+    path.write_text('\n'.join(lines[:5]) + '\n\n' + '\n'.join(lines[5:]), encoding='utf-8')
+    return str(path)
+
+
+def read_all(feeder):
+    rows = []
+    while (row := feeder.next_row()) is not None:
+        rows.append(row)
+    return rows
+
+
+def test_csv_fields_and_sequential_wrap(csv_file):
+    feeder = DataFeeder(csv_file)
+    assert feeder.fields == ['id', 'name']
+    ids = [feeder.next_row()['id'] for _ in range(102)]
+    assert ids[:3] == ['0', '1', '2']
+    assert ids[100:] == ['0', '1']
+    assert feeder.rows_read == 102
+
+
+def test_jsonl_keeps_types_and_skips_blank_lines(jsonl_file):
+    feeder = DataFeeder(jsonl_file, 'unique')
+    rows = read_all(feeder)
+    assert [row['id'] for row in rows] == list(range(10))
+    assert rows[0]['tags'] == ['a', 'b']
+    assert feeder.exhausted
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3, 7])
+def test_unique_shards_cover_every_row_once(csv_file, workers):
+    ids = []
+    for index in range(workers):
+        ids += [int(row['id']) for row in read_all(DataFeeder(csv_file, 'unique', (index, workers)))]
+    assert sorted(ids) == list(range(100))
+
+
+def test_more_workers_than_rows(jsonl_file):
+    ids = []
+    for index in range(16):
+        ids += [row['id'] for row in read_all(DataFeeder(jsonl_file, 'unique', (index, 16)))]
+    assert sorted(ids) == list(range(10))
+
+
+def test_sequential_shard_wraps_within_its_range(csv_file):
+    owned = [row['id'] for row in read_all(DataFeeder(csv_file, 'unique', (1, 2)))]
+    feeder = DataFeeder(csv_file, 'sequential', (1, 2))
+    assert [feeder.next_row()['id'] for _ in range(len(owned) * 2)] == owned * 2
+    assert '0' not in owned
+
+
+def test_for_shard_reads_from_the_start(csv_file):
+    feeder = DataFeeder(csv_file, 'unique')
+    read_all(feeder)
+    fresh = feeder.for_shard(feeder.shard)
+    assert not fresh.exhausted
+    assert fresh.next_row()['id'] == '0'
+
+
+def test_random_mode_reads_existing_rows(csv_file):
+    feeder = DataFeeder(csv_file, 'random')
+    assert all(0 <= int(feeder.next_row()['id']) < 100 for _ in range(50))
+
+
+def test_rejects_empty_file_and_unknown_format(tmp_path):
+    empty = tmp_path / 'empty.csv'
+    empty.write_text('', encoding='utf-8')
+    with pytest.raises(ValueError):
+        DataFeeder(str(empty))
+    with pytest.raises(ValueError):
+        DataFeeder(str(tmp_path / 'data.txt'))
+
+
+def test_missing_fields(csv_file):
+    feeder = DataFeeder(csv_file)
+    assert feeder.missing_fields('/users/{{id}}', {'x': '{{email}}'}) == ['email']
+
+
+def test_fill_helpers():
+    row = {'id': 7, 'q': 'a b/c', 'tags': ['x']}
+    assert placeholders({'{{id}}': ['{{q}}', 1]}) == {'id', 'q'}
+    assert fill_text('/items/{{q}}', row, url=True) == '/items/a%20b%2Fc'
+    assert fill_value({'id': '{{id}}', 'label': 'n{{id}}', 'tags': '{{tags}}'}, row) == \
+        {'id': 7, 'label': 'n7', 'tags': ['x']}
@@ -0,0 +1,85 @@
+"""
+LatencyHistogram 的分桶、百分位與合併
+"""
+
+import pytest
+
+from latency_histogram import LatencyHistogram
+
+
+def test_small_values_are_exact():
+    histogram = LatencyHistogram()
+    for us in range(1, 101):
+        histogram.record(us / 1_000_000)
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(50e-6)
+    assert histogram.percentile(99) == pytest.approx(99e-6)
+    assert histogram.min == pytest.approx(1e-6)
+    assert histogram.max == pytest.approx(100e-6)
+
+
+@pytest.mark.parametrize('seconds', [0.0012, 0.0537, 0.91, 12.5])
+def test_relative_error_is_bounded(seconds):
+    histogram = LatencyHistogram()
+    for _ in range(10):
+        histogram.record(seconds)
+    # 預設 7 bits 時相對誤差小於 1.6%，百分位取桶的上界但不超過最大值
+    assert histogram.percentile(50) == pytest.approx(seconds, rel=0.016)
+    assert histogram.percentile(50) <= histogram.max
+
+
+def test_percentiles_of_uniform_latencies():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+    assert histogram.percentile(50) == pytest.approx(0.5, rel=0.016)
+    assert histogram.percentile(90) == pytest.approx(0.9, rel=0.016)
+    assert histogram.percentile(99.9) == pytest.approx(0.999, rel=0.016)
+    assert histogram.mean == pytest.approx(0.5005, rel=1e-3)
+
+
+def test_values_are_clamped():
+    histogram = LatencyHistogram(max_value_us=1_000_000)
+    histogram.record(-1)
+    histogram.record(5)
+    assert histogram.min == 0
+    assert histogram.max == 1.0
+
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.mean == 0.0
+    assert histogram.distribution() == []
+
+
+def test_merge_matches_single_histogram():
+    combined, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for ms in range(1, 501):
+        (first if ms % 2 else second).record(ms / 1000)
+        combined.record(ms / 1000)
+    first.merge(second)
+    assert list(first.counts) == list(combined.counts)
+    assert (first.count, first.sum_us, first.min_us, first.max_us) == \
+        (combined.count, combined.sum_us, combined.min_us, combined.max_us)
+
+
+def test_merge_rejects_different_settings():
+    with pytest.raises(ValueError):
+        LatencyHistogram().merge(LatencyHistogram(sub_bucket_bits=5))
+
+
+def test_dict_round_trip():
+    histogram = LatencyHistogram()
+    for value in (0.001, 0.002, 0.002, 0.25, 3.0):
+        histogram.record(value)
+    restored = LatencyHistogram.from_dict(histogram.to_dict())
+    assert list(restored.counts) == list(histogram.counts)
+    assert restored.percentiles() == histogram.percentiles()
+    assert (restored.count, restored.sum_us, restored.min_us, restored.max_us) == \
+        (histogram.count, histogram.sum_us, histogram.min_us, histogram.max_us)
+
+
+def test_from_latencies_skips_missing_responses():
+    histogram = LatencyHistogram.from_latencies([0.1, 0, None, 0.2])
+    assert histogram.count == 2
@@ -0,0 +1,50 @@
+"""
+LoadProfile 的階段驗證與負載值計算
+"""
+
+import pytest
+
+from load_profile import LoadProfile
+
+
+def test_levels_ramp_linearly_between_stages():
+    profile = LoadProfile('rate', [
+        {'name': 'ramp', 'duration': 10, 'target': 100},
+        {'name': 'spike', 'duration': 5, 'from': 300, 'target': 300},
+    ])
+    assert profile.level_at(5) == ('ramp', 50.0)
+    assert profile.level_at(12) == ('spike', 300.0)
+    assert profile.level_at(15) == (None, 0.0)
+    assert profile.total_duration == 15
+    assert profile.peak == 300
+
+
+def test_default_stage_names():
+    profile = LoadProfile('concurrency', [{'duration': 1, 'target': 5}, {'duration': 1, 'target': 10}])
+    assert [stage['name'] for stage in profile.stages] == ['stage-1', 'stage-2']
+
+
+def test_duplicate_stage_names_are_rejected():
+    # 統計依名稱分組，兩個同名的 plateau 會被合併成一組
+    with pytest.raises(ValueError, match='plateau'):
+        LoadProfile('rate', [
+            {'name': 'plateau', 'duration': 10, 'target': 100},
+            {'name': 'spike', 'duration': 5, 'target': 500},
+            {'name': 'plateau', 'duration': 10, 'target': 100},
+        ])
+
+
+@pytest.mark.parametrize('stages', [
+    [],
+    [{'duration': 10}],
+    [{'duration': 0, 'target': 10}],
+])
+def test_invalid_stages(stages):
+    with pytest.raises(ValueError):
+        LoadProfile('rate', stages)
+
+
+def test_scaled_keeps_names_and_shape():
+    profile = LoadProfile('rate', [{'name': 'a', 'duration': 10, 'target': 100}]).scaled(0.25)
+    assert profile.stages[0]['name'] == 'a'
+    assert profile.level_at(10 - 1e-9)[1] == pytest.approx(25)
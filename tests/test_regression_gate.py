@@ -0,0 +1,117 @@
+"""
+RegressionGate 的 KS 檢定與回歸判定，以及基準的保存與載入
+"""
+
+import json
+import random
+
+import pytest
+
+from latency_histogram import LatencyHistogram
+from regression_gate import BaselineStore, RegressionGate, ks_p_value, load_snapshot
+from stats_accumulator import StatsAccumulator
+
+
+def make_report(latencies, case='list', duration=10.0, failures=0):
+    stats = StatsAccumulator('test_case_name', percentile_dimensions=('test_case_name',))
+    for i, latency in enumerate(latencies):
+        success = i >= failures
+        result = {
+            'method': 'GET',
+            'success': success,
+            'status_code': 200 if success else 500,
+            'error': None,
+        }
+        stats.add(result, latency, test_case_name=case)
+    return {'duration': duration, 'stats': stats.to_dict()}
+
+
+def latencies(scale, count=2000, seed=1):
+    rng = random.Random(seed)
+    return [scale * rng.lognormvariate(0, 0.3) for _ in range(count)]
+
+
+def compare(before, after, **options):
+    gate = RegressionGate(**options)
+    return gate.compare(load_snapshot(before, 'baseline'), load_snapshot(after, 'current'))
+
+
+def test_ks_p_value_bounds():
+    assert ks_p_value(0.0, 100, 100) == 1.0
+    assert ks_p_value(0.5, 0, 100) == 1.0
+    assert ks_p_value(0.05, 100, 100) > 0.5
+    assert ks_p_value(0.3, 1000, 1000) < 1e-6
+
+
+def test_ks_distance_of_identical_and_disjoint_histograms():
+    fast, slow = LatencyHistogram(), LatencyHistogram()
+    for _ in range(10):
+        fast.record(0.01)
+        slow.record(0.5)
+    assert fast.ks_distance(fast) == 0.0
+    assert fast.ks_distance(slow) == 1.0
+
+
+def test_same_distribution_is_not_a_regression():
+    comparison = compare(make_report(latencies(0.05, seed=1)), make_report(latencies(0.05, seed=2)))
+    assert not comparison['regressed']
+    overall = comparison['scopes'][0]
+    assert overall['scope'] == '整體'
+    assert not overall['significant']
+
+
+def test_slower_tail_is_a_regression():
+    comparison = compare(make_report(latencies(0.05)), make_report(latencies(0.08)))
+    assert comparison['regressed']
+    scopes = {scope['scope']: scope for scope in comparison['scopes']}
+    assert set(scopes) == {'整體', 'test_case_name: list'}
+    assert scopes['test_case_name: list']['regressions']
+    assert scopes['整體']['changes']['p99'] > 10
+
+
+def test_change_within_tolerance_is_not_a_regression():
+    comparison = compare(make_report(latencies(0.05)), make_report(latencies(0.08)), tolerance=100)
+    assert not comparison['regressed']
+
+
+def test_few_samples_are_not_significant():
+    comparison = compare(make_report([0.05, 0.06, 0.07]), make_report([0.06, 0.07, 0.08]))
+    assert comparison['scopes'][0]['changes']['p99'] > 10
+    assert not comparison['regressed']
+
+
+def test_throughput_and_error_rate_are_warnings():
+    before = make_report(latencies(0.05), duration=10)
+    after = make_report(latencies(0.05), duration=20, failures=100)
+    overall = compare(before, after)['scopes'][0]
+    assert not overall['regressions']
+    assert any('吞吐量' in warning for warning in overall['warnings'])
+    assert any('錯誤率' in warning for warning in overall['warnings'])
+
+
+def test_histogram_only_snapshot():
+    histogram = LatencyHistogram.from_latencies(latencies(0.05))
+    snapshot = load_snapshot(histogram.to_dict(), 'histogram')
+    assert snapshot['histogram_only']
+    assert snapshot['duration'] is None
+    assert snapshot['stats'].total == histogram.count
+
+
+def test_report_without_statistics_is_rejected():
+    with pytest.raises(ValueError):
+        load_snapshot({'results': []}, 'empty')
+
+
+def test_baseline_store_round_trip(tmp_path):
+    report_file = tmp_path / 'report.json'
+    report_file.write_text(json.dumps(make_report(latencies(0.05))), encoding='utf-8')
+    store = BaselineStore(str(tmp_path / 'baselines'))
+    store.save('main', str(report_file))
+
+    assert [baseline['name'] for baseline in store.list()] == ['main']
+    baseline = store.load('main')
+    current = store.load(str(report_file))
+    assert baseline['stats'].histogram.percentiles() == current['stats'].histogram.percentiles()
+    assert not RegressionGate().compare(baseline, current)['regressed']
+    with pytest.raises(FileNotFoundError):
+        store.load('missing')
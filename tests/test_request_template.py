@@ -0,0 +1,75 @@
+"""
+RequestTemplate 的快取、佔位符型別與 URL 編碼
+"""
+
+import json
+import uuid
+
+from request_template import RequestTemplate
+
+
+def test_constant_request_is_cached():
+    template = RequestTemplate('POST', 'http://api/items', {'name': 'x'}, {'X-A': '1'})
+    url, headers, body = template.render()
+    assert url == 'http://api/items'
+    assert headers == {'X-A': '1', 'Content-Type': 'application/json'}
+    assert json.loads(body) == {'name': 'x'}
+    # 沒有佔位符時每次回傳同一份位元組
+    assert template.render()[2] is body
+
+
+def test_explicit_content_type_is_kept():
+    template = RequestTemplate('POST', 'http://api', {'a': 1}, {'content-type': 'application/vnd+json'})
+    assert template.render()[1] == {'content-type': 'application/vnd+json'}
+
+
+def test_get_without_body():
+    url, headers, body = RequestTemplate('GET', 'http://api/items').render()
+    assert body is None
+    assert headers == {}
+
+
+def test_whole_string_placeholder_keeps_value_type():
+    template = RequestTemplate('POST', 'http://api', {'id': '{{id}}', 'tags': '{{tags}}'}, fields=['id', 'tags'])
+    body = json.loads(template.render({'id': 7, 'tags': ['a', 'b']})[2])
+    assert body == {'id': 7, 'tags': ['a', 'b']}
+
+
+def test_inline_placeholder_is_json_escaped():
+    template = RequestTemplate('POST', 'http://api', {'note': 'say {{text}}!'}, fields=['text'])
+    body = json.loads(template.render({'text': 'a "quoted"\nline'})[2])
+    assert body == {'note': 'say a "quoted"\nline!'}
+
+
+def test_url_values_are_encoded():
+    template = RequestTemplate('GET', 'http://api/users/{{name}}?q={{q}}', fields=['name', 'q'])
+    url = template.render({'name': 'a/b', 'q': 'x y&z'})[0]
+    assert url == 'http://api/users/a%2Fb?q=x%20y%26z'
+
+
+def test_headers_are_filled():
+    template = RequestTemplate('GET', 'http://api', headers={'Authorization': 'Bearer {{token}}'}, fields=['token'])
+    assert template.render({'token': 'abc'})[1] == {'Authorization': 'Bearer abc'}
+
+
+def test_builtin_variables():
+    template = RequestTemplate('POST', 'http://api/{{seq}}', {'id': '{{uuid}}', 'n': '{{rand_int}}', 't': '{{timestamp}}'})
+    url, _, body = template.render(seq=42)
+    body = json.loads(body)
+    assert url == 'http://api/42'
+    uuid.UUID(body['id'])
+    assert isinstance(body['n'], int) and isinstance(body['t'], int)
+
+
+def test_same_placeholder_has_one_value_per_request():
+    template = RequestTemplate('POST', 'http://api/{{uuid}}', {'id': '{{uuid}}'})
+    url, _, body = template.render()
+    assert url.rsplit('/', 1)[1] == json.loads(body)['id']
+
+
+def test_unknown_placeholders_are_left_alone():
+    template = RequestTemplate('POST', 'http://api/{{other}}', {'a': '{{other}}'})
+    url, _, body = template.render()
+    assert url == 'http://api/{{other}}'
+    assert json.loads(body) == {'a': '{{other}}'}
+    assert not template.variables
@@ -0,0 +1,128 @@
+"""
+StatsAccumulator 的分組、跨程序合併與 JSON 還原
+"""
+
+import json
+import random
+
+import pytest
+
+from latency_histogram import LatencyHistogram
+from stats_accumulator import LatencyTotals, StatsAccumulator, error_class
+
+
+def make_results(count=600, seed=3):
+    rng = random.Random(seed)
+    for i in range(count):
+        success = rng.random() > 0.1
+        timeout = not success and rng.random() < 0.5
+        result = {
+            'method': rng.choice(['GET', 'POST']),
+            'success': success,
+            'status_code': None if timeout else (200 if success else 503),
+            'error': '請求逾時: 10 秒' if timeout else None,
+        }
+        latency = None if timeout else rng.lognormvariate(-3, 0.5)
+        phases = {'connect': 0.001 * (i % 7 + 1), 'ttfb': latency} if latency else None
+        keys = {'stage': rng.choice(['ramp', 'spike']), 'test_case_name': f'case {i % 4}'}
+        yield result, latency, phases, keys
+
+
+def new_stats():
+    return StatsAccumulator('stage', 'test_case_name', percentile_dimensions=('stage',))
+
+
+def assert_same(left, right):
+    assert (left.total, left.successes) == (right.total, right.successes)
+    assert left.status_counts == right.status_counts
+    assert left.method_counts == right.method_counts
+    assert left.error_counts == right.error_counts
+    assert list(left.histogram.counts) == list(right.histogram.counts)
+    assert left.histogram.sum_us == right.histogram.sum_us
+    assert set(left.phases) == set(right.phases)
+    for phase, histogram in left.phases.items():
+        assert list(histogram.counts) == list(right.phases[phase].counts)
+    assert set(left.groups) == set(right.groups)
+    for dimension, groups in left.groups.items():
+        other = right.groups[dimension]
+        assert set(groups) == set(other)
+        for key, group in groups.items():
+            assert (group.count, group.successes, group.errors) == \
+                (other[key].count, other[key].successes, other[key].errors)
+            assert type(group.latency) is type(other[key].latency)
+            assert group.latency.count == other[key].latency.count
+            assert group.latency.mean == pytest.approx(other[key].latency.mean)
+            assert group.latency.min == pytest.approx(other[key].latency.min, abs=1e-6)
+            assert group.latency.max == pytest.approx(other[key].latency.max, abs=1e-6)
+            if isinstance(group.latency, LatencyHistogram):
+                assert group.latency.percentiles() == other[key].latency.percentiles()
+
+
+def test_groups_and_latency_types():
+    stats = new_stats()
+    for result, latency, phases, keys in make_results():
+        stats.add(result, latency, phases, **keys)
+    assert set(stats.group('stage')) == {'ramp', 'spike'}
+    assert isinstance(stats.group('stage')['ramp'].latency, LatencyHistogram)
+    assert isinstance(stats.group('test_case_name')['case 0'].latency, LatencyTotals)
+    assert sum(group.count for group in stats.group('test_case_name').values()) == stats.total
+    assert stats.error_counts['請求逾時'] + stats.error_counts['HTTP 503'] == stats.failed
+    assert [phase['phase'] for phase in stats.phase_summary()] == ['connect', 'ttfb']
+
+
+@pytest.mark.parametrize('parts', [2, 3, 7])
+def test_split_then_merge_equals_single_pass(parts):
+    single = new_stats()
+    shards = [new_stats() for _ in range(parts)]
+    for i, (result, latency, phases, keys) in enumerate(make_results()):
+        single.add(result, latency, phases, **keys)
+        shards[i % parts].add(result, latency, phases, **keys)
+
+    merged = new_stats()
+    for shard in shards:
+        merged.merge(shard)
+    assert_same(merged, single)
+    assert merged.summary()['percentiles'] == single.summary()['percentiles']
+    assert merged.summary()['mean'] == pytest.approx(single.summary()['mean'])
+
+
+def test_merge_into_a_group():
+    # 批次測試把每個測試案例的累加器整體併入一個分組
+    cases = {}
+    for result, latency, phases, keys in make_results(200):
+        cases.setdefault(keys['test_case_name'], StatsAccumulator()).add(result, latency)
+    batch = StatsAccumulator('test_case_name', percentile_dimensions=('test_case_name',))
+    for name, stats in cases.items():
+        batch.merge(stats, test_case_name=name)
+    for name, group in batch.group('test_case_name').items():
+        assert group.count == cases[name].total
+        assert group.latency.percentiles() == cases[name].histogram.percentiles()
+    assert all('test_case_name' in failure for failure in batch.failures)
+
+
+def test_json_round_trip():
+    stats = new_stats()
+    for result, latency, phases, keys in make_results():
+        stats.add(result, latency, phases, **keys)
+    restored = StatsAccumulator.from_dict(json.loads(json.dumps(stats.to_dict())))
+    assert_same(restored, stats)
+    assert restored.percentile_dimensions == stats.percentile_dimensions
+    assert restored.failures == stats.failures
+    # 還原後仍可繼續合併
+    restored.merge(stats)
+    assert restored.total == stats.total * 2
+
+
+def test_failures_are_capped():
+    stats = StatsAccumulator(max_failures=5)
+    other = StatsAccumulator(max_failures=5)
+    for result, latency, _, _ in make_results():
+        stats.add(result, latency)
+        other.add(result, latency)
+    stats.merge(other)
+    assert len(stats.failures) == 5
+
+
+def test_error_class():
+    assert error_class({'error': '連線失敗: refused', 'status_code': None}) == '連線失敗'
+    assert error_class({'error': None, 'status_code': 404}) == 'HTTP 404'
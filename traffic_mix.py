@@ -0,0 +1,78 @@
+"""
+多端點流量組合 - 依權重隨機選擇每個請求要打的測試案例
+"""
+
+import bisect
+import random
+from typing import Any, Dict, List, Optional
+
+from batch_tester import load_config_file
+
+
+class TrafficMix:
+    """由多個加權測試案例組成的流量組合
+
+    測試案例格式與批次測試相同 (name、endpoint、method、data、headers、timeout，可選 base_url)，
+    另外以 weight 指定相對比例 (預設 1，0 表示停用)。沒有指定 method 時使用 GET。
+    每個請求以一次亂數與累計權重的二分搜尋選出案例，選擇成本與案例數量幾乎無關。
+    """
+
+    def __init__(self, tests: List[Dict[str, Any]], base_url: str = 'http://localhost',
+                 headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        self.entries: List[Dict[str, Any]] = []
+        self._cumulative: List[float] = []
+        total = 0.0
+        for i, test in enumerate(tests, 1):
+            weight = float(test.get('weight', 1))
+            if weight < 0:
+                raise ValueError(f"第 {i} 個測試案例的 weight 不能為負數")
+            if weight == 0:
+                continue
+            name = test.get('name', f'Test {i}')
+            if any(entry['name'] == name for entry in self.entries):
+                raise ValueError(f"測試案例名稱重複: {name}")
+            case_base_url = test.get('base_url', base_url)
+            total += weight
+            self.entries.append({
+                'name': name,
+                'method': (test.get('method') or 'GET').upper(),
+                'url': f"{case_base_url.rstrip('/')}{test.get('endpoint', '/')}",
+                'data': test.get('data'),
+                'headers': test.get('headers', headers),
+                'timeout': test.get('timeout', timeout),
+                'weight': weight,
+            })
+            self._cumulative.append(total)
+        if not self.entries:
+            raise ValueError("流量組合中沒有權重大於 0 的測試案例")
+        self.total_weight = total
+
+    @classmethod
+    def from_file(cls, config_file: str, base_url: Optional[str] = None) -> 'TrafficMix':
+        """從批次測試格式的 JSON/YAML 檔案載入；base_url 為設定檔沒有指定時的預設值"""
+        config = load_config_file(config_file)
+        return cls(
+            config.get('tests', []),
+            base_url=config.get('base_url', base_url or 'http://localhost'),
+            headers=config.get('headers'),
+            timeout=config.get('timeout'),
+        )
+
+    def pick(self) -> Dict[str, Any]:
+        """依權重隨機選出一個測試案例"""
+        index = bisect.bisect_right(self._cumulative, random.random() * self.total_weight)
+        # 浮點誤差可能使亂數剛好等於總權重
+        return self.entries[min(index, len(self.entries) - 1)]
+
+    def share(self, entry: Dict[str, Any]) -> float:
+        """測試案例預期佔全部請求的百分比"""
+        return entry['weight'] / self.total_weight * 100
+
+    def to_dict(self) -> Dict[str, Any]:
+        """轉成可寫入報告的格式"""
+        return {
+            'tests': [
+                {k: entry[k] for k in ('name', 'method', 'url', 'weight')}
+                for entry in self.entries
+            ],
+        }